@@ -0,0 +1,231 @@
+"""
+Batch analysis of a study: finds every session under a results tree, scores each
+trial in a pool of worker processes and writes one tidy table with a row per
+trial (timing quality and tracking accuracy).
+
+Sessions are the *_shape_tracking.json files, binary session directories and
+journals whose JSON file was never built. Results are kept in a cache next to
+the output, keyed by each session's size and mtime (and content hash when only
+the mtime changed), so a re-run only analyses new or modified sessions.
+
+Usage:
+    python Analysis.py results/ [-o summary.csv summary.npz] [--jobs 8] [--force]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # trial_info shape paths are relative to it
+SESSION_SUFFIX = "_shape_tracking"
+ANALYSIS_VERSION = 1  # bump when a metric changes, so cached rows are recomputed
+CACHE_FILE = ".analysis_cache.json"
+HASH_CHUNK = 1 << 20
+
+COLUMNS = (
+    "session", "pid", "trial_num", "shape", "speed", "hide_template",
+    "samples", "duration_s", "rate_hz", "longest_gap_ms", "accepted",
+    "mean_error", "rms_error", "max_error", "coverage", "laps", "lap_progress", "frechet", "dtw",
+    "live_error_mean",
+)
+TEXT_COLUMNS = ("session", "pid", "shape", "speed")
+
+
+def find_sessions(root: str):
+    """session files and directories under root, sorted"""
+    sessions = []
+    for directory, subdirs, files in os.walk(root):
+        for name in list(subdirs):
+            if name.endswith(SESSION_SUFFIX) and os.path.exists(os.path.join(directory, name, "header.json")):
+                sessions.append(os.path.join(directory, name))
+                subdirs.remove(name)
+        for name in files:
+            base, ext = os.path.splitext(name)
+            if not base.endswith(SESSION_SUFFIX):
+                continue
+            if ext == ".json" or (ext == ".journal" and base + ".json" not in files):
+                sessions.append(os.path.join(directory, name))
+    return sorted(sessions)
+
+
+def _files_of(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path))
+    return [path]
+
+
+def fingerprint(path):
+    """(size, mtime_ns) of a session file, or summed over the files of a binary session"""
+    stats = [os.stat(f) for f in _files_of(path)]
+    return sum(s.st_size for s in stats), max(s.st_mtime_ns for s in stats)
+
+
+def content_hash(path):
+    digest = hashlib.sha1()
+    for name in _files_of(path):
+        with open(name, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _number(value):
+    if value is None:
+        return None
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def analyze_session(path):
+    """one row per scorable trial of the session at `path` (runs in a worker process)"""
+    from Scoring import NO_DATA, score_shape
+    from SessionReader import iter_sections, parse_trial_info, read_header
+    from TimingStats import timing_stats
+
+    pid = read_header(path).get("pid", "")
+    rows = []
+    for section in iter_sections(path):  # one trial in memory at a time
+        trial = parse_trial_info(section["trial_info"])
+        columns = section["samples"]
+        if trial is None or "posX" not in (columns.dtype.names or ()):
+            continue
+        trial_num = section["trial_num"]
+        shape, speed, hide_template = trial
+        timing = section.get("timing")
+        if timing is None and "HostTimeNs" in columns.dtype.names:
+            timing = timing_stats(columns["HostTimeNs"], x=columns["posX"], y=columns["posY"])
+        timing = timing or {}
+
+        row = {"session": os.path.basename(path), "pid": pid, "trial_num": trial_num,
+               "shape": os.path.splitext(os.path.basename(shape))[0], "speed": speed,
+               "hide_template": hide_template, "samples": int(len(columns)),
+               "duration_s": _number(timing.get("duration_s")), "rate_hz": _number(timing.get("rate_hz")),
+               "longest_gap_ms": _number(timing.get("longest_gap_ms")), "accepted": timing.get("accepted")}
+        try:
+            score = score_shape(columns, os.path.join(APP_DIR, shape))
+        except (OSError, ValueError) as e:
+            print(f"{path} trial {trial_num}: cannot score against {shape}: {e}")
+            score = {}
+        for name in ("mean_error", "rms_error", "max_error", "coverage", "lap_progress", "frechet", "dtw"):
+            row[name] = _number(score.get(name))
+        row["laps"] = score.get("laps")
+
+        live = columns["TrackingError"] if "TrackingError" in columns.dtype.names else []
+        live = live[live != NO_DATA] if len(live) else live
+        row["live_error_mean"] = float(np.mean(live)) if len(live) else None
+        rows.append(row)
+    return rows
+
+
+def _analyze(path):
+    """(path, rows, error, seconds, content hash), run in a worker so hashing is parallel too"""
+    started = time.perf_counter()
+    try:
+        sha1 = content_hash(path)
+        return path, analyze_session(path), None, time.perf_counter() - started, sha1
+    except Exception as e:  # a broken session must not stop the batch
+        return path, [], f"{type(e).__name__}: {e}", time.perf_counter() - started, None
+
+
+def load_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get("sessions", {}) if cache.get("version") == ANALYSIS_VERSION else {}
+
+
+def save_cache(path, sessions):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": ANALYSIS_VERSION, "sessions": sessions}, f)
+    os.replace(tmp_path, path)
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: "" if row.get(k) is None else row.get(k) for k in COLUMNS})
+
+
+def write_npz(path, rows):
+    arrays = {}
+    for name in COLUMNS:
+        values = [row.get(name) for row in rows]
+        if name in TEXT_COLUMNS:
+            arrays[name] = np.array(["" if v is None else str(v) for v in values])
+        else:
+            arrays[name] = np.array([np.nan if v is None else float(v) for v in values], dtype=float)
+    np.savez_compressed(path, **arrays)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", nargs="?", default="results", help="results directory to scan")
+    parser.add_argument("-o", "--output", nargs="+", help="summary table(s), .csv or .npz "
+                                                          "(default: <root>/summary.csv)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--cache", help=f"cache of per-session results (default: <root>/{CACHE_FILE})")
+    parser.add_argument("--force", action="store_true", help="analyse every session again")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    outputs = [os.path.abspath(o) for o in (args.output or [os.path.join(root, "summary.csv")])]
+    cache_path = os.path.abspath(args.cache or os.path.join(root, CACHE_FILE))
+    cache = {} if args.force else load_cache(cache_path)
+
+    sessions = find_sessions(root)
+    todo, kept = [], {}
+    for path in sessions:
+        key = os.path.relpath(path, root)
+        size, mtime_ns = fingerprint(path)
+        entry = cache.get(key)
+        if entry and entry["size"] == size:
+            if entry["mtime_ns"] == mtime_ns:
+                kept[key] = entry
+                continue
+            if entry.get("sha1") == content_hash(path):  # touched but not changed
+                kept[key] = dict(entry, mtime_ns=mtime_ns)
+                continue
+        todo.append((key, path, size, mtime_ns))
+    print(f"{len(sessions)} sessions, {len(kept)} unchanged, {len(todo)} to analyse")
+
+    started = time.perf_counter()
+    paths = {path: (key, size, mtime_ns) for key, path, size, mtime_ns in todo}
+    failed = 0
+    if todo:
+        # workers run in the app directory, where the stimuli (and their geometry cache) are
+        with ProcessPoolExecutor(max_workers=max(min(args.jobs, len(todo)), 1),
+                                 initializer=os.chdir, initargs=(APP_DIR,)) as pool:
+            for done, (path, rows, error, seconds, sha1) in enumerate(pool.map(_analyze, list(paths)), 1):
+                key, size, mtime_ns = paths[path]
+                if error:
+                    failed += 1
+                    print(f"[{done}/{len(todo)}] {key}: FAILED {error}")
+                    continue
+                kept[key] = {"size": size, "mtime_ns": mtime_ns, "sha1": sha1, "rows": rows}
+                print(f"[{done}/{len(todo)}] {key}: {len(rows)} trials in {seconds:.1f} s")
+    save_cache(cache_path, {key: kept[key] for key in sorted(kept)})
+
+    current = {os.path.relpath(p, root) for p in sessions}
+    rows = [row for key in sorted(kept) if key in current for row in kept[key]["rows"]]
+    for output in outputs:
+        if output.endswith(".npz"):
+            write_npz(output, rows)
+        else:
+            write_csv(output, rows)
+        print(f"Wrote {len(rows)} trials to {output}")
+    print(f"Analysed {len(todo) - failed} sessions in {time.perf_counter() - started:.1f} s"
+          + (f", {failed} failed" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
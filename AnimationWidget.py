@@ -1,30 +1,61 @@
-import re
-import xml.etree.ElementTree as ET
-from PyQt5.QtCore import Qt, QTimer, QPointF, pyqtSignal
-from PyQt5.QtGui import QPainter, QPen, QPainterPath
+import numpy as np
+from PyQt5.QtCore import Qt, QPointF, QRectF, pyqtSignal
+from PyQt5.QtGui import QPainter, QPen, QPainterPath, QPixmap, QPolygonF
 from PyQt5.QtWidgets import QWidget, QLabel
-from svgpathtools import parse_path
+from ShapeGeometry import load_geometry
+from SimClock import get_clock
+
+STIMULUS_SCALE = 2.0
+STIMULUS_TOP_LEFT = (1250, 500)
+TEMPLATE_TOP_LEFT = (310, 500)
+FLIP_X = True
+MASK_SVG = "assets/mask.svg"
+PEN_WIDTH = 3
+FRAME_INTERVAL_MS = 8  # ticks faster than the display so no refresh is missed; Qt coalesces the repaints
+
+_path_cache = {}
+
+
+def build_painter_path(points) -> QPainterPath:
+    path = QPainterPath()
+    path.addPolygon(QPolygonF([QPointF(x, y) for x, y in points.tolist()]))
+    return path
+
+
+def load_stimulus(filepath: str, scale: float, flip_x: bool, top_left, reposition: bool = True):
+    """
+    ShapeGeometry and ready-to-draw QPainterPath of a shape; the path is cached too.
+    safe to call from worker threads (QPainterPath is not a QObject)
+    """
+    key = (filepath, float(scale), bool(flip_x), tuple(top_left), bool(reposition))
+    geometry = load_geometry(filepath, scale, flip_x, top_left, reposition)
+    path = _path_cache.get(key)
+    if path is None:
+        path = build_painter_path(geometry.points)
+        _path_cache[key] = path
+    return geometry, path
 
 
 class AnimationWidget(QWidget):
     done = pyqtSignal()
 
-    def __init__(self, parent=None, scale: float = 1.0, template: bool = False):
+    def __init__(self, parent=None, scale: float = 1.0, template: bool = False, clock=None):
         super().__init__(parent)
+        self.clock = clock if clock is not None else get_clock()
         self.setAttribute(Qt.WA_TransparentForMouseEvents)
         self.setAttribute(Qt.WA_TranslucentBackground, True)
         self.setStyleSheet("background: transparent;")
         self.setGeometry(0, 0, parent.width(), parent.height())
 
-        self.flip_x = True
+        self.flip_x = FLIP_X
         self.svg_size = (200, 240)
         self.scale = scale
         self.template = template
 
         if template:
-            self.top_left = QPointF(310, 500)
+            self.top_left = QPointF(*TEMPLATE_TOP_LEFT)
         else:
-            self.top_left = QPointF(1250, 500)
+            self.top_left = QPointF(*STIMULUS_TOP_LEFT)
 
         self.label_top = QLabel(self)
         self.label_top.setStyleSheet(f"color: black; font-size: 28px; background: transparent")
@@ -36,12 +67,22 @@ class AnimationWidget(QWidget):
         #     lbl.setStyleSheet(f"color: black; font-size: {size}px; background: transparent")
 
         self.animated_path = QPainterPath()
-        self.animated_points = []
-        self.animated_index = 0
-
-        self.anim_timer = QTimer(self)
+        self.full_path = QPainterPath()
+        self.shape_geometry = None  # ShapeGeometry of the current shape
+        self.animated_points = np.empty((0, 2))  # screen-space (x, y) of the current shape
+        self.animated_index = 0  # number of animated_points already in animated_path
+        self.anim_tip = None  # exact position of the reveal front, drawn past the last whole point
+        # the revealed part is drawn once into this pixmap (covering the shape), a frame only adds the new points
+        self.reveal = None
+        self.reveal_rect = None
+        self.anim_start_ns = 0
+        self.anim_duration_ns = 0
+        self.anim_frames = 0
+
+        self.anim_timer = self.clock.timer(self)
+        self.anim_timer.setTimerType(Qt.PreciseTimer)
         self.anim_timer.timeout.connect(self._advance_animation)
-        self.hold_timer = QTimer(self)
+        self.hold_timer = self.clock.timer(self)
         self.hold_timer.setSingleShot(True)
         self.hold_timer.timeout.connect(self._end_presentation)
 
@@ -70,21 +111,27 @@ class AnimationWidget(QWidget):
 
     def _show_svg(self, filepath: str, animation_ms: int, pause_ms: int, scale: float, reposition: bool):
         self._load_svg_path(filepath, self.top_left, scale, reposition)
-        if not self.animated_points:
+        if len(self.animated_points) == 0:
             print("No path points loaded.")
             return
 
-        self.animated_index = 0
-        self.animated_path = QPainterPath(self.animated_points[0])
-
-        for pt in self.animated_points[1:]:
-            self.animated_path.lineTo(pt)
-
-        # if animation_ms > 0:
-        #     self.anim_timer.start(int(animation_ms / len(self.animated_points)))
-        # else:
-        #     for pt in self.animated_points[1:]:
-        #         self.animated_path.lineTo(pt)
+        self.anim_timer.stop()
+        if animation_ms > 0 and not self.template:
+            # the reveal progress comes from the clock on every frame, so the shape is complete
+            # after animation_ms whatever the point count or how many frames were late
+            x, y = self.animated_points[0]
+            self.animated_path = QPainterPath(QPointF(x, y))
+            self.animated_index = 1
+            self.anim_tip = None
+            self.anim_frames = 0
+            self.anim_duration_ns = int(animation_ms * 1e6)
+            self.anim_start_ns = self.clock.now_ns()
+            self.anim_timer.start(FRAME_INTERVAL_MS)
+        else:
+            self.animated_index = len(self.animated_points)
+            self.anim_tip = None
+            self.animated_path = QPainterPath(self.full_path)
+        self._reset_reveal()
 
         self.hold_timer.start(animation_ms + pause_ms)
         self._update_label_positions()
@@ -95,89 +142,99 @@ class AnimationWidget(QWidget):
 
     def _load_svg_path(self, filepath: str, top_left: QPointF, scale: float, reposition: bool = True):
         try:
-            root = ET.parse(filepath).getroot()
-
-            # Optional: extract viewBox size
-            if "viewBox" in root.attrib:
-                _, _, w, h = map(float, root.attrib["viewBox"].split())
-                self.svg_size = (w, h)
-
-            # Defaults
-            sx, sy = 1.0, 1.0  # scale factors from SVG <g>
-            tx, ty = 0.0, 0.0  # translation offsets
-
-            # Look for first <g> with a transform attribute
-            for el in root.iter():
-                if el.tag.endswith('g') and 'transform' in el.attrib:
-                    transform = el.attrib['transform']
-
-                    # Parse scale(x[,y])
-                    match = re.search(r"scale\(([^)]+)\)", transform)
-                    if match:
-                        parts = list(map(float, re.split(r"[ ,]+", match.group(1).strip())))
-                        if len(parts) == 1:
-                            sx = sy = parts[0]
-                        elif len(parts) >= 2:
-                            sx, sy = parts[0], parts[1]
-
-                    # Parse translate(x[,y])
-                    match = re.search(r"translate\(([^)]+)\)", transform)
-                    if match and reposition:
-                        parts = list(map(float, re.split(r"[ ,]+", match.group(1).strip())))
-                        if len(parts) == 1:
-                            tx, ty = parts[0], 0.0
-                        elif len(parts) >= 2:
-                            tx, ty = parts[0], parts[1]
-
-                    break  # only first <g> matters
-
-            # Find the first <path> with a 'd' attribute
-            path_element = next(
-                (el for el in root.iter() if el.tag.endswith('path') and 'd' in el.attrib),
-                None
-            )
-            if path_element is None:
-                print("No <path> found in SVG.")
-                return
-
-            d = path_element.attrib['d']
-            path = parse_path(d)
-            num_points = max(int(path.length() / 2), 2)
-
-            flip = -1 if self.flip_x else 1
-            self.animated_points = [
-                QPointF(
-                    flip * path.point(i / num_points).real * sx * scale + tx + top_left.x(),
-                    path.point(i / num_points).imag * sy * scale + ty + top_left.y()
-                )
-                for i in range(num_points)
-            ]
-
+            self.shape_geometry, self.full_path = load_stimulus(filepath, scale, self.flip_x,
+                                                                (top_left.x(), top_left.y()), reposition)
+            self.svg_size = self.shape_geometry.svg_size
+            self.animated_points = self.shape_geometry.points
         except Exception as e:
             print(f"Error loading SVG: {e}")
-            self.animated_points = []
+            self.shape_geometry = None
+            self.animated_points = np.empty((0, 2))
+            self.full_path = QPainterPath()
 
     def _advance_animation(self):
-
-        self.anim_timer.stop()
-
-        # if self.animated_index < len(self.animated_points):
-        #     self.animated_path.lineTo(self.animated_points[self.animated_index])
-        #     self.animated_index += 1
-        #     self.update()
-        # else:
-        #     self.anim_timer.stop()
+        """
+        one animation frame: extend the partial path up to the current progress
+        and repaint only the part of the screen revealed since the last frame
+        """
+        self.anim_frames += 1
+        elapsed_ns = self.clock.now_ns() - self.anim_start_ns
+        progress = min(elapsed_ns / self.anim_duration_ns, 1.0)
+
+        points = self.animated_points
+        # animated_points[i] sits at fraction i / len(points) of the length
+        target = min(int(progress * len(points)) + 1, len(points))
+
+        first = self.animated_index - 1
+        if self.anim_tip is not None:
+            dirty = QRectF(self.anim_tip, self.anim_tip)
+        else:
+            dirty = QRectF(QPointF(*points[first]), QPointF(*points[first]))
+
+        for x, y in points[self.animated_index:target].tolist():
+            self.animated_path.lineTo(x, y)
+        self.animated_index = target
+
+        tip_x, tip_y = self.shape_geometry.position_at(progress).tolist()
+        new_points = points[first:target]
+        painter = self._reveal_painter()
+        if painter is not None:
+            if len(new_points) > 1:
+                painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in new_points.tolist()]))
+            if progress >= 1.0:
+                painter.drawLine(QPointF(*points[target - 1]), QPointF(tip_x, tip_y))
+            painter.end()
+        left = min(new_points[:, 0].min(), tip_x)
+        top = min(new_points[:, 1].min(), tip_y)
+        right = max(new_points[:, 0].max(), tip_x)
+        bottom = max(new_points[:, 1].max(), tip_y)
+        dirty = dirty.united(QRectF(left, top, right - left, bottom - top))
+
+        if progress >= 1.0:
+            self.animated_path.lineTo(tip_x, tip_y)
+            self.anim_tip = None
+            self.anim_timer.stop()
+            print(f"Animation finished in {elapsed_ns / 1e6:.0f} ms "
+                  f"(nominal {self.anim_duration_ns / 1e6:.0f} ms, {self.anim_frames} frames).")
+        else:
+            self.anim_tip = QPointF(tip_x, tip_y)
+
+        margin = PEN_WIDTH
+        self.update(dirty.adjusted(-margin, -margin, margin, margin).toAlignedRect())
+
+    def _pen(self):
+        return QPen(Qt.blue if self.template else Qt.black, PEN_WIDTH)
+
+    def _reset_reveal(self):
+        """new reveal pixmap around the current shape, holding animated_path as revealed so far"""
+        dpr = self.devicePixelRatioF()
+        margin = PEN_WIDTH
+        self.reveal_rect = self.full_path.boundingRect().adjusted(-margin, -margin, margin, margin).toAlignedRect()
+        self.reveal = QPixmap(self.reveal_rect.size() * dpr)
+        self.reveal.setDevicePixelRatio(dpr)
+        self.reveal.fill(Qt.transparent)
+        painter = self._reveal_painter()
+        painter.drawPath(self.animated_path)
+        painter.end()
+
+    def _reveal_painter(self):
+        """QPainter on the reveal pixmap in widget coordinates, None when there is no pixmap"""
+        if self.reveal is None or self.reveal.isNull():
+            return None
+        painter = QPainter(self.reveal)
+        painter.translate(-QPointF(self.reveal_rect.topLeft()))
+        painter.setPen(self._pen())
+        return painter
 
     def paintEvent(self, event):
         if not self.animated_path.isEmpty():
+            if self.reveal is None or self.reveal.devicePixelRatioF() != self.devicePixelRatioF():
+                self._reset_reveal()  # e.g. moved to a screen with another scale factor
             painter = QPainter(self)
-
-            if self.template:
-                painter.setPen(QPen(Qt.blue, 3))
-            else:
-                painter.setPen(QPen(Qt.black, 3))
-
-            painter.drawPath(self.animated_path)
+            painter.drawPixmap(self.reveal_rect.topLeft(), self.reveal)
+            if self.anim_tip is not None:
+                painter.setPen(self._pen())
+                painter.drawLine(self.animated_path.currentPosition(), self.anim_tip)
 
     def _update_label_positions(self):
         width = self.width()
@@ -201,7 +258,10 @@ class AnimationWidget(QWidget):
         self.anim_timer.stop()
         self.hold_timer.stop()
         self.animated_path = QPainterPath()
-        self.animated_points.clear()
+        self.animated_points = np.empty((0, 2))
+        self.animated_index = 0
+        self.anim_tip = None
+        self.reveal = None
         self.label_top.hide()
         #self.label_bottom.hide()
         self.update()
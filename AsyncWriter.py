@@ -0,0 +1,206 @@
+import queue
+import threading
+import time
+
+WRITER_POLICIES = ("block", "drop")
+
+
+class _Op:
+    """A control operation (open/close section, ...) executed in order on the writer thread."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.done = threading.Event()
+        self.error = None
+
+
+_DISCARD = object()
+_STOP = object()
+
+
+class BackgroundWriter:
+    """
+    Moves disk I/O off the GUI thread.
+    Producers call put() with samples and submit() with control operations;
+    a dedicated thread drains the bounded queue, hands samples to `sink` in
+    batches and runs operations in the order they were queued.
+
+    When the queue is full, policy "block" waits up to `put_timeout` seconds
+    (backpressure) before dropping the sample, policy "drop" drops it at once.
+    Dropped samples are counted, never silently lost.
+    """
+
+    def __init__(self, sink, max_queue: int = 65536, max_batch: int = 512,
+                 flush_interval: float = 0.02, policy: str = "block",
+                 put_timeout: float = 0.005, name: str = "DataWriter"):
+        if policy not in WRITER_POLICIES:
+            raise ValueError(f"Unknown writer policy: {policy}")
+        self.sink = sink
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+
+        # counters
+        self.max_queue_depth = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.discarded = 0
+        self.written = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.errors = 0
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    # --- producer side (GUI thread) ---
+
+    def put(self, sample) -> bool:
+        """
+        queue one sample, returns False if it had to be dropped
+        """
+        try:
+            self._queue.put_nowait(sample)
+        except queue.Full:
+            if self.policy == "drop":
+                self.dropped += 1
+                return False
+            self.backpressure_waits += 1
+            try:
+                self._queue.put(sample, timeout=self.put_timeout)
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+        self.enqueued += 1
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    def submit(self, fn, wait: bool = False):
+        """
+        queue a control operation; it runs after every sample queued before it
+        """
+        op = _Op(fn)
+        self._queue.put(op)
+        if wait:
+            op.done.wait()
+            if op.error is not None:
+                raise op.error
+        return op
+
+    def discard(self):
+        """
+        drop samples that are queued but not yet handed to the sink
+        """
+        self._queue.put(_DISCARD)
+
+    def sync(self):
+        """
+        block until everything queued so far has been written
+        """
+        self.submit(lambda: None, wait=True)
+
+    def close(self):
+        """
+        write everything that is queued and stop the writer thread
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "backpressure_waits": self.backpressure_waits,
+            "discarded": self.discarded,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "mean_batch_size": self.written / self.batches if self.batches else 0.0,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "mean_flush_ms": self.total_flush_ms / self.batches if self.batches else 0.0,
+            "errors": self.errors,
+        }
+
+    # --- writer thread ---
+
+    def _write(self, batch):
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            self.sink(batch)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            print(f"Error writing data: {e}")
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        self.written += len(batch)
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+
+    def _run_op(self, op):
+        try:
+            op.fn()
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            op.error = e
+            print(f"Error in writer operation: {e}")
+        op.done.set()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            # collect for up to flush_interval so the sink sees real batches
+            deadline = time.perf_counter() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    self._write(batch)
+                    return
+                elif item is _DISCARD:
+                    self.discarded += len(batch)
+                    batch = []
+                elif isinstance(item, _Op):
+                    self._write(batch)
+                    batch = []
+                    self._run_op(item)
+                else:
+                    batch.append(item)
+                    if len(batch) >= self.max_batch:
+                        self._write(batch)
+                        batch = []
+
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write(batch)
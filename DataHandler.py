@@ -1,59 +1,222 @@
 import datetime
 import json
-import time
-import requests
+import os
 
-BUCKET_NAME = 'shape-dependent-tracking-2025'
+from AsyncWriter import BackgroundWriter
+from Journal import TrialJournal, journal_path_for, rebuild_session
+from SampleStore import SAMPLE_FIELDS, ColumnSessionWriter
+from TimingStats import TrialClock, clock_anchor
+from TrialIndex import TrialIndexWriter, index_path_for
+from Outbox import OutboxDrainer, get_outbox
+from SimClock import get_clock
+
+EXP_NAME = 'shape-dependent-tracking-2025'
+OUTPUT_FORMATS = ("json", "journal", "binary")
+# files written before json_layout was added lack the closing brace of each trial's last
+# sample (SessionReader repairs those)
+JSON_LAYOUT = 2
 META_DATA_FORMAT = """
     "pid": "{}",
     "exp": "shape-dependent-tracking-2025",
     "start_time": "{}",
-    "data": ["""
+    "json_layout": %d,{}
+    "data": [""" % JSON_LAYOUT
 
 NEW_SECTION_FORMAT = """
             "trial_num": "{}",
             "trial_info": "{}",
+            "clock_anchor": {},
             "data" : [ 
 """
 
+HOST_NS_INDEX = SAMPLE_FIELDS.index("HostTimeNs")
+POS_X_INDEX = SAMPLE_FIELDS.index("posX")
+POS_Y_INDEX = SAMPLE_FIELDS.index("posY")
+
+
 class DataHandler():
 
-    def __init__(self, pid: str, output_file: str, s3_flag: bool = False):
+    def __init__(self, pid: str, output_file: str, s3_flag: bool = False, output_format: str = "json",
+                 writer_policy: str = "block", metadata: dict = None, clock=None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
         self.pid = pid
         self.start_time = str(datetime.datetime.now())
         self.buffer = []
-        self.output_file = output_file
-        self.output_stream = open(output_file, 'w', encoding='utf-8')
+        self.output_format = output_format
         self.section_num = 0
-        self.__write_metadata()
         self.s3_flag = s3_flag
+        self.clock = clock if clock is not None else get_clock()  # must be the clock the samples are stamped with
+        # extra top-level session fields; the clock anchor maps HostTimeNs to wall-clock time
+        self.metadata = dict(metadata or {})
+        self.metadata["clock_anchor"] = clock_anchor(self.clock)
+
+        # timing quality of the trial being written (writer thread)
+        self.trial_clock = TrialClock()
+        self.trial_open = False
+        self.trial_timing = []
+        # where the open section starts in the session file and how many samples it got, for the index
+        self.section_offset = 0
+        self.section_samples = 0
+        self.section_info = None
+        # json: separators are written before the next sample/section instead of being truncated away
+        self.sample_sep = ""
+        self.section_sep = "\n"
+
+        if output_format == "binary":
+            # one directory per session: header.json + trial_XXXX.npy
+            self.output_file = os.path.splitext(output_file)[0]
+            self.output_stream = None
+            self.columns = ColumnSessionWriter(self.output_file, pid, EXP_NAME, self.start_time, self.metadata)
+            self.journal = None
+            self.index = None  # header.json lists the trials
+        elif output_format == "journal":
+            # append-only records, the JSON file is rebuilt from them in close_file
+            self.output_file = output_file
+            self.output_stream = None
+            self.columns = None
+            self.journal = TrialJournal(journal_path_for(output_file), pid, EXP_NAME, self.start_time,
+                                        metadata=self.metadata)
+            self.index = TrialIndexWriter(index_path_for(self.journal.path))
+        else:
+            self.output_file = output_file
+            self.output_stream = open(output_file, 'w', encoding='utf-8')
+            self.columns = None
+            self.journal = None
+            self.index = TrialIndexWriter(index_path_for(output_file))
+            self.__write_metadata()
+
+        # every write below this point happens on the writer thread
+        self.writer = BackgroundWriter(self.__write_batch, policy=writer_policy)
 
     def start_new_section(self, info, first=False):
-        if not first:
-            self.__close_section()
-        self.buffer = []
-        self.output_stream.write("\n\t\t{" + NEW_SECTION_FORMAT.format(self.section_num, info))
+        section_num = self.section_num
         self.section_num += 1
+        anchor = clock_anchor(self.clock)
+        self.writer.submit(lambda: self.__start_section(section_num, info, anchor))
 
+    def start_stroke(self):
+        """
+        the pen touched down: the next sample starts a stroke (timing gaps are measured within strokes)
+        """
+        self.writer.submit(self.trial_clock.start_stroke)
+
+    def write_sample(self, *values):
+        """
+        queue one sample given in SAMPLE_FIELDS order
+        """
+        self.writer.put(values)
 
     def write_data(self, data):
         """
-        write data to file
+        queue one sample given as a {field: value} dict
         """
-        print(data)
-        self.buffer.append(data)
+        self.writer.put(data)
 
-        if len(self.buffer) > 10:
-            self.__flush_buffer()
+    def writer_stats(self):
+        """
+        queue depth, batch size and flush latency counters of the writer thread
+        """
+        return self.writer.stats()
 
-    def close_file(self):
-        self.__flush_buffer()
-        self.__handle_closing_text()
-        self.output_stream.close()
+    def close_file(self, upload: bool = True):
+        """
+        write everything out and close the session file.
+        with s3_flag set the file is queued in the outbox; upload=False leaves
+        draining the outbox to the caller (e.g. a DrainThread)
+        """
+        self.writer.close()
+        stats = self.writer.stats()  # the full counters are in writer_stats()
+        if stats["dropped"] or stats["errors"]:
+            print(f"Writer lost data: {stats['dropped']} samples dropped, {stats['errors']} failed writes")
+        if self.trial_open:
+            self.__end_section()
+        if self.index is not None:
+            self.index.close()
+        if self.columns is not None:
+            self.columns.close()
+            if self.s3_flag and upload:
+                print("Upload is not supported for the binary output format.")
+            return
+        if self.journal is not None:
+            self.journal.close()
+            summary = rebuild_session(self.journal.path, self.output_file)
+            print(f"Session file written from journal: {summary}")
+        else:
+            self.__handle_closing_text()
+            self.output_stream.close()
         if self.s3_flag:
-            self.upload_data()
+            get_outbox().enqueue(self.output_file, self.pid)
+            if upload:
+                self.upload_data()
         self.buffer = []
 
+    def __start_section(self, section_num, info, anchor):
+        if self.trial_open:
+            self.__end_section()
+        self.trial_clock.reset()
+        self.trial_open = True
+        self.current_section = section_num
+        self.section_info = info
+        self.section_samples = 0
+
+        if self.columns is not None:
+            self.columns.start_section(section_num, info, anchor)
+        elif self.journal is not None:
+            self.section_offset = self.journal.position()
+            self.journal.start_trial(section_num, info, anchor)
+        else:
+            self.buffer = []
+            self.output_stream.write(self.section_sep)
+            self.section_sep = ",\n"
+            self.sample_sep = ""
+            self.section_offset = self.output_stream.tell()  # the line holding the section's "{"
+            self.output_stream.write("\t\t{" + NEW_SECTION_FORMAT.format(section_num, info, json.dumps(anchor)))
+
+    def __end_section(self):
+        timing = self.trial_clock.stats()
+        self.trial_timing.append((self.current_section, timing))
+        self.trial_open = False
+        if timing["samples"] and not timing["accepted"]:
+            print(f"Trial {self.current_section} failed timing checks: {', '.join(timing['reject_reasons'])}")
+
+        if self.columns is not None:
+            self.columns.close_section(timing)
+            return
+        if self.journal is not None:
+            self.journal.end_trial(timing)
+            end = self.journal.position()
+        else:
+            self.__close_section(timing)
+            end = self.output_stream.tell()  # up to the closing brace
+        self.index.add(self.current_section, self.section_info, self.section_offset, end - self.section_offset,
+                       self.section_samples)
+
+    def __write_batch(self, batch):
+        """
+        sink of the writer thread, gets every queued sample in order
+        """
+        for item in batch:
+            if isinstance(item, dict):
+                self.trial_clock.add(item.get("HostTimeNs"), item.get("posX"), item.get("posY"))
+            elif len(item) > HOST_NS_INDEX:
+                self.trial_clock.add(item[HOST_NS_INDEX], item[POS_X_INDEX], item[POS_Y_INDEX])
+        self.section_samples += len(batch)
+        if self.columns is not None:
+            store = self.columns.store
+            for item in batch:
+                if isinstance(item, dict):
+                    store.append_dict(item)
+                else:
+                    store.append(item)
+            return
+        if self.journal is not None:
+            self.journal.write_samples(batch)
+            return
+        for item in batch:
+            self.buffer.append(item if isinstance(item, dict) else dict(zip(SAMPLE_FIELDS, item)))
+        self.__flush_buffer()
+
     def __flush_buffer(self):
         """
         flush the buffer to file and start new buffer
@@ -61,7 +224,8 @@ class DataHandler():
         if len(self.buffer) > 0:
             sep = ',\n' + '\t'*4
             # Join the buffer items into a string if it's a list of items.
-            content = '\t'*4 + sep.join(str(item) for item in self.buffer) + ',\n'
+            content = self.sample_sep + '\t'*4 + sep.join(str(item) for item in self.buffer)
+            self.sample_sep = ',\n'
 
             # Write the content to the file without the brackets
             self.output_stream.write(content.replace("'", '"'))
@@ -74,93 +238,37 @@ class DataHandler():
         """
         clear the buffer
         """
+        self.writer.discard()
+        self.writer.submit(self.__clear_pending)
+
+    def __clear_pending(self):
         self.buffer = []
+        if self.columns is not None:
+            self.columns.store.clear()
+            self.trial_clock.reset()
 
     def __write_metadata(self):
-        data = "{" + META_DATA_FORMAT.format(self.pid, self.start_time)
+        extra = "".join(f'\n    {json.dumps(key)}: {json.dumps(value)},' for key, value in self.metadata.items())
+        data = "{" + META_DATA_FORMAT.format(self.pid, self.start_time, extra)
         self.output_stream.write(data)
 
-    def __close_section(self):
+    def __close_section(self, timing):
         self.__flush_buffer()
-        self.output_stream.seek(self.output_stream.tell() - 3, 0)
-        self.output_stream.truncate()
-        self.output_stream.write("\n\t\t\t]\n\t\t},")
-
-    def __read_file(self):
-        """
-        read data from file
-        """
-        with open(self.output_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-
+        self.output_stream.write(("\n" if self.sample_sep else "") + "\t\t\t],\n\t\t\t\"timing\": "
+                                 + json.dumps(timing) + "\n\t\t}")
 
     def __handle_closing_text(self):
-        self.__close_section()
-        self.output_stream.seek(self.output_stream.tell() -3, 0)
-        self.output_stream.truncate()
-        self.output_stream.write("\t}\n\t]\n}")
-
-    def __read_file_as_json_string(self):
-        try:
-            with open(self.output_file, 'r') as file:
-                # Read the content of the file
-                file_content = file.read()
-                # Convert to a JSON-encoded string
-                return json.dumps(file_content)
-        except Exception as e:
-            print(f"Error reading file: {e}")
-            return None
-
-    def __do_upload_data(self):
-        """
-        recursive call for uploading data
-        """
-
-        url = 'https://hss74dd1ed.execute-api.us-east-1.amazonaws.com/dev/'
-        headers = {
-            'Content-Type': 'application/json',  # Matches `contentType` in JavaScript
-            'User-Agent': 'Mozilla/5.0',  # Optional: Mimics browser behavior
-            'Accept': 'application/json',  # Optional: Indicates expected response type
-        }
-
-        data = {
-            "subject_id": str(self.pid),
-            "bucket": BUCKET_NAME,
-            "exp_data": self.__read_file_as_json_string(),  # Ensure the data is JSON-stringified
-        }
-
-        response = requests.post(
-            url,
-            headers=headers,
-            json=data
-        )
-
-        if response.status_code == 200:
-            print("Data uploaded successfully! Clicking OK will close the experiment.")
-            # Simulate closing the experiment or redirect here
-        else:
-            print("Failed to upload data.")
-            print(f"Status Code: {response.status_code}")
-            print(f"Response Text: {response.text}")
-            raise requests.exceptions.RequestException
+        self.output_stream.write("\n\t]\n}\n")
 
     def upload_data(self):
         """
-        upload data to s3
+        upload data to s3 by draining the outbox once (blocking, see Outbox.DrainThread
+        for the background version). whatever fails stays queued for the next drain
         """
-        retries = 0
-        max_retries = 5
-        backoff_factor = 2  # Exponential backoff multiplier
-
-        while retries < max_retries:
-            try:
-                self.__do_upload_data()
-                return  # Exit the loop if upload is successful
-            except requests.exceptions.RequestException as e:
-                retries += 1
-                wait_time = backoff_factor ** retries  # Exponential backoff
-                print(f"Upload failed. Attempt {retries}/{max_retries}. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-
-        print("Max retries reached. Upload failed.")
\ No newline at end of file
+        drainer = OutboxDrainer(get_outbox())
+        try:
+            uploaded, failed = drainer.drain_once()
+        finally:
+            drainer.close()
+        if failed:
+            print(f"{failed} upload(s) failed, they stay in the outbox for the next attempt.")
@@ -1,28 +1,61 @@
 import time
 from PyQt5.QtWidgets import QWidget, QShortcut, QApplication, QLabel, QPushButton
-from PyQt5.QtGui import QPainter, QPen, QKeySequence, QColor
-from PyQt5.QtCore import Qt, QTimer, QPoint, QPointF, QRect
+from PyQt5.QtGui import QPainter, QPen, QKeySequence, QColor, QPixmap
+from PyQt5.QtCore import Qt, QPoint, QPointF, QRect, QRectF, QEvent
 from PyQt5.QtSvg import QSvgRenderer
-from AnimationWidget import AnimationWidget
-import random
+from AnimationWidget import AnimationWidget, STIMULUS_SCALE, MASK_SVG
 from settings_singleton import Settings
 from DataHandler import DataHandler
+from Outbox import DrainThread
+from TailRenderer import TailRenderer
+from StrokeStore import StrokeStore, DEFAULT_RING_SIZE
+from TrialScheduler import TrialScheduler
+from SimClock import get_clock
+from SpatialIndex import grid_for
 
 NO_DATA = -999
+SAVING_TEXT = "סיימתם את המטלה. תודה שהשתתפתם!"
+SAVING_LABEL_MS = 3000  # minimum time the closing label stays on screen
+MAX_LINE_WIDTH = 4  # widest pen a segment can get (pressure 1.0 on a tablet)
+DEFAULT_REFRESH_HZ = 60.0
 settings = Settings()
 
 class DrawingWidget(QWidget):
     """Widget for the drawing task."""
-    def __init__(self, data_handler: DataHandler, show_template=True, scale=1.0):
+    def __init__(self, data_handler: DataHandler, show_template=True, scale=1.0, scheduler: TrialScheduler = None,
+                 clock=None):
         super().__init__()
-        self.shapes = None
+        self.scheduler = scheduler
+        # every timer of the trial flow and the sample timestamps come from this clock (SimClock.py)
+        self.clock = clock if clock is not None else get_clock()
+        # static layer (background and both frames), rebuilt only when the size changes
+        self.background = None
+        self.background_size = None
+        self.frame_rects = None  # (left, right) frame rects for the current size
         self.showFullScreen()
         self.drawing = False
         self.play = False
+        self.closing = False
         self.first_shape = True
         self.shape_tuple = ("assets/shape6.svg", "medium", False)
         self.last_point = QPoint()
-        self.lines = []
+        tail_length = settings.get_tail_length()
+        # the full stroke (tail_length=0) is drawn from the store, so it keeps the history then
+        self.strokes = StrokeStore(ring_size=max(DEFAULT_RING_SIZE, 2 * tail_length + 2),
+                                   history=settings.get_stroke_history() or tail_length == 0)
+        self.tail_renderer = TailRenderer(self.strokes, tail_length)
+
+        # repaints: pen events only mark the screen dirty, one frame timer repaints it
+        self.tail_rect = QRect()  # area covered by the tail at the last repaint
+        self.dirty_pending = False
+        self.repaint_timer = self.clock.timer(self)
+        self.repaint_timer.setSingleShot(True)
+        self.repaint_timer.setTimerType(Qt.PreciseTimer)
+        self.repaint_timer.timeout.connect(self._flush_repaint)
+        self.paint_count = 0
+        self.paint_time_ns = 0
+        self.max_paint_time_ns = 0
+        self.repaint_requests = 0
 
         #mesures
         self.posX = NO_DATA
@@ -31,9 +64,20 @@ class DrawingWidget(QWidget):
         self.pen_tiltY = NO_DATA
         self.pen_pressure = NO_DATA
         self.time_stamp = NO_DATA
+        self.event_time_stamp = NO_DATA  # Qt event timestamp (ms) of the last pointer event
+
+        # distance of every sample to the shape being copied (TrackingError column), for live QC
+        self.tracking_grid = None
+        self.tracking_count = 0
+        self.tracking_sum = 0.0
+        self.tracking_sum2 = 0.0
+
+        # "event": one sample per tablet/mouse event, "poll": sample the last state every 1 ms
+        self.capture_mode = settings.get_capture_mode()
+        self.tablet_in_use = False
 
         # Timer for sampling cursor positions
-        self.sampling_timer = QTimer(self)
+        self.sampling_timer = self.clock.timer(self)
         self.sampling_timer.timeout.connect(self.sample_cursor_position)
 
         #start data handler
@@ -51,12 +95,12 @@ class DrawingWidget(QWidget):
         self.drawing_duration = int(settings.get_drawing_duration() * 1000)  # Convert to milliseconds
         self.transition_duration = int(settings.get_transition_duration() * 1000)  # Convert to milliseconds
 
-        self.drawing_timer = QTimer(self)
+        self.drawing_timer = self.clock.timer(self)
         self.drawing_timer.setSingleShot(True)
         self.drawing_timer.timeout.connect(self.start_transition)
         self.drawing_timer.setInterval(self.drawing_duration)
 
-        self.transition_timer = QTimer(self)
+        self.transition_timer = self.clock.timer(self)
         self.transition_timer.setSingleShot(True)
         #self.transition_timer.timeout.connect(self.clear_canvas)
         self.transition_timer.timeout.connect(self.start_visual_mask)
@@ -89,30 +133,33 @@ class DrawingWidget(QWidget):
 
         self._position_ready_ui()  # <-- place inside right rectangle
 
-        # Initialize shapes from settings
-        self.shapes = settings.get_selected_shapes()
+        # Trial order, fixed for the whole session
+        if self.scheduler is None:
+            self.scheduler = TrialScheduler(settings.get_selected_shapes(), mode=settings.get_schedule_mode(),
+                                            seed=settings.get_schedule_seed(),
+                                            participant_index=settings.get_participant_index())
 
         # Example shape
-        self.example_widget = AnimationWidget(self, scale=2.0)
+        self.example_widget = AnimationWidget(self, scale=STIMULUS_SCALE, clock=self.clock)
         self.example_widget.hide()
         self.example_widget.done.connect(self.start_drawing)
 
         # Visual mask
-        self.visual_mask = AnimationWidget(self, scale=2.0)
+        self.visual_mask = AnimationWidget(self, scale=STIMULUS_SCALE, clock=self.clock)
         self.visual_mask.hide()
         self.visual_mask.done.connect(self.start_drawing)
 
         # Corner template
         corner_scale = settings.get_corner_scale()
-        self.corner_template = AnimationWidget(self, scale=2.0, template=True)
+        self.corner_template = AnimationWidget(self, scale=STIMULUS_SCALE, template=True, clock=self.clock)
         self.corner_template.hide()
 
 
         # Start the first drawing session
-        QTimer.singleShot(100, self.start_transition)
+        self.clock.single_shot(100, self.start_transition)
 
         # "Saving Data" label
-        self.saving_label = QLabel("סיימתם את המטלה. תודה שהשתתפתם!", self)
+        self.saving_label = QLabel(SAVING_TEXT, self)
         self.saving_label.setStyleSheet("color: black; font-size: 48px; font-weight: bold; background-color: white;")
         self.saving_label.setAlignment(Qt.AlignCenter)
         self.saving_label.setGeometry(0, 0, self.width(), self.height())
@@ -125,15 +172,10 @@ class DrawingWidget(QWidget):
 
 
     def pop_random_shape(self):
-        if not self.shapes:
-            return False, False, False  # or raise an exception
-
-        choice = random.choice(list(self.shapes))
-        self.shapes.remove(choice)
-        return choice[0], choice[1], choice[2]  # Return the SVG file and speed
+        return self.scheduler.next_trial()  # (SVG file, speed, hide_template)
 
-    def _drawing_rect(self):
-        """Right rectangle: 2/3 width & height, vertically centered, with margins and gap."""
+    def _layout_frames(self):
+        """Left (no-draw) and right (draw) rectangles: 2/3 height, vertically centered, with margins and gap."""
         w, h = self.width(), self.height()
         margin = 10
         gap = 10
@@ -141,26 +183,24 @@ class DrawingWidget(QWidget):
         top = (h - rect_h) // 2
 
         left_rect_width = (w - (2 * margin) - gap) // 3
+        r_left = QRect(margin, top, left_rect_width, rect_h)
+
         right_left = margin + left_rect_width + gap
         right_width = w - 2 * margin - left_rect_width - gap
-        return QRect(right_left, top, right_width, rect_h)
+        r_right = QRect(right_left, top, right_width, rect_h)
+        self.frame_rects = (r_left, r_right)
+        return self.frame_rects
 
-    def _paint_setup(self, painter):
-        """Place settings/layout only: margins, rectangles, pens, and draw the two frames."""
-        w, h = self.width(), self.height()
-        margin = 10
-        gap = 10
-        rect_h = (2 * h) // 3
-        top = (h - rect_h) // 2
-
-        # Left (no-draw) rectangle
-        left_rect_width = (w - (2 * margin) - gap) // 3
-        r_left = QRect(margin, top, left_rect_width, rect_h)
+    def _drawing_rect(self):
+        """Right rectangle: 2/3 width & height, vertically centered, with margins and gap."""
+        if self.frame_rects is None:
+            self._layout_frames()
+        return self.frame_rects[1]
 
-        # Right (draw) rectangle
-        r_right = self._drawing_rect()
+    def _paint_setup(self, painter):
+        """Draw the two frames."""
+        r_left, r_right = self.frame_rects or self._layout_frames()
 
-        # Draw both frames
         pen = QPen(Qt.black, 3, Qt.SolidLine)
         painter.setPen(pen)
         painter.drawRect(r_left)
@@ -168,29 +208,25 @@ class DrawingWidget(QWidget):
 
         return r_left, r_right
 
-    from PyQt5.QtGui import QColor
+    def _build_background(self):
+        """Render the static layer at device resolution, so it is blitted 1:1 on HiDPI screens."""
+        self._layout_frames()
+        dpr = self.devicePixelRatioF()
+        self.background = QPixmap(max(int(self.width() * dpr), 1), max(int(self.height() * dpr), 1))
+        self.background.setDevicePixelRatio(dpr)
+        self.background.fill(self.palette().window().color())
+
+        painter = QPainter(self.background)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        self._paint_setup(painter)
+        painter.end()
+        self.background_size = self.size()
 
     def _paint_lines(self, painter, clip_rect):
         """Draw only the last N user lines with gradient fading."""
         painter.save()
         painter.setClipRect(clip_rect.adjusted(2, 2, -2, -2))
-
-        tail_len = 30
-        lines_to_draw = self.lines[-tail_len:]
-        n = len(lines_to_draw)
-
-        for i, line in enumerate(lines_to_draw):
-            # Fade from transparent (old) to opaque (new)
-            alpha = int(255 * (i + 1) / n) if n > 0 else 255
-            base_color = QColor(Qt.black)
-            base_color.setAlpha(alpha)
-
-            pen = QPen(base_color, line['width'], Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
-            painter.setPen(pen)
-            pts = line['points']
-            if len(pts) >= 2:
-                painter.drawLine(pts[0], pts[1])
-
+        self.tail_renderer.draw(painter)
         painter.restore()
 
     def _position_ready_ui(self):
@@ -208,19 +244,75 @@ class DrawingWidget(QWidget):
                             r.y() + r.height() // 2 + 100)
 
     def paintEvent(self, event):
+        start = time.perf_counter_ns()  # real time: this measures the cost of the paint, not the session clock
+        if self.background is None or self.background_size != self.size() \
+                or self.background.devicePixelRatioF() != self.devicePixelRatioF():
+            self._build_background()  # resized, or moved to a screen with another scale factor
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing, True)
 
-        # 1) Setup/layout (frames, pens, etc.)
-        _, r_right = self._paint_setup(painter)
+        # 1) Static frames: copy the damaged part of the cached layer
+        target = QRectF(event.rect())
+        dpr = self.background.devicePixelRatio()
+        source = QRectF(target.x() * dpr, target.y() * dpr, target.width() * dpr, target.height() * dpr)
+        painter.drawPixmap(target, self.background, source)
+        r_right = self.frame_rects[1]
+
+        painter.setRenderHint(QPainter.Antialiasing, True)
 
         # 2) Draw lines only (inside right rectangle)
         self._paint_lines(painter, r_right)
+        painter.end()
+
+        elapsed = time.perf_counter_ns() - start
+        self.paint_count += 1
+        self.paint_time_ns += elapsed
+        self.max_paint_time_ns = max(self.max_paint_time_ns, elapsed)
+
+    def _refresh_interval_ms(self):
+        screen = self.screen() if hasattr(self, "screen") else None
+        refresh_hz = screen.refreshRate() if screen is not None else 0
+        return max(int(1000 / (refresh_hz if refresh_hz > 0 else DEFAULT_REFRESH_HZ)), 1)
+
+    def _add_line(self, p0, p1, width, pressure):
+        """Append a stroke segment and schedule a repaint for the next display frame."""
+        self.strokes.add_segment(p0.x(), p0.y(), p1.x(), p1.y(), width, pressure)
+        self.repaint_requests += 1
+        self.dirty_pending = True
+        if not self.repaint_timer.isActive():
+            self.repaint_timer.start(self._refresh_interval_ms())
+
+    def _flush_repaint(self):
+        """
+        repaint the segments added since the last frame together with the whole
+        fading tail: the tail as it is now plus where it was last time
+        """
+        if not self.dirty_pending:
+            return
+        self.dirty_pending = False
+
+        tail_rect = self.tail_renderer.bounding_rect().toAlignedRect()
+        margin = MAX_LINE_WIDTH + 2
+        tail_rect = tail_rect.adjusted(-margin, -margin, margin, margin)
+
+        self.update(tail_rect.united(self.tail_rect))
+        self.tail_rect = tail_rect
+
+    def paint_stats(self):
+        """repaint counters, to check the GUI thread keeps up with the pen"""
+        return {
+            "paints": self.paint_count,
+            "repaint_requests": self.repaint_requests,
+            "mean_paint_ms": self.paint_time_ns / self.paint_count / 1e6 if self.paint_count else 0.0,
+            "max_paint_ms": self.max_paint_time_ns / 1e6,
+            "total_paint_ms": self.paint_time_ns / 1e6,
+        }
 
     def start_drawing(self):
         """Begin a new drawing phase."""
         self.data_handler.clear_buffer()
-        self.sampling_timer.start(1)
+        self.tablet_in_use = False
+        if self.capture_mode == "poll":
+            self.sampling_timer.start(1)
         self.drawing_timer.start(self.drawing_duration)
         self.play = True
         self.drawing = False
@@ -236,7 +328,7 @@ class DrawingWidget(QWidget):
         self.ok_button.show()
 
     def start_visual_mask(self):
-        self.example_widget.show_svg("assets/mask.svg", "no animation")
+        self.example_widget.show_svg(MASK_SVG, "no animation")
         self.start_drawing()
 
     def _on_ready_clicked(self):
@@ -247,12 +339,14 @@ class DrawingWidget(QWidget):
             self.close_file()
             return
 
-        QTimer.singleShot(self.transition_duration, self._show_example_shape)
+        self.clock.single_shot(self.transition_duration, self._show_example_shape)
 
     def _show_example_shape(self):
         shape, speed, hide_template = self.shape_tuple
         print(f"Showing shape: {shape}, speed: {speed}, hide_template: {hide_template}")
         self.example_widget.show_svg(shape, speed)
+        geometry = self.example_widget.shape_geometry
+        self.tracking_grid = grid_for(geometry) if geometry is not None and geometry.length > 0 else None
 
         if hide_template:
             self.corner_template.hide()
@@ -265,28 +359,38 @@ class DrawingWidget(QWidget):
         if event.button() == Qt.LeftButton and self.play:
             self.drawing = True
             self.last_point = event.pos()
-            self.sampling_timer.start(1)  # Start sampling at 140Hz
+            if not self.tablet_in_use:
+                self.data_handler.start_stroke()
+            if self.capture_mode == "poll":
+                self.sampling_timer.start(1)  # Start sampling at 140Hz
 
 
     def tabletEvent(self, event):
         """Handle tablet events for capturing pen pressure."""
         if self.play:
+            self.tablet_in_use = True
+            if event.type() == QEvent.TabletPress:
+                self.drawing = True
+                self.last_point = event.pos()
+                self.data_handler.start_stroke()
+                if self.capture_mode == "poll":
+                    self.sampling_timer.start(1)
+            elif event.type() == QEvent.TabletRelease:
+                self.drawing = False
+                self.sampling_timer.stop()
+
             self.pen_pressure = event.pressure()
             self.pen_tiltX = event.xTilt()
             self.pen_tiltY = event.yTilt()
             self.posX = event.pos().x()
             self.posY = event.pos().y()
+            self.event_time_stamp = event.timestamp()
+            if self.capture_mode == "event" and (self.drawing or event.type() == QEvent.TabletRelease):
+                self._record_sample()
 
             current_point = event.pos()
-            line = {
-                'color': Qt.black,
-                'width': 4 * self.pen_pressure,
-                'points': [self.last_point, current_point]
-            }
-
-            self.lines.append(line)
+            self._add_line(self.last_point, current_point, MAX_LINE_WIDTH * self.pen_pressure, self.pen_pressure)
             self.last_point = current_point
-            self.update()
 
 
     def mouseMoveEvent(self, event):
@@ -297,16 +401,13 @@ class DrawingWidget(QWidget):
             pressure = self.pen_pressure if self.pen_pressure > 0 else 0.5
             self.posX = current_point.x()
             self.posY = current_point.y()
+            # with a pen the same movement was already recorded by tabletEvent
+            if self.capture_mode == "event" and self.drawing and not self.tablet_in_use:
+                self.event_time_stamp = event.timestamp()
+                self._record_sample()
 
-            line = {
-                'color': Qt.black,
-                'width': 2 * pressure,
-                'points': [self.last_point, current_point]
-            }
-
-            self.lines.append(line)
+            self._add_line(self.last_point, current_point, 2 * pressure, pressure)
             self.last_point = current_point
-            self.update()
 
 
     def mouseReleaseEvent(self, event):
@@ -317,23 +418,43 @@ class DrawingWidget(QWidget):
 
 
     def sample_cursor_position(self):
-        """Sample the cursor position and store it."""
+        """Sample the cursor position and store it (poll capture mode)."""
 
         if self.drawing:
-            timestamp = time.time()
-            self.data_handler.write_data({"posX": self.posX,
-                                          "posY": self.posY,
-                                          "tiltX": self.pen_tiltX,
-                                          "tiltY": self.pen_tiltY,
-                                          "pressure": self.pen_pressure,
-                                          "Timestamp":timestamp
-                                          })
+            self._record_sample()
+
+    def _record_sample(self):
+        """Store the current pen state, stamped with the host clocks, and its distance to the shape."""
+        error = NO_DATA
+        if self.tracking_grid is not None and self.posX != NO_DATA:
+            error = self.tracking_grid.distance(self.posX, self.posY)
+            self.tracking_count += 1
+            self.tracking_sum += error
+            self.tracking_sum2 += error * error
+        self.data_handler.write_sample(self.posX,
+                                       self.posY,
+                                       self.pen_tiltX,
+                                       self.pen_tiltY,
+                                       self.pen_pressure,
+                                       self.clock.time(),
+                                       self.event_time_stamp,
+                                       self.clock.now_ns(),
+                                       error)
+
+    def tracking_stats(self):
+        """running tracking error of the current trial (px)"""
+        n = self.tracking_count
+        return {
+            "samples": n,
+            "mean_error": self.tracking_sum / n if n else None,
+            "rms_error": (self.tracking_sum2 / n) ** 0.5 if n else None,
+        }
 
 
     def clear_canvas(self):
         """Clear the canvas and reset sampling data."""
         self.corner_template.hide()
-        self.lines = []
+        self._reset_ink()
         if self.first_shape:
             self.first_shape = False
         else:
@@ -342,17 +463,75 @@ class DrawingWidget(QWidget):
         self.data_handler.start_new_section(f"{self.shape_tuple}")
         self.update()
 
+    def _reset_ink(self):
+        """Forget the ink of the finished trial (stroke buffers, tail cache, pending repaint, tracking error)."""
+        if self.strokes.segments:
+            stats = self.strokes.stats()
+            print(f"Stroke store: {stats['segments']} segments, {stats['stored_vertices']}/{stats['vertices']} "
+                  f"vertices kept, {stats['bytes'] / 1024:.1f} KiB")
+        if self.tracking_count:
+            stats = self.tracking_stats()
+            print(f"Tracking error: mean {stats['mean_error']:.1f} px, RMS {stats['rms_error']:.1f} px "
+                  f"over {stats['samples']} samples")
+        self.tracking_grid = None
+        self.tracking_count = 0
+        self.tracking_sum = 0.0
+        self.tracking_sum2 = 0.0
+        self.strokes.clear()
+        self.tail_renderer.clear()
+        self.tail_rect = QRect()
+        self.dirty_pending = False
+
     def resizeEvent(self, event):
-        try:
-            super().resizeEvent(event)
+        super().resizeEvent(event)
+        self._layout_frames()
+        self.background = None  # rebuilt at the new size by the next paint
+        if hasattr(self, "ok_button"):  # not yet while __init__ builds the widgets
             self._position_ready_ui()
-        except:
-            pass
 
     def close_file(self):
+        if self.closing:
+            return
+        self.closing = True
+        self.play = False
+        self.drawing = False
+        self.sampling_timer.stop()
+        self.drawing_timer.stop()
+        self.transition_timer.stop()
+        self.repaint_timer.stop()
+        stats = self.paint_stats()
+        print(f"Painted {stats['paints']} times for {stats['repaint_requests']} pen segments, "
+              f"mean {stats['mean_paint_ms']:.2f} ms, max {stats['max_paint_ms']:.2f} ms.")
+
         self.saving_label.show()  # Display the label
-        self.saving_label.repaint()  # Force the label to redraw immediately
-        QApplication.processEvents()  # Process any pending GUI events
-        time.sleep(3)  # Wait for 1 seconds to show the label
-        self.data_handler.close_file()  # Close the file
-        QApplication.quit()  # Quit the application
\ No newline at end of file
+        self.saving_label.raise_()
+        self.data_handler.close_file(upload=False)  # Close the file, upload runs in the background
+
+        # Quit once the label was shown for a while and the upload (if any) is done
+        self.label_shown = False
+        self.upload_done = True
+        if self.data_handler.s3_flag and self.data_handler.output_format != "binary":
+            self.upload_done = False
+            self.upload_thread = DrainThread(parent=self)
+            self.upload_thread.progress.connect(self._on_upload_progress)
+            self.upload_thread.drained.connect(self._on_upload_finished)
+            self.upload_thread.start()
+        self.clock.single_shot(SAVING_LABEL_MS, self._on_saving_label_shown)
+
+    def _on_upload_progress(self, sent, total):
+        percent = int(100 * sent / total) if total else 100
+        self.saving_label.setText(f"{SAVING_TEXT}\n{percent}%")
+
+    def _on_upload_finished(self, uploaded, failed):
+        self.upload_done = True
+        if failed:
+            print("Upload failed, the data stays in the outbox and will be sent later.")
+        self._quit_when_done()
+
+    def _on_saving_label_shown(self):
+        self.label_shown = True
+        self._quit_when_done()
+
+    def _quit_when_done(self):
+        if self.label_shown and self.upload_done:
+            QApplication.quit()  # Quit the application
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+Append-only trial journal.
+
+Every session event is one JSON record per line:
+    {"type": "session", "pid", "exp", "start_time", <metadata>..., "fields"}
+    {"type": "trial_start", "trial_num", "trial_info", "clock_anchor"}
+    {"type": "samples", "rows": [[...], ...]}
+    {"type": "trial_end", "trial_num", "samples", "timing"}
+    {"type": "session_end"}
+The file is only ever appended to and is fsync'd at trial boundaries, so after a
+crash everything up to the last complete line is still there.
+rebuild_session() turns a journal into the regular session JSON in one pass.
+
+Usage:
+    python Journal.py recover results/<run>_shape_tracking.journal [-o out.json]
+"""
+import argparse
+import json
+import os
+
+from SampleStore import SAMPLE_FIELDS
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def journal_path_for(output_file: str) -> str:
+    return os.path.splitext(output_file)[0] + JOURNAL_SUFFIX
+
+
+class TrialJournal:
+    """Writer side of the journal, used by DataHandler on its writer thread."""
+
+    def __init__(self, path: str, pid: str, exp: str, start_time: str, fields=SAMPLE_FIELDS,
+                 metadata: dict = None):
+        self.path = path
+        self.fields = list(fields)
+        self.stream = open(path, 'a', encoding='utf-8')
+        self.trial_num = None
+        self.trial_samples = 0
+        self.__append({"type": "session", "pid": pid, "exp": exp, "start_time": start_time,
+                       **(metadata or {}), "fields": self.fields}, sync=True)
+
+    def start_trial(self, trial_num, info, clock_anchor=None):
+        self.end_trial()
+        self.trial_num = str(trial_num)
+        self.trial_samples = 0
+        record = {"type": "trial_start", "trial_num": self.trial_num, "trial_info": info}
+        if clock_anchor is not None:
+            record["clock_anchor"] = clock_anchor
+        self.__append(record, sync=True)
+
+    def write_samples(self, batch):
+        rows = [item if isinstance(item, dict) else list(item) for item in batch]
+        if not rows:
+            return
+        self.trial_samples += len(rows)
+        self.__append({"type": "samples", "rows": rows})
+
+    def end_trial(self, timing=None):
+        if self.trial_num is None:
+            return
+        record = {"type": "trial_end", "trial_num": self.trial_num, "samples": self.trial_samples}
+        if timing is not None:
+            record["timing"] = timing
+        self.__append(record, sync=True)
+        self.trial_num = None
+
+    def position(self) -> int:
+        """byte offset where the next record will be written"""
+        return self.stream.tell()
+
+    def close(self):
+        self.end_trial()
+        self.__append({"type": "session_end"}, sync=True)
+        self.stream.close()
+
+    def __append(self, record, sync=False):
+        self.stream.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self.stream.flush()
+        if sync:
+            os.fsync(self.stream.fileno())
+
+
+def iter_journal(path: str):
+    """
+    yield the complete records of a journal, stopping at a torn last line
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+def rebuild_session(journal_path: str, output_file: str) -> dict:
+    """
+    write the session JSON file from a journal in one linear pass.
+    returns a summary: trials, samples and whether the session ended cleanly
+    """
+    summary = {"trials": 0, "samples": 0, "complete": False}
+    fields = list(SAMPLE_FIELDS)
+    in_trial = False
+    first_trial = True
+    first_sample = True
+    started = False
+
+    tmp_path = output_file + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+
+        def close_trial(timing=None):
+            out.write("\n\t\t\t]")
+            if timing is not None:
+                out.write(f',\n\t\t\t"timing": {json.dumps(timing)}')
+            out.write("\n\t\t}")
+
+        for record in iter_journal(journal_path):
+            kind = record.get("type")
+
+            if kind == "session" and not started:
+                started = True
+                fields = record.get("fields", fields)
+                out.write("{")
+                for key, value in record.items():
+                    if key not in ("type", "fields"):
+                        out.write(f"\n    {json.dumps(key)}: {json.dumps(value)},")
+                out.write('\n    "data": [')
+
+            elif kind == "trial_start" and started:
+                if in_trial:
+                    close_trial()
+                out.write("\n\t\t{" if first_trial else ",\n\t\t{")
+                out.write(f'\n            "trial_num": {json.dumps(record["trial_num"])},'
+                          f'\n            "trial_info": {json.dumps(record["trial_info"])},')
+                if "clock_anchor" in record:
+                    out.write(f'\n            "clock_anchor": {json.dumps(record["clock_anchor"])},')
+                out.write('\n            "data" : [')
+                first_trial = False
+                first_sample = True
+                in_trial = True
+                summary["trials"] += 1
+
+            elif kind == "samples" and in_trial:
+                for row in record["rows"]:
+                    sample = row if isinstance(row, dict) else dict(zip(fields, row))
+                    out.write("\n\t\t\t\t" if first_sample else ",\n\t\t\t\t")
+                    out.write(json.dumps(sample))
+                    first_sample = False
+                summary["samples"] += len(record["rows"])
+
+            elif kind == "trial_end" and in_trial:
+                close_trial(record.get("timing"))
+                in_trial = False
+
+            elif kind == "session_end":
+                summary["complete"] = True
+                break
+
+        if not started:
+            raise ValueError(f"{journal_path} does not start with a session record")
+        if in_trial:
+            close_trial()
+        out.write("\n\t]\n}\n")
+
+    os.replace(tmp_path, output_file)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trial journal tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    recover = sub.add_parser("recover", help="rebuild session JSON files from journals")
+    recover.add_argument("journals", nargs="+")
+    recover.add_argument("-o", "--output", help="output file (only with a single journal)")
+    args = parser.parse_args()
+
+    if args.output and len(args.journals) > 1:
+        parser.error("--output can only be used with a single journal")
+
+    for journal in args.journals:
+        output_file = args.output or os.path.splitext(journal)[0] + ".json"
+        summary = rebuild_session(journal, output_file)
+        state = "complete" if summary["complete"] else "INCOMPLETE (recovered up to last record)"
+        print(f"{journal} -> {output_file}: {summary['trials']} trials, "
+              f"{summary['samples']} samples, {state}")
+
+
+if __name__ == "__main__":
+    main()
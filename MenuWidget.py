@@ -2,7 +2,6 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QApplication, QShortcut
 from PyQt5.QtWidgets import QPushButton
-from SettingsWindow import SettingsWindow
 from settings_singleton import Settings
 
 settings = Settings()
@@ -43,7 +42,7 @@ class MenuWidget(QWidget):
         self.settings_button.setStyleSheet("font-size: 16px; padding: 10px;")
         self.settings_button.setFixedSize(300, 50)
         self.settings_button.clicked.connect(self.open_settings_window)
-        self.settings_window = SettingsWindow(self)  # initialize once
+        self.settings_window = None  # built on first use, it renders all the shape previews
         layout.addWidget(self.settings_button)
 
         # Exit Button
@@ -81,8 +80,10 @@ class MenuWidget(QWidget):
             self.name_input.setStyleSheet("border: 2px solid red; font-size: 16px;")
 
     def open_settings_window(self):
-        if self.settings_window.exec_():
-            settings.load_from_file()
+        if self.settings_window is None:
+            from SettingsWindow import SettingsWindow
+            self.settings_window = SettingsWindow(self)
+        self.settings_window.exec_()  # the dialog updates the shared Settings itself
 
     def exit_application(self):
         """Exit the application."""
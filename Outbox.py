@@ -0,0 +1,430 @@
+"""
+Persistent outbox for session uploads.
+
+Finished sessions are recorded in outbox/manifest.json and uploaded by a
+drainer that can run inside the app or from the command line. Failed items
+are retried with per-item exponential backoff; every item keeps the same
+Idempotency-Key across attempts so the endpoint can ignore duplicates.
+
+Every change re-reads the manifest and rewrites it atomically while holding
+outbox/manifest.lock, so the app and a command-line drainer can run at the same
+time without losing each other's changes. A drainer claims the items it uploads
+in one step; a claim lapses after CLAIM_LEASE_S, so items of a drainer that died
+are picked up again.
+
+Usage:
+    python Outbox.py enqueue results/<run>_shape_tracking.json [--pid ID]
+    python Outbox.py drain [--url URL] [--workers 4] [--loop]
+    python Outbox.py status
+"""
+import argparse
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from Uploader import UPLOAD_URL, upload_file
+
+OUTBOX_DIR = "outbox"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "manifest.lock"
+CLAIM_LEASE_S = 15 * 60  # an item claimed longer ago than this counts as pending again
+DONE_KEEP_S = 7 * 24 * 3600  # uploaded items stay listed this long
+RESULTS_SUFFIX = "_shape_tracking.json"
+
+PENDING = "pending"
+UPLOADING = "uploading"
+DONE = "done"
+
+
+def pid_from_filename(path: str) -> str:
+    """results files are named <datetime>_<pid>_shape_tracking.json"""
+    name = os.path.basename(path)
+    if name.endswith(RESULTS_SUFFIX):
+        name = name[:-len(RESULTS_SUFFIX)]
+    return name.split("_", 1)[1] if "_" in name else name
+
+
+class UploadCancelled(Exception):
+    """Raised from the progress callback to abort an upload in flight."""
+
+
+class ManifestLock:
+    """Exclusive lock on a file, held across processes (the app and Outbox.py)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'a+b')
+        if os.name == 'nt':
+            import msvcrt
+            self.file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 s
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if os.name == 'nt':
+            import msvcrt
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+        self.file = None
+
+
+class Outbox:
+    """Manifest of sessions waiting to be uploaded."""
+
+    def __init__(self, directory: str = OUTBOX_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.lock = threading.Lock()
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # marks the items this process claimed
+        os.makedirs(directory, exist_ok=True)
+        self.file_lock = ManifestLock(os.path.join(directory, LOCK_FILE))
+        with self.__locked():
+            pass
+
+    def __load(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("items", {})
+
+    @contextlib.contextmanager
+    def __locked(self):
+        """
+        hold both locks and work on the manifest as it is on disk now, so changes made
+        by another process since the last read are merged rather than overwritten
+        """
+        with self.lock, self.file_lock:
+            self.items = self.__load()
+            yield self.items
+
+    def __save(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"items": self.items}, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def enqueue(self, path: str, pid: str = None) -> str:
+        path = os.path.abspath(path)
+        with self.__locked():
+            for item_id, item in self.items.items():
+                if item["path"] == path and item["status"] != DONE:
+                    return item_id
+            item_id = uuid.uuid4().hex
+            self.items[item_id] = {
+                "path": path,
+                "pid": pid if pid is not None else pid_from_filename(path),
+                "status": PENDING,
+                "idempotency_key": item_id,
+                "attempts": 0,
+                "next_attempt": 0.0,
+                "enqueued_at": time.time(),
+                "uploaded_at": None,
+                "last_error": None,
+            }
+            self.__save()
+        print(f"Queued {path} for upload.")
+        return item_id
+
+    @staticmethod
+    def _is_due(item, now):
+        if item["status"] == UPLOADING:
+            # claimed by a drainer that has not reported back within the lease (it died)
+            return item.get("claimed_until", 0.0) <= now
+        return item["status"] == PENDING and item["next_attempt"] <= now
+
+    def due(self, now: float = None):
+        """
+        items that could be claimed now, oldest first (read only, see claim_due)
+        """
+        now = time.time() if now is None else now
+        with self.__locked() as items:
+            due = [(item_id, dict(item)) for item_id, item in items.items() if self._is_due(item, now)]
+        return sorted(due, key=lambda entry: entry[1]["enqueued_at"])
+
+    def claim_due(self, now: float = None):
+        """
+        mark every due item as uploading by this process, in one locked step so no other
+        drainer (thread or process) can claim it too. returns the claimed items, oldest first
+        """
+        now = time.time() if now is None else now
+        claimed = []
+        with self.__locked() as items:
+            for item_id, item in items.items():
+                if self._is_due(item, now):
+                    item["status"] = UPLOADING
+                    item["attempts"] += 1
+                    item["owner"] = self.owner
+                    item["claimed_until"] = now + CLAIM_LEASE_S
+                    claimed.append((item_id, dict(item)))
+            if claimed:
+                self.__save()
+        return sorted(claimed, key=lambda entry: entry[1]["enqueued_at"])
+
+    def pending_count(self):
+        with self.__locked() as items:
+            return sum(item["status"] != DONE for item in items.values())
+
+    def snapshot(self):
+        """copy of all items as they are on disk now"""
+        with self.__locked() as items:
+            return {item_id: dict(item) for item_id, item in items.items()}
+
+    def release(self, item_id):
+        """give back a claimed item that was not attempted (e.g. the drainer was cancelled)"""
+        with self.__locked() as items:
+            item = items.get(item_id)
+            if item is not None and item["status"] == UPLOADING and item.get("owner") == self.owner:
+                item["status"] = PENDING
+                item["attempts"] = max(item["attempts"] - 1, 0)
+                self.__save()
+
+    def prune(self, keep_s: float = DONE_KEEP_S, now: float = None):
+        """forget uploaded items older than keep_s, returns how many"""
+        now = time.time() if now is None else now
+        with self.__locked() as items:
+            old = [item_id for item_id, item in items.items()
+                   if item["status"] == DONE and (item["uploaded_at"] or 0.0) + keep_s <= now]
+            for item_id in old:
+                del items[item_id]
+            if old:
+                self.__save()
+        return len(old)
+
+    def mark_done(self, item_id):
+        with self.__locked() as items:
+            item = items.get(item_id)
+            if item is None:
+                return
+            item["status"] = DONE
+            item["uploaded_at"] = time.time()
+            item["last_error"] = None
+            self.__save()
+
+    def mark_failed(self, item_id, error, base_delay: float, max_delay: float):
+        with self.__locked() as items:
+            item = items.get(item_id)
+            if item is None or item["status"] == DONE or item.get("owner") != self.owner:
+                return  # meanwhile uploaded or claimed again by another drainer
+            item["status"] = PENDING
+            item["last_error"] = str(error)
+            item["next_attempt"] = time.time() + min(base_delay * 2 ** (item["attempts"] - 1), max_delay)
+            self.__save()
+
+
+_outboxes = {}
+_outboxes_lock = threading.Lock()
+
+
+def get_outbox(directory: str = OUTBOX_DIR) -> Outbox:
+    """
+    shared Outbox per directory, so the app's drainer and enqueue calls never
+    overwrite each other's manifest changes
+    """
+    key = os.path.abspath(directory)
+    with _outboxes_lock:
+        if key not in _outboxes:
+            _outboxes[key] = Outbox(directory)
+        return _outboxes[key]
+
+
+class OutboxDrainer:
+    """Uploads due outbox items concurrently over one pooled requests.Session."""
+
+    def __init__(self, outbox: Outbox, url: str = UPLOAD_URL, workers: int = 4,
+                 base_delay: float = 2.0, max_delay: float = 3600.0, timeout: float = 60.0,
+                 stop_event: threading.Event = None, compress: bool = None):
+        import requests
+
+        self.outbox = outbox
+        self.url = url
+        self.workers = workers
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        if compress is None:
+            from settings_singleton import Settings
+            compress = Settings().get_upload_compress()
+        self.compress = compress
+        self.stop_event = stop_event or threading.Event()  # set by cancel()
+        self.claimed = 0  # items claimed by the last drain_once
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def cancel(self):
+        """stop after the current chunk; claimed items not uploaded yet are given back"""
+        self.stop_event.set()
+
+    def _upload(self, item_id, item, progress):
+        import requests
+
+        if self.stop_event.is_set():
+            self.outbox.release(item_id)
+            return None
+        if not os.path.exists(item["path"]):
+            self.outbox.mark_failed(item_id, "file not found", self.base_delay, self.max_delay)
+            return False
+
+        def report(done, total):
+            if self.stop_event.is_set():
+                raise UploadCancelled()
+            progress(done, total)
+
+        try:
+            upload_file(item["path"], item["pid"], url=self.url, session=self.session,
+                        compress=self.compress, progress=report, timeout=self.timeout,
+                        extra_headers={"Idempotency-Key": item["idempotency_key"]})
+        except UploadCancelled:
+            self.outbox.release(item_id)
+            return None
+        except (requests.exceptions.RequestException, OSError) as e:
+            if self.stop_event.is_set():
+                self.outbox.release(item_id)  # the cancel surfaced as a connection error
+                return None
+            print(f"Upload of {item['path']} failed: {e}")
+            self.outbox.mark_failed(item_id, e, self.base_delay, self.max_delay)
+            return False
+        self.outbox.mark_done(item_id)
+        print(f"Uploaded {item['path']}.")
+        return True
+
+    def drain_once(self, progress=None):
+        """
+        one attempt for every due item, claimed first so no other drainer uploads it too.
+        progress(bytes_sent, bytes_total) covers the whole batch. returns (uploaded, failed)
+        """
+        self.outbox.prune()
+        if self.stop_event.is_set():
+            return 0, 0
+        due = self.outbox.claim_due()
+        self.claimed = len(due)
+        if not due:
+            return 0, 0
+
+        total = sum(os.path.getsize(item["path"]) for _, item in due if os.path.exists(item["path"]))
+        sent = {item_id: 0 for item_id, _ in due}
+        lock = threading.Lock()
+
+        def item_progress(item_id):
+            def report(done, _):
+                with lock:
+                    sent[item_id] = done
+                    current = sum(sent.values())
+                if progress is not None:
+                    progress(current, total)
+            return report
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda entry: self._upload(entry[0], entry[1], item_progress(entry[0])), due))
+        # None: given back unattempted after a cancel
+        return results.count(True), results.count(False)
+
+    def run(self, interval: float = 30.0):
+        """
+        drain until cancelled, sleeping `interval` seconds between passes
+        """
+        while not self.stop_event.is_set():
+            self.drain_once()
+            self.stop_event.wait(interval)
+
+    def close(self):
+        self.session.close()
+
+
+class DrainThread(QThread):
+    """Runs one drain pass of the outbox off the GUI thread."""
+    progress = pyqtSignal(int, int)  # bytes sent, total bytes
+    drained = pyqtSignal(int, int)  # uploaded, failed
+
+    def __init__(self, outbox: Outbox = None, url: str = UPLOAD_URL, parent=None):
+        super().__init__(parent)
+        self.outbox = outbox
+        self.url = url
+        self.stop_event = threading.Event()
+
+    def cancel(self):
+        """an upload stops at its next chunk; a blocked request gives up after the drainer's timeout"""
+        self.stop_event.set()
+
+    def run(self):
+        # drained is emitted on every path: the closing screen waits for it before quitting
+        drainer = None
+        try:
+            drainer = OutboxDrainer(self.outbox or get_outbox(), url=self.url, stop_event=self.stop_event)
+            uploaded, failed = drainer.drain_once(progress=self.progress.emit)
+        except Exception as e:
+            # e.g. an unreadable manifest; claimed items are picked up again when their claim lapses
+            print(f"Draining the outbox failed: {type(e).__name__}: {e}")
+            uploaded, failed = 0, max(drainer.claimed if drainer is not None else 0, 1)
+        finally:
+            if drainer is not None:
+                drainer.close()
+        self.drained.emit(uploaded, failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload outbox")
+    parser.add_argument("--outbox", default=OUTBOX_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = sub.add_parser("enqueue", help="queue session files for upload")
+    enqueue.add_argument("files", nargs="+")
+    enqueue.add_argument("--pid", help="participant id (default: taken from the file name)")
+
+    drain = sub.add_parser("drain", help="upload everything that is due")
+    drain.add_argument("--url", default=UPLOAD_URL)
+    drain.add_argument("--workers", type=int, default=4)
+    drain.add_argument("--loop", action="store_true", help="keep running and retry on a timer")
+    drain.add_argument("--interval", type=float, default=30.0)
+    drain.add_argument("--compress", action="store_true", default=None,
+                       help="gzip the uploads (default: upload_compress in the settings file)")
+
+    sub.add_parser("status", help="list the outbox items")
+    args = parser.parse_args()
+
+    outbox = get_outbox(args.outbox)
+    if args.command == "enqueue":
+        for path in args.files:
+            outbox.enqueue(path, args.pid)
+    elif args.command == "drain":
+        drainer = OutboxDrainer(outbox, url=args.url, workers=args.workers, compress=args.compress)
+        try:
+            if args.loop:
+                drainer.run(interval=args.interval)
+            else:
+                uploaded, failed = drainer.drain_once()
+                print(f"Uploaded {uploaded}, failed {failed}, still pending {outbox.pending_count()}.")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            drainer.close()
+    else:
+        for item_id, item in outbox.snapshot().items():
+            print(f"{item_id}  {item['status']:9}  attempts={item['attempts']}  {item['path']}"
+                  + (f"  ({item['last_error']})" if item["last_error"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from AnimationWidget import (load_stimulus, STIMULUS_SCALE, STIMULUS_TOP_LEFT, TEMPLATE_TOP_LEFT,
+                             FLIP_X, MASK_SVG)
+from SpatialIndex import grid_for
+
+
+def stimulus_jobs(selected_shapes, scale: float = STIMULUS_SCALE):
+    """
+    every (file, scale, flip, top_left) DrawingWidget will draw for the scheduled
+    (shape, speed, hide_template) tuples: the example stimulus, the corner template
+    when it is shown, and the visual mask
+    """
+    jobs = {(MASK_SVG, scale, FLIP_X, STIMULUS_TOP_LEFT)}
+    for shape, _speed, hide_template in selected_shapes:
+        jobs.add((shape, scale, FLIP_X, STIMULUS_TOP_LEFT))
+        if not hide_template:
+            jobs.add((shape, scale, FLIP_X, TEMPLATE_TOP_LEFT))
+    return sorted(jobs)
+
+
+def _prewarm_one(job):
+    try:
+        geometry, _ = load_stimulus(*job)
+        if job[0] != MASK_SVG and tuple(job[3]) == tuple(STIMULUS_TOP_LEFT):
+            grid_for(geometry)  # tracking-error index of the shape participants copy
+        return True
+    except Exception as e:
+        print(f"Prewarm of {job[0]} failed: {e}")
+        return False
+
+
+def prewarm(jobs, workers: int = None):
+    """
+    load and sample every stimulus into the geometry/path caches.
+    returns (number of stimuli ready, seconds taken)
+    """
+    start = time.perf_counter()
+    workers = workers or min(len(jobs), os.cpu_count() or 1) or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        ready = sum(pool.map(_prewarm_one, jobs))
+    return ready, time.perf_counter() - start
+
+
+class StimulusPrewarmer(QThread):
+    """Fills the stimulus caches in the background, e.g. while the instructions are shown."""
+    prewarmed = pyqtSignal(int, float)  # stimuli ready, seconds
+
+    def __init__(self, selected_shapes, workers: int = None, parent=None):
+        super().__init__(parent)
+        self.jobs = stimulus_jobs(selected_shapes)
+        self.workers = workers
+        self.ready = 0
+        self.seconds = 0.0
+        self.done = False
+
+    def run(self):
+        self.ready, self.seconds = prewarm(self.jobs, self.workers)
+        self.done = True
+        print(f"Prewarmed {self.ready}/{len(self.jobs)} stimuli in {self.seconds * 1000:.0f} ms.")
+        self.prewarmed.emit(self.ready, self.seconds)
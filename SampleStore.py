@@ -0,0 +1,162 @@
+import json
+import os
+
+import numpy as np
+
+NO_DATA = -999
+
+# Column layout of one recorded sample, in the order DrawingWidget produces them.
+# Timestamp is wall-clock seconds, EventTimestamp the Qt event time (ms) and
+# HostTimeNs time.perf_counter_ns() when the sample was taken, TrackingError the distance
+# (px) to the outline of the shape being copied, NO_DATA when there is none
+SAMPLE_FIELDS = ("posX", "posY", "tiltX", "tiltY", "pressure", "Timestamp", "EventTimestamp", "HostTimeNs",
+                 "TrackingError")
+SAMPLE_DTYPE = np.dtype([
+    ("posX", "<i4"),
+    ("posY", "<i4"),
+    ("tiltX", "<i4"),
+    ("tiltY", "<i4"),
+    ("pressure", "<f4"),
+    ("Timestamp", "<f8"),
+    ("EventTimestamp", "<i8"),
+    ("HostTimeNs", "<i8"),
+    ("TrackingError", "<f4"),
+])
+
+FORMAT_NAME = "shape-tracking-columns"
+FORMAT_VERSION = 2  # 2: TrackingError column
+HEADER_FILE = "header.json"
+TRIAL_FILE_FORMAT = "trial_{:04d}.npy"
+
+
+class SampleStore:
+    """Preallocated structured array holding the samples of a single trial."""
+
+    def __init__(self, capacity: int = 8192, dtype: np.dtype = SAMPLE_DTYPE):
+        self.dtype = dtype
+        self._data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        grown = np.empty(max(2 * len(self._data), 1), dtype=self.dtype)
+        grown[:self.size] = self._data[:self.size]
+        self._data = grown
+
+    def append(self, values):
+        """
+        append one sample given as a tuple in SAMPLE_FIELDS order
+        """
+        if self.size == len(self._data):
+            self._grow()
+        self._data[self.size] = values
+        self.size += 1
+
+    def append_dict(self, sample: dict):
+        """
+        append one sample given as a {field: value} dict, missing fields become NO_DATA
+        """
+        self.append(tuple(sample.get(name, NO_DATA) for name in self.dtype.names))
+
+    def columns(self):
+        """
+        view of the filled part of the store (no copy)
+        """
+        return self._data[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+
+def _write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+class ColumnSessionWriter:
+    """
+    Writes a session as a directory holding a small JSON header and one .npy
+    structured array per trial section.
+    """
+
+    def __init__(self, directory: str, pid: str, exp: str, start_time: str, metadata: dict = None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.header = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "pid": pid,
+            "exp": exp,
+            "start_time": start_time,
+            **(metadata or {}),
+            "fields": list(SAMPLE_DTYPE.names),
+            "complete": False,
+            "trials": [],
+        }
+        self.store = SampleStore()
+        self.trial = None
+        self.__write_header()
+
+    def start_section(self, trial_num, info, clock_anchor=None):
+        self.close_section()
+        self.store.clear()
+        self.trial = {"trial_num": str(trial_num), "trial_info": info}
+        if clock_anchor is not None:
+            self.trial["clock_anchor"] = clock_anchor
+
+    def close_section(self, timing=None):
+        if self.trial is None:
+            return
+        file_name = TRIAL_FILE_FORMAT.format(len(self.header["trials"]))
+        np.save(os.path.join(self.directory, file_name), self.store.columns())
+        self.trial["file"] = file_name
+        self.trial["samples"] = len(self.store)
+        if timing is not None:
+            self.trial["timing"] = timing
+        self.header["trials"].append(self.trial)
+        self.trial = None
+        self.store.clear()
+        self.__write_header()
+
+    def close(self):
+        self.close_section()
+        self.header["complete"] = True
+        self.__write_header()
+
+    def __write_header(self):
+        _write_json_atomic(os.path.join(self.directory, HEADER_FILE), self.header)
+
+
+def resample(samples, rate_hz: float = 1000.0, clock: str = "HostTimeNs"):
+    """
+    uniform-rate view of event-driven samples, holding the last reported state
+    at every tick (what the old 1 ms polling recorded). `clock` must be in ns
+    """
+    if len(samples) == 0:
+        return samples[:0].copy()
+    t = samples[clock].astype(np.int64)
+    grid = np.arange(t[0], t[-1] + 1, int(round(1e9 / rate_hz)), dtype=np.int64)
+    idx = np.searchsorted(t, grid, side='right') - 1
+    view = samples[idx]
+    view[clock] = grid
+    return view
+
+
+def load_session(directory: str, mmap: bool = False):
+    """
+    load a session written by ColumnSessionWriter.
+    returns the header dict and a list of trials, each a dict with
+    trial_num, trial_info and 'samples' as a NumPy structured array
+    """
+    with open(os.path.join(directory, HEADER_FILE), 'r', encoding='utf-8') as f:
+        header = json.load(f)
+
+    trials = []
+    for trial in header["trials"]:
+        samples = np.load(os.path.join(directory, trial["file"]), mmap_mode='r' if mmap else None)
+        trials.append(dict(trial, samples=samples))
+    return header, trials
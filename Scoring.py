@@ -0,0 +1,282 @@
+"""
+Tracking accuracy of a trial: the recorded pen positions against the stimulus
+geometry the participant saw, placed on screen exactly as AnimationWidget places
+it (same SVG transform, scale, flip and top-left), all in screen pixels.
+
+Metrics:
+    mean_error / rms_error / max_error - distance of each sample to the nearest
+                  point of the template outline
+    coverage    - share of the template's length that came within `tolerance_px`
+                  of some sample
+    frechet     - discrete Fréchet distance between the drawn path and the template
+    dtw         - dynamic time warping cost per step, in pixels
+Participants trace the shape over and over for the whole trial, so Fréchet and
+DTW compare the path with the template repeated once per lap drawn (`laps`); a
+lap is one time round the outline (the SVG paths go round twice, see one_lap()).
+Both curves are resampled evenly in arc length first; DTW and Fréchet share one
+vectorized anti-diagonal sweep with a Sakoe-Chiba band and early abandoning.
+"""
+import math
+
+import numpy as np
+
+from ShapeGeometry import ShapeGeometry, load_geometry
+
+NO_DATA = -999  # DrawingWidget's value for "no pen reading"
+SEGMENT_SPACING_PX = 4.0  # template resolution for the nearest-point errors
+CURVE_SPACING_PX = 8.0  # resolution of the curves compared by Fréchet and DTW
+MAX_CURVE_POINTS = 2000  # coarser spacing beyond this, so long trials stay fast
+BAND = 0.1  # Sakoe-Chiba band, as a fraction of the longer curve
+COVERAGE_TOLERANCE_PX = 10.0
+REPEAT_TOLERANCE_PX = 1.0  # an outline that comes back within this of itself is repeating
+MAX_LAP_STEP = 0.25  # larger jumps along the template between samples are projection flips
+GROUP_SEGMENTS = 16  # template segments per bounding box in nearest_on_polyline
+BLOCK_SAMPLES = 4096  # samples matched against the boxes at once
+
+
+def template_geometry(shape_file: str, template: bool = False) -> ShapeGeometry:
+    """
+    geometry of a stimulus as DrawingWidget shows it: the example on the drawing
+    side, or with template=True the corner template
+    """
+    from AnimationWidget import STIMULUS_SCALE, STIMULUS_TOP_LEFT, TEMPLATE_TOP_LEFT, FLIP_X
+    return load_geometry(shape_file, STIMULUS_SCALE, FLIP_X, TEMPLATE_TOP_LEFT if template else STIMULUS_TOP_LEFT)
+
+
+def trajectory(samples) -> np.ndarray:
+    """
+    (n, 2) pen positions of a trial from a structured array or dict of columns
+    with posX/posY, or an (n, 2) array; rows without a reading are dropped
+    """
+    if isinstance(samples, np.ndarray) and samples.dtype.names is None:
+        xy = np.asarray(samples, dtype=float).reshape(-1, 2)
+    else:
+        xy = np.column_stack((np.asarray(samples["posX"], dtype=float), np.asarray(samples["posY"], dtype=float)))
+    keep = (xy[:, 0] != NO_DATA) & (xy[:, 1] != NO_DATA)
+    return xy[keep]
+
+
+def path_length(xy) -> float:
+    if len(xy) < 2:
+        return 0.0
+    return float(np.hypot(*np.diff(xy, axis=0).T).sum())
+
+
+def resample(xy, spacing: float) -> np.ndarray:
+    """points every `spacing` pixels along a polyline, ends included; repeated points are skipped"""
+    xy = np.asarray(xy, dtype=float)
+    if len(xy) < 2:
+        return xy.copy()
+    s = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(xy, axis=0).T))))
+    if s[-1] == 0:
+        return xy[:1].copy()
+    count = max(int(math.ceil(s[-1] / spacing)), 1)
+    targets = np.linspace(0.0, s[-1], count + 1)
+    return np.column_stack((np.interp(targets, s, xy[:, 0]), np.interp(targets, s, xy[:, 1])))
+
+
+def one_lap(outline) -> np.ndarray:
+    """
+    the outline up to where it starts over: the stimulus SVGs trace their shape
+    twice, which would make every nearest point ambiguous between the two passes
+    """
+    s = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(outline, axis=0).T))))
+    total = s[-1]
+    if total == 0:
+        return outline
+    for repeats in (2, 3):
+        f = np.linspace(0.0, 1.0 - 1.0 / repeats, 256) * total
+        shifted = f + total / repeats
+        gap = np.hypot(np.interp(f, s, outline[:, 0]) - np.interp(shifted, s, outline[:, 0]),
+                       np.interp(f, s, outline[:, 1]) - np.interp(shifted, s, outline[:, 1]))
+        if gap.max() < REPEAT_TOLERANCE_PX:
+            end = np.searchsorted(s, total / repeats)
+            lap = np.concatenate((outline[:end], [[np.interp(total / repeats, s, outline[:, 0]),
+                                                   np.interp(total / repeats, s, outline[:, 1])]]))
+            return one_lap(lap)
+    return outline
+
+
+def nearest_on_polyline(xy, vertices, tolerance: float = 0.0):
+    """
+    nearest point of the polyline through `vertices` for every point of `xy`:
+    returns (distance, segment index, position along that segment in [0, 1],
+    per-segment flags of the segments that came within `tolerance` of some point).
+
+    segments are grouped in runs of GROUP_SEGMENTS with a bounding box each; a
+    point only measures the segments of groups whose box is no further than its
+    nearest group start vertex (or the tolerance), so a trial near its template
+    checks a few dozen segments per sample instead of all of them
+    """
+    xy = np.asarray(xy, dtype=float)
+    a = vertices[:-1]
+    ab = vertices[1:] - a
+    a_x, a_y, ab_x, ab_y = a[:, 0], a[:, 1], ab[:, 0], ab[:, 1]
+    inv_len2 = 1.0 / np.maximum(ab_x * ab_x + ab_y * ab_y, 1e-12)
+    segments = len(a)
+
+    starts = np.arange(0, segments, GROUP_SEGMENTS)
+    ends = np.minimum(starts + GROUP_SEGMENTS, segments)
+    box_lo = np.minimum.reduceat(np.minimum(vertices[:-1], vertices[1:]), starts, axis=0)
+    box_hi = np.maximum.reduceat(np.maximum(vertices[:-1], vertices[1:]), starts, axis=0)
+
+    distance = np.empty(len(xy))
+    nearest = np.empty(len(xy), dtype=np.int64)
+    along = np.empty(len(xy))
+    covered = np.zeros(segments, dtype=bool)
+    tolerance2 = tolerance * tolerance
+
+    for first in range(0, len(xy), BLOCK_SAMPLES):
+        p = xy[first:first + BLOCK_SAMPLES]
+        px, py = p[:, 0], p[:, 1]
+        outside = np.maximum(np.maximum(box_lo[None] - p[:, None], p[:, None] - box_hi[None]), 0.0)
+        lower2 = (outside ** 2).sum(axis=2)
+        upper2 = ((p[:, None] - vertices[starts][None]) ** 2).sum(axis=2).min(axis=1)
+        rows, groups = np.nonzero(lower2 <= np.maximum(upper2, tolerance2)[:, None])
+
+        # expand every (point, group) candidate to the group's segments
+        sizes = ends[groups] - starts[groups]
+        pair_rows = np.repeat(rows, sizes)
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        pair_segments = np.repeat(starts[groups], sizes) + offsets
+
+        # x and y as separate 1-D arrays: half the time of (k, 2) rows with axis sums
+        bx, by = ab_x[pair_segments], ab_y[pair_segments]
+        dx = px[pair_rows] - a_x[pair_segments]
+        dy = py[pair_rows] - a_y[pair_segments]
+        t = np.clip((dx * bx + dy * by) * inv_len2[pair_segments], 0.0, 1.0)
+        dx -= t * bx
+        dy -= t * by
+        d2 = dx * dx + dy * dy
+        covered[pair_segments[d2 <= tolerance2]] = True
+
+        # pairs come ordered by point: the first pair at each point's minimum is its nearest segment
+        bounds = np.flatnonzero(np.r_[True, pair_rows[1:] != pair_rows[:-1]])
+        best = np.minimum.reduceat(d2, bounds)
+        hits = np.flatnonzero(d2 == np.repeat(best, np.diff(np.r_[bounds, len(d2)])))
+        hits = hits[np.r_[True, pair_rows[hits][1:] != pair_rows[hits][:-1]]]
+        distance[first:first + len(p)] = np.sqrt(best)
+        nearest[first:first + len(p)] = pair_segments[hits]
+        along[first:first + len(p)] = t[hits]
+    return distance, nearest, along, covered
+
+
+def lap_progress(segment, along, vertices) -> float:
+    """
+    how many times the template was gone round, from the nearest-point positions
+    of consecutive samples along it (wrapping at the start, either direction);
+    jumps of more than MAX_LAP_STEP of a lap between two samples are ignored
+    """
+    lengths = np.hypot(*np.diff(vertices, axis=0).T)
+    total = lengths.sum()
+    if total == 0 or len(segment) < 2:
+        return 0.0
+    s = (np.concatenate(([0.0], np.cumsum(lengths)))[segment] + along * lengths[segment]) / total
+    step = np.diff(s)
+    step -= np.round(step)  # a jump across the start counts as the short way round
+    # where the shape crosses itself the nearest point can flip to the other branch: not a move
+    step[np.abs(step) > MAX_LAP_STEP] = 0.0
+    return float(abs(step.sum()))
+
+
+def _sweep(p, q, combine, band: float = BAND, abandon: float = math.inf) -> float:
+    """
+    dynamic program over the n x m grid of point distances, one anti-diagonal at
+    a time (each is a single vectorized step). cell (i, j) holds
+    combine(d(i, j), min of its three predecessors): np.add gives DTW, np.maximum
+    discrete Fréchet. Cells further than `band` * max(n, m) from the scaled
+    diagonal are skipped. Every warping path crosses one of any two consecutive
+    anti-diagonals and costs never decrease along it, so the sweep stops with inf
+    as soon as both are above `abandon`.
+    """
+    n, m = len(p), len(q)
+    if n == 0 or m == 0:
+        return math.inf
+    slope = (m - 1) / (n - 1) if n > 1 else 0.0
+    radius = max(band * max(n, m), slope, 1.0)  # never narrower than one step of the diagonal
+
+    # diagonals are indexed by i + 1, slot 0 stays inf for the i - 1 = -1 neighbour.
+    # on diagonal k, j = k - i runs backwards, so q is read as a slice of its reverse
+    px, py = p[:, 0], p[:, 1]
+    qx, qy = q[::-1, 0].copy(), q[::-1, 1].copy()
+    prev2, prev1, cur = (np.full(n + 1, np.inf) for _ in range(3))
+    for k in range(n + m - 1):
+        lo = max(0, k - m + 1, int(math.ceil((k - radius) / (1 + slope))))
+        hi = min(n - 1, k, int(math.floor((k + radius) / (1 + slope)))) + 1
+        cur.fill(np.inf)
+        if lo < hi:
+            j = m - 1 - k
+            d = np.hypot(px[lo:hi] - qx[j + lo:j + hi], py[lo:hi] - qy[j + lo:j + hi])
+            if k == 0:
+                cur[1] = d[0]
+            else:
+                # predecessors (i-1, j), (i, j-1) on the last diagonal and (i-1, j-1) on the one before
+                best = np.minimum(prev1[lo:hi], prev1[lo + 1:hi + 1])
+                np.minimum(best, prev2[lo:hi], out=best)
+                combine(d, best, out=cur[lo + 1:hi + 1])
+            if abandon < math.inf and min(cur[lo + 1:hi + 1].min(), prev1.min()) > abandon:
+                return math.inf
+        prev2, prev1, cur = prev1, cur, prev2
+    return float(prev1[n])
+
+
+def discrete_frechet(p, q, band: float = BAND, abandon: float = math.inf) -> float:
+    return _sweep(np.asarray(p, dtype=float), np.asarray(q, dtype=float), np.maximum, band, abandon)
+
+
+def dtw(p, q, band: float = BAND, abandon: float = math.inf) -> float:
+    """DTW cost (sum of matched point distances) of the best warping path"""
+    return _sweep(np.asarray(p, dtype=float), np.asarray(q, dtype=float), np.add, band, abandon)
+
+
+def score_trial(samples, template, tolerance_px: float = COVERAGE_TOLERANCE_PX, laps: int = None,
+                band: float = BAND, max_dtw: float = math.inf) -> dict:
+    """
+    accuracy metrics of one trial. `samples` as accepted by trajectory(), `template`
+    a ShapeGeometry (see template_geometry()) or an (m, 2) array of outline points.
+    `laps` is the number of times the shape was traced, by default the lap_progress
+    measured along the template, rounded; `max_dtw` abandons DTW early when the per-step cost
+    gets above it (dtw is then inf)
+    """
+    xy = trajectory(samples)
+    if isinstance(template, ShapeGeometry):
+        outline = template.sample_uniform(SEGMENT_SPACING_PX, include_end=True)
+    else:
+        outline = resample(template, SEGMENT_SPACING_PX)
+    outline = one_lap(outline)
+    template_length = path_length(outline)
+    drawn = path_length(xy)
+
+    result = {"samples": int(len(xy)), "path_length": drawn, "template_length": template_length}
+    if len(xy) == 0 or len(outline) < 2:
+        result.update({"mean_error": None, "rms_error": None, "max_error": None, "coverage": 0.0,
+                       "laps": 0, "lap_progress": 0.0, "frechet": None, "dtw": None})
+        return result
+
+    errors, segment, along, near = nearest_on_polyline(xy, outline, tolerance_px)
+    covered = np.hypot(*np.diff(outline, axis=0).T)[near].sum()
+
+    progress = lap_progress(segment, along, outline)
+    if laps is None:
+        laps = max(int(round(progress)), 1)
+    spacing = max(CURVE_SPACING_PX, (drawn + laps * template_length) / MAX_CURVE_POINTS)
+    path = resample(xy, spacing)
+    reference = resample(np.concatenate([outline] * laps), spacing)
+    steps = max(len(path), len(reference))
+
+    result.update({
+        "mean_error": float(errors.mean()),
+        "rms_error": float(np.sqrt((errors ** 2).mean())),
+        "max_error": float(errors.max()),
+        "coverage": float(covered / template_length) if template_length > 0 else 0.0,
+        "laps": laps,
+        "lap_progress": progress,
+        "frechet": discrete_frechet(path, reference, band),
+        "dtw": dtw(path, reference, band, max_dtw * steps) / steps,
+    })
+    return result
+
+
+def score_shape(samples, shape_file: str, **kwargs) -> dict:
+    """score_trial() against the stimulus of an SVG file as the app showed it"""
+    return score_trial(samples, template_geometry(shape_file), **kwargs)
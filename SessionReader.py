@@ -0,0 +1,283 @@
+"""
+Streaming reader for recorded sessions, in any of the output formats:
+
+- json: the tab-indented file written section by section by DataHandler (or rebuilt
+  from a journal), one sample object per line. Files written on Linux by the json
+  writer before it marked its files with "json_layout" lose the closing brace of
+  each trial's last sample and the opening bracket of empty trials; both are
+  repaired while reading such files.
+- journal: one JSON record per line (Journal.py), up to a torn last line.
+- binary: a session directory with header.json and one .npy per trial (SampleStore.py).
+
+Trials are read one at a time, so memory is bounded by the largest trial and not
+by the session. Samples come back as NumPy structured arrays with the
+SAMPLE_DTYPE columns the file has (older files may lack some).
+
+    from SessionReader import iter_trials
+    for trial_num, trial_info, samples in iter_trials("results/..._shape_tracking.json"):
+        samples["posX"]
+"""
+import ast
+import json
+import os
+
+import numpy as np
+
+from SampleStore import HEADER_FILE, NO_DATA, SAMPLE_DTYPE, SAMPLE_FIELDS
+
+SESSION_FORMATS = ("json", "journal", "binary")
+JSON_LAYOUT = 2  # "json_layout" of files whose samples need no repair (DataHandler.JSON_LAYOUT)
+_DTYPES = dict(SAMPLE_DTYPE.descr)
+
+
+def session_format(path: str) -> str:
+    if os.path.isdir(path):
+        return "binary"
+    if path.endswith(".journal"):
+        return "journal"
+    return "json"
+
+
+def samples_array(rows, fields=SAMPLE_FIELDS):
+    """
+    structured array from sample dicts or from rows in `fields` order.
+    known columns keep their SAMPLE_DTYPE type, others are float64; missing values become NO_DATA
+    """
+    if rows and isinstance(rows[0], dict):
+        fields = list(rows[0])
+        rows = [tuple(r.get(name, NO_DATA) for name in fields) for r in rows]
+    else:
+        fields = list(fields[:len(rows[0])]) if rows else list(fields)
+        rows = [tuple(r) for r in rows]
+    dtype = np.dtype([(name, _DTYPES.get(name, "<f8")) for name in fields])
+    return np.array(rows, dtype=dtype)
+
+
+def parse_trial_info(info):
+    """(shape, speed, hide_template) from a trial_info string such as "('assets/shape6.svg', 'medium', False)"""
+    try:
+        shape, speed, hide_template = ast.literal_eval(info) if isinstance(info, str) else info
+    except (ValueError, SyntaxError, TypeError):
+        return None
+    if not shape:
+        return None
+    return shape, speed, bool(hide_template)
+
+
+def _lines(f):
+    """(byte offset, line) of the rest of a file opened in binary mode"""
+    offset = f.tell()
+    for line in f:
+        yield offset, line
+        offset += len(line)
+
+
+def _field(line: bytes):
+    """(key, value) of a line holding one '"key": value,' member"""
+    return next(iter(json.loads(b"{" + line.strip().rstrip(b",") + b"}").items()))
+
+
+def _json_sections(lines, load_samples=True, legacy=False):
+    """
+    sections of the trial list of a json session, from (offset, line) pairs starting at a
+    section (or the trial list). offset/length span the section up to its closing brace.
+    load_samples=False only counts the samples; legacy=True repairs the samples of files
+    written before json_layout
+    """
+    section, rows, in_data, offset = None, [], False, 0
+    for start, line in lines:
+        text = line.strip()
+        if section is None:
+            if text == b"{":
+                section, rows, offset = {}, [], start
+            elif text.startswith(b"]"):
+                return  # end of the trial list
+        elif in_data:
+            if text.startswith(b"]"):
+                in_data = False
+            elif text:
+                text = text.rstrip(b",")
+                rows.append(text + b"}" if legacy and not text.endswith(b"}") else text)
+        elif text.startswith(b'"data"'):
+            in_data = True
+        elif text.startswith(b"}"):
+            if not load_samples:
+                section["samples"] = len(rows)
+            else:
+                section["samples"] = samples_array(json.loads(b"[" + b",".join(rows) + b"]")) if rows \
+                    else np.empty(0, dtype=SAMPLE_DTYPE)
+            section["offset"] = offset
+            section["length"] = start + len(line.rstrip(b",\r\n")) - offset
+            yield section
+            section, rows = None, []
+        else:
+            key, value = _field(text)
+            section[key] = value
+    if section is not None:
+        raise ValueError(f"session ends inside trial {section.get('trial_num')}")
+
+
+def _iter_json(path, load_samples=True):
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b"{":
+            yield from _iter_json_document(path, load_samples)  # not the line layout, e.g. re-saved by another tool
+            return
+        lines = _lines(f)
+        header = {}
+        for _, line in lines:
+            text = line.strip()
+            if text.startswith(b'"data"'):
+                break
+            key, value = _field(text)
+            header[key] = value
+        else:
+            raise ValueError(f"{path}: no trial data found")
+        yield header
+        yield from _json_sections(lines, load_samples, _is_legacy(header))
+
+
+def _is_legacy(header):
+    return header.get("json_layout", 1) < JSON_LAYOUT
+
+
+def _iter_json_document(path, load_samples=True):
+    with open(path, 'r', encoding='utf-8') as f:
+        session = json.load(f)
+    trials = session.pop("data", [])
+    yield session
+    for trial in trials:
+        rows = trial.pop("data", [])
+        if not load_samples:
+            trial["samples"] = len(rows)
+        else:
+            trial["samples"] = samples_array(rows) if rows else np.empty(0, dtype=SAMPLE_DTYPE)
+        yield trial
+
+
+def _journal_records(f):
+    """(offset, end, record) of the complete journal records from the current position"""
+    for start, line in _lines(f):
+        if not line.endswith(b"\n"):
+            return  # torn last line, like Journal.iter_journal
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        yield start, start + len(line), record
+
+
+def _journal_sections(records, fields, load_samples=True):
+    """sections from journal records starting at a trial (or the session record)"""
+    section, rows, offset, end = None, None, 0, 0
+
+    def finish():
+        if not load_samples:
+            section["samples"] = len(rows)
+        else:
+            section["samples"] = samples_array(rows, fields) if rows else np.empty(0, dtype=SAMPLE_DTYPE)
+        section["offset"], section["length"] = offset, end - offset
+        return section
+
+    for start, stop, record in records:
+        kind = record.pop("type", None)
+        if kind == "trial_start":
+            if section is not None:
+                yield finish()
+            section, rows, offset = record, [], start
+        elif kind == "samples" and section is not None:
+            rows.extend(record["rows"])
+        elif kind == "trial_end" and section is not None:
+            if "timing" in record:
+                section["timing"] = record["timing"]
+            end = stop
+            yield finish()
+            section = None
+        elif kind == "session_end":
+            break
+        end = stop
+    if section is not None:
+        yield finish()
+
+
+def _iter_journal(path, load_samples=True):
+    with open(path, 'rb') as f:
+        records = _journal_records(f)
+        for _, _, header in records:
+            if header.pop("type", None) == "session":
+                break
+        else:
+            raise ValueError(f"{path} does not start with a session record")
+        fields = header.pop("fields", list(SAMPLE_FIELDS))
+        yield header
+        yield from _journal_sections(records, fields, load_samples)
+
+
+def _iter_binary(path, mmap=False, load_samples=True):
+    with open(os.path.join(path, HEADER_FILE), 'r', encoding='utf-8') as f:
+        header = json.load(f)
+    trials = header.pop("trials", [])
+    yield header
+    for trial in trials:
+        file_path = os.path.join(path, trial["file"])
+        samples = np.load(file_path, mmap_mode='r' if mmap else None) if load_samples else trial.get("samples")
+        yield dict(trial, samples=samples, offset=0, length=os.path.getsize(file_path))
+
+
+def _sections(path, mmap=False, load_samples=True):
+    fmt = session_format(path)
+    if fmt == "binary":
+        return _iter_binary(path, mmap, load_samples)
+    if fmt == "journal":
+        return _iter_journal(path, load_samples)
+    return _iter_json(path, load_samples)
+
+
+def read_header(path: str) -> dict:
+    """session-level fields (pid, exp, start_time, metadata) without reading any samples"""
+    sections = _sections(path)
+    try:
+        return next(sections)
+    finally:
+        sections.close()
+
+
+def iter_sections(path: str, mmap: bool = False, load_samples: bool = True):
+    """
+    yield every section of a session as a dict: trial_num (int), trial_info, samples,
+    clock_anchor and timing when recorded, and offset/length of the section in its file (bytes).
+    mmap=True maps binary trials instead of loading them; load_samples=False
+    gives the sample count instead of the samples
+    """
+    sections = _sections(path, mmap, load_samples)
+    next(sections)
+    for section in sections:
+        section["trial_num"] = int(section["trial_num"])
+        yield section
+
+
+def read_section_at(path: str, offset: int) -> dict:
+    """
+    the section of a json or journal session starting at byte `offset` (see iter_sections),
+    None when no section starts there
+    """
+    with open(path, 'rb') as f:
+        if session_format(path) == "journal":
+            fields = json.loads(f.readline()).get("fields", list(SAMPLE_FIELDS))
+            f.seek(offset)
+            sections = _journal_sections(_journal_records(f), fields)
+        else:
+            legacy = _is_legacy(read_header(path))
+            f.seek(offset)
+            sections = _json_sections(_lines(f), legacy=legacy)
+        section = next(sections, None)
+    if section is not None:
+        section["trial_num"] = int(section["trial_num"])
+    return section
+
+
+def iter_trials(path: str, mmap: bool = False):
+    """
+    yield (trial_num, trial_info, samples) for every section of a session, one at a time
+    """
+    for section in iter_sections(path, mmap):
+        yield section["trial_num"], section["trial_info"], section["samples"]
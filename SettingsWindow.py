@@ -2,30 +2,31 @@ import os
 from PyQt5.QtSvg import QSvgWidget
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
-    QCheckBox, QSlider, QPushButton, QGridLayout, QGroupBox
+    QCheckBox, QSlider, QPushButton, QGridLayout, QGroupBox, QMessageBox
 )
 from PyQt5.QtGui import QDoubleValidator
 from PyQt5.QtCore import Qt
+from settings_singleton import Settings, SPEEDS, SHAPE_IDS, TEMPLATE_TOKENS
 
 
 class SettingsWindow(QDialog):
-    SETTINGS_FILE = "settings.txt"
+    """Editor for the shared Settings; it never reads the settings file itself."""
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Settings")
         self.setFixedSize(600, 600)
 
-        self.values = self.load_settings_file()
+        self.settings = Settings()
         layout = QVBoxLayout()
 
         # --- Stimuli Duration ---
-        self.stimuli_input = QLineEdit(str(self.values.get("stimuli_duration", 5.0)))
+        self.stimuli_input = QLineEdit()
         self.stimuli_input.setValidator(QDoubleValidator(0.0, 9999.0, 3))
         layout.addLayout(self._labeled_row("Transition duration (s):", self.stimuli_input))
 
         # --- Drawing Duration ---
-        self.drawing_input = QLineEdit(str(self.values.get("drawing_duration", 5.0)))
+        self.drawing_input = QLineEdit()
         self.drawing_input.setValidator(QDoubleValidator(0.0, 9999.0, 3))
         layout.addLayout(self._labeled_row("Drawing duration (s):", self.drawing_input))
 
@@ -85,10 +86,6 @@ class SettingsWindow(QDialog):
         intro_group.setLayout(intro_layout)
         layout.addWidget(intro_group)
 
-        self.intro_checkbox.setChecked(
-            self.values.get("show_intro", "true").lower() == "true"
-        )
-
         # --- NEW: Full Screen ---
         fullscreen_group = QGroupBox()
         fullscreen_layout = QHBoxLayout()
@@ -98,10 +95,6 @@ class SettingsWindow(QDialog):
 
         fullscreen_group.setLayout(fullscreen_layout)
         layout.addWidget(fullscreen_group)
-
-        self.fullscreen_checkbox.setChecked(
-            self.values.get("full_screen", "false").lower() == "true"
-        )
         # -----------------------
 
         # --- Template visibility options ---
@@ -109,12 +102,8 @@ class SettingsWindow(QDialog):
         template_layout = QHBoxLayout()
         self.template_checkboxes = {}
 
-        all_templates = ["Show Template", "Hide Template"]
-        saved_templates = self.values.get("template", "Show Template,Hide Template").split(",")
-
-        for option in all_templates:
+        for option in TEMPLATE_TOKENS:
             cb = QCheckBox(option)
-            cb.setChecked(option in saved_templates)
             template_layout.addWidget(cb)
             self.template_checkboxes[option] = cb
 
@@ -126,12 +115,8 @@ class SettingsWindow(QDialog):
         speed_layout = QHBoxLayout()
         self.speed_checkboxes = {}
 
-        all_speeds = ["fast", "medium", "slow", "comfort"]
-        saved_speeds = self.values.get("speeds", "fast,medium,slow,comfort").split(",")
-
-        for speed in all_speeds:
+        for speed in SPEEDS:
             cb = QCheckBox(speed)
-            cb.setChecked(speed in saved_speeds)
             speed_layout.addWidget(cb)
             self.speed_checkboxes[speed] = cb
 
@@ -143,8 +128,7 @@ class SettingsWindow(QDialog):
         shape_layout = QGridLayout()
         self.shape_checkboxes = []
 
-        shape_files = [f"assets/shape{i}.svg" for i in range(1, 10)]
-        selected_ids = list(map(int, self.values.get("shapes", "1,2,3,4,5,6,7,8,9").split(",")))
+        shape_files = [f"assets/shape{i}.svg" for i in SHAPE_IDS]
 
         for idx, path in enumerate(shape_files):
             row = idx // 3
@@ -157,7 +141,6 @@ class SettingsWindow(QDialog):
             shape_layout.addWidget(svg, row, col)
 
             cb = QCheckBox(os.path.basename(path))
-            cb.setChecked(shape_id in selected_ids)
             shape_layout.addWidget(cb, row, col + 1)
 
             self.shape_checkboxes.append((cb, shape_id))
@@ -176,6 +159,25 @@ class SettingsWindow(QDialog):
         layout.addLayout(btn_row)
 
         self.setLayout(layout)
+        self.load_from_settings()
+
+    def load_from_settings(self):
+        """show the current values of the shared Settings"""
+        s = self.settings
+        self.stimuli_input.setText(str(s.get_transition_duration()))
+        self.drawing_input.setText(str(s.get_drawing_duration()))
+        self.intro_checkbox.setChecked(s.get_show_intro())
+        self.fullscreen_checkbox.setChecked(s.get_full_screen())
+        for option, cb in self.template_checkboxes.items():
+            cb.setChecked(TEMPLATE_TOKENS[option] in s.get_temp_show_settings())
+        for speed, cb in self.speed_checkboxes.items():
+            cb.setChecked(speed in s.get_speeds())
+        for cb, shape_id in self.shape_checkboxes:
+            cb.setChecked(shape_id in s.get_shapes())
+
+    def showEvent(self, event):
+        self.load_from_settings()
+        super().showEvent(event)
 
     def _labeled_row(self, label, widget):
         row = QHBoxLayout()
@@ -198,37 +200,24 @@ class SettingsWindow(QDialog):
     #             return f"{key[0]},{key[1]}"
     #     return "0,0"
 
-    def load_settings_file(self):
-        if not os.path.exists(self.SETTINGS_FILE):
-            return {}
-
-        values = {}
-        with open(self.SETTINGS_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                if '=' in line:
-                    key, val = line.strip().split('=', 1)
-                    values[key.strip()] = val.strip()
-        return values
-
     def save_to_file(self):
-        shapes = [str(shape_id) for cb, shape_id in self.shape_checkboxes if cb.isChecked()]
+        shapes = [shape_id for cb, shape_id in self.shape_checkboxes if cb.isChecked()]
         selected_speeds = [s for s, cb in self.speed_checkboxes.items() if cb.isChecked()]
-        template = [opt for opt, cb in self.template_checkboxes.items() if cb.isChecked()]
+        templates = [TEMPLATE_TOKENS[opt] for opt, cb in self.template_checkboxes.items() if cb.isChecked()]
         if not selected_speeds:
             selected_speeds = ["fast"]  # fallback default
 
-        lines = [
-            f"stimuli_duration={self.stimuli_input.text()}",
-            f"drawing_duration={self.drawing_input.text()}",
-            f"template={','.join(template)}",
-            f"shapes={','.join(shapes)}",
-            f"speeds={','.join(selected_speeds)}",
-            f"show_intro={str(self.intro_checkbox.isChecked()).lower()}",
-            # --- NEW: persist full screen flag ---
-            f"full_screen={str(self.fullscreen_checkbox.isChecked()).lower()}",
-        ]
-
-        with open(self.SETTINGS_FILE, "w", encoding="utf-8") as f:
-            f.write("\n".join(lines))
-        print("settings.txt updated.")
+        try:
+            self.settings.update({
+                "stimuli_duration": self.stimuli_input.text(),
+                "drawing_duration": self.drawing_input.text(),
+                "templates": templates,
+                "shapes": shapes,
+                "speeds": selected_speeds,
+                "show_intro": self.intro_checkbox.isChecked(),
+                "full_screen": self.fullscreen_checkbox.isChecked(),
+            }, save=True)
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid settings", str(e))
+            return
         self.accept()
@@ -0,0 +1,247 @@
+import hashlib
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+CACHE_DIR = os.path.join("cache", "geometry")
+GEOMETRY_VERSION = 2
+DEFAULT_SVG_SIZE = (200, 240)
+LENGTH_SAMPLES = 64  # polyline resolution per segment of the arc-length table
+
+_memory_cache = {}
+_memory_lock = threading.Lock()
+
+
+def _parse_svg(filepath: str, reposition: bool):
+    """
+    read the first <path> of an SVG together with the scale/translate of its first <g>.
+    returns (d, (sx, sy), (tx, ty), svg_size); d is None when the file has no path
+    """
+    root = ET.parse(filepath).getroot()
+
+    svg_size = DEFAULT_SVG_SIZE
+    # Optional: extract viewBox size
+    if "viewBox" in root.attrib:
+        _, _, w, h = map(float, root.attrib["viewBox"].split())
+        svg_size = (w, h)
+
+    # Defaults
+    sx, sy = 1.0, 1.0  # scale factors from SVG <g>
+    tx, ty = 0.0, 0.0  # translation offsets
+
+    # Look for first <g> with a transform attribute
+    for el in root.iter():
+        if el.tag.endswith('g') and 'transform' in el.attrib:
+            transform = el.attrib['transform']
+
+            # Parse scale(x[,y])
+            match = re.search(r"scale\(([^)]+)\)", transform)
+            if match:
+                parts = list(map(float, re.split(r"[ ,]+", match.group(1).strip())))
+                if len(parts) == 1:
+                    sx = sy = parts[0]
+                elif len(parts) >= 2:
+                    sx, sy = parts[0], parts[1]
+
+            # Parse translate(x[,y])
+            match = re.search(r"translate\(([^)]+)\)", transform)
+            if match and reposition:
+                parts = list(map(float, re.split(r"[ ,]+", match.group(1).strip())))
+                if len(parts) == 1:
+                    tx, ty = parts[0], 0.0
+                elif len(parts) >= 2:
+                    tx, ty = parts[0], parts[1]
+
+            break  # only first <g> matters
+
+    # Find the first <path> with a 'd' attribute
+    path_element = next(
+        (el for el in root.iter() if el.tag.endswith('path') and 'd' in el.attrib),
+        None
+    )
+    d = path_element.attrib['d'] if path_element is not None else None
+    return d, (sx, sy), (tx, ty), svg_size
+
+
+def _cubic_controls(path):
+    """
+    control points of every segment as an (S, 4) complex array; lines and quadratic
+    curves are degree-elevated, which keeps both the curve and its parametrization.
+    arcs are returned separately by index since they have no polynomial form
+    """
+    from svgpathtools import Line, QuadraticBezier, CubicBezier
+
+    controls = np.empty((len(path), 4), dtype=complex)
+    arcs = {}
+    for i, seg in enumerate(path):
+        if isinstance(seg, Line):
+            p0, p1 = seg.start, seg.end
+            controls[i] = (p0, p0 + (p1 - p0) / 3, p0 + 2 * (p1 - p0) / 3, p1)
+        elif isinstance(seg, QuadraticBezier):
+            p0, q, p2 = seg.start, seg.control, seg.end
+            controls[i] = (p0, p0 + 2 * (q - p0) / 3, p2 + 2 * (q - p2) / 3, p2)
+        elif isinstance(seg, CubicBezier):
+            controls[i] = (seg.start, seg.control1, seg.control2, seg.end)
+        else:
+            controls[i] = (seg.start, seg.start, seg.end, seg.end)
+            arcs[i] = seg
+    return controls, arcs
+
+
+def _eval_cubics(controls, seg_index, t, arcs=None):
+    """evaluate segment seg_index[k] at local parameter t[k] for all k at once"""
+    c = controls[seg_index]
+    mt = 1.0 - t
+    points = (mt ** 3 * c[:, 0] + 3 * mt ** 2 * t * c[:, 1]
+              + 3 * mt * t ** 2 * c[:, 2] + t ** 3 * c[:, 3])
+    if arcs:
+        for k in np.flatnonzero(np.isin(seg_index, list(arcs))):
+            points[k] = arcs[int(seg_index[k])].point(float(t[k]))
+    return points
+
+
+def _dense_path(d: str):
+    """
+    dense polyline of the path in SVG coordinates: LENGTH_SAMPLES pieces per segment,
+    evaluated for all segments at once. exact for straight segments
+    """
+    from svgpathtools import parse_path
+
+    path = parse_path(d)
+    if len(path) == 0:
+        return np.empty((0, 2))
+
+    controls, arcs = _cubic_controls(path)
+    n_seg = len(controls)
+    t_dense = np.linspace(0.0, 1.0, LENGTH_SAMPLES + 1)
+    dense = _eval_cubics(controls, np.repeat(np.arange(n_seg), len(t_dense)), np.tile(t_dense, n_seg), arcs)
+    # segment k ends where segment k+1 starts, keep that point once
+    keep = np.ones(len(dense), dtype=bool)
+    keep[len(t_dense)::len(t_dense)] = False
+    dense = dense[keep]
+    return np.column_stack((dense.real, dense.imag))
+
+
+def _cumulative_length(xy):
+    if len(xy) == 0:
+        return np.zeros(0)
+    return np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(xy, axis=0).T))))
+
+
+class ShapeGeometry:
+    """
+    Screen-space geometry of one shape: the drawing points, spaced uniformly in
+    arc length, and the arc-length table (cumulative length at every vertex of a
+    dense polyline) used to map any progress fraction to a position in O(log n).
+    """
+
+    def __init__(self, points, arc_s, arc_xy, svg_size):
+        self.points = points
+        self.arc_s = arc_s
+        self.arc_xy = arc_xy
+        self.svg_size = svg_size
+        for array in (points, arc_s, arc_xy):
+            array.setflags(write=False)
+
+    @property
+    def length(self) -> float:
+        return float(self.arc_s[-1]) if len(self.arc_s) else 0.0
+
+    def position_at(self, fraction):
+        """
+        (x, y) at the given fraction(s) of the total length, fraction may be an array
+        """
+        fraction = np.clip(np.asarray(fraction, dtype=float), 0.0, 1.0)
+        s = fraction * self.length
+        x = np.interp(s, self.arc_s, self.arc_xy[:, 0])
+        y = np.interp(s, self.arc_s, self.arc_xy[:, 1])
+        return np.stack((x, y), axis=-1)
+
+    def sample_uniform(self, spacing: float, include_end: bool = False):
+        """
+        points every `spacing` pixels along the path
+        """
+        if self.length == 0:
+            return self.arc_xy[:1].copy()
+        count = max(int(self.length / spacing), 1)
+        fractions = np.arange(count + (1 if include_end else 0)) / count
+        return self.position_at(fractions)
+
+
+def _build_geometry(filepath: str, scale: float, flip_x: bool, top_left, reposition: bool):
+    d, (sx, sy), (tx, ty), svg_size = _parse_svg(filepath, reposition)
+    if d is None:
+        raise ValueError("No <path> found in SVG.")
+
+    dense = _dense_path(d)
+    svg_length = _cumulative_length(dense)[-1] if len(dense) else 0.0
+
+    flip = -1 if flip_x else 1
+    arc_xy = np.empty_like(dense)
+    arc_xy[:, 0] = flip * dense[:, 0] * sx * scale + tx + top_left[0]
+    arc_xy[:, 1] = dense[:, 1] * sy * scale + ty + top_left[1]
+    arc_s = _cumulative_length(arc_xy)
+
+    if len(dense) == 0:
+        points = np.empty((0, 2))
+    else:
+        # same density as always (one point per 2 SVG units), now evenly spaced along the curve
+        num_points = max(int(svg_length / 2), 2)
+        fractions = np.arange(num_points) / num_points
+        total = arc_s[-1]
+        points = np.column_stack((np.interp(fractions * total, arc_s, arc_xy[:, 0]),
+                                  np.interp(fractions * total, arc_s, arc_xy[:, 1])))
+    return ShapeGeometry(points, arc_s, arc_xy, svg_size)
+
+
+def _cache_key(file_bytes: bytes, scale: float, flip_x: bool, top_left, reposition: bool) -> str:
+    h = hashlib.sha1(file_bytes)
+    h.update(repr((GEOMETRY_VERSION, float(scale), bool(flip_x),
+                   float(top_left[0]), float(top_left[1]), bool(reposition))).encode())
+    return h.hexdigest()
+
+
+def load_geometry(filepath: str, scale: float, flip_x: bool, top_left, reposition: bool = True,
+                  cache_dir: str = CACHE_DIR) -> ShapeGeometry:
+    """
+    screen-space ShapeGeometry of the shape in an SVG file.
+    results are cached in memory and on disk, keyed by (file hash, scale, flip, top_left)
+    so only the first ever load of a shape parses and samples the path
+    """
+    with open(filepath, 'rb') as f:
+        file_bytes = f.read()
+    key = _cache_key(file_bytes, scale, flip_x, top_left, reposition)
+
+    with _memory_lock:
+        geometry = _memory_cache.get(key)
+    if geometry is not None:
+        return geometry
+
+    cache_file = os.path.join(cache_dir, key + ".npz") if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as data:
+                geometry = ShapeGeometry(data["points"], data["arc_s"], data["arc_xy"],
+                                         tuple(float(v) for v in data["svg_size"]))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring broken geometry cache {cache_file}: {e}")
+
+    if geometry is None:
+        geometry = _build_geometry(filepath, scale, flip_x, top_left, reposition)
+        if cache_file:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_file = cache_file + ".tmp"
+                with open(tmp_file, 'wb') as f:
+                    np.savez(f, points=geometry.points, arc_s=geometry.arc_s, arc_xy=geometry.arc_xy,
+                             svg_size=np.asarray(geometry.svg_size, dtype=float))
+                os.replace(tmp_file, cache_file)
+            except OSError as e:
+                print(f"Could not write geometry cache: {e}")
+
+    with _memory_lock:
+        _memory_cache[key] = geometry
+    return geometry
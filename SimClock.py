@@ -0,0 +1,236 @@
+"""
+Clocks and timers of the trial flow, injectable so a session can run on simulated time.
+
+RealClock is what the app uses: QTimers, time.perf_counter_ns and time.time.
+SimClock keeps a virtual time and a queue of timers instead; run() and advance()
+fire them in (due time, start order) order and jump over the waits in between, so
+a whole session takes as long as its work rather than its drawing and transition
+durations, and two runs fire the same timers in the same order.
+
+Widgets take a `clock=` argument and fall back to get_clock(), so a test or
+benchmark can either pass a SimClock in or set_clock() one for everything it builds.
+"""
+import heapq
+import itertools
+import time
+
+MIN_REPEAT_NS = 1_000_000  # a repeating 0 ms timer ticks every 1 ms of simulated time, not in a loop
+
+
+class RealClock:
+    """Wall-clock time and real QTimers."""
+
+    @staticmethod
+    def now_ns() -> int:
+        return time.perf_counter_ns()
+
+    @staticmethod
+    def time() -> float:
+        return time.time()
+
+    @staticmethod
+    def timer(parent=None):
+        from PyQt5.QtCore import QTimer  # Qt is only needed once timers are made (DataHandler only reads the clock)
+        return QTimer(parent)
+
+    @staticmethod
+    def single_shot(msec: int, callback):
+        from PyQt5.QtCore import QTimer
+        QTimer.singleShot(int(msec), callback)
+
+
+class _Signal:
+    """the connect/disconnect/emit part of a Qt signal, for SimTimer.timeout"""
+
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def disconnect(self, slot=None):
+        if slot is None:
+            self.slots.clear()
+        else:
+            self.slots.remove(slot)
+
+    def emit(self, *args):
+        for slot in list(self.slots):
+            slot(*args)
+
+
+class SimTimer:
+    """QTimer look-alike driven by a SimClock (the subset of the API the widgets use)."""
+
+    def __init__(self, clock, parent=None):
+        self.clock = clock
+        self.timeout = _Signal()
+        self.single_shot = False
+        self.interval_ms = 0
+        self.active = False
+        self.due_ns = None
+        self.generation = 0  # bumped on every start/stop, so stale queue entries are skipped
+        if parent is not None:
+            # like a QTimer child: stops with its parent instead of firing into a deleted widget
+            parent.destroyed.connect(self.stop)
+
+    def setSingleShot(self, single_shot: bool):
+        self.single_shot = bool(single_shot)
+
+    def isSingleShot(self) -> bool:
+        return self.single_shot
+
+    def setInterval(self, msec):
+        self.interval_ms = msec
+
+    def interval(self):
+        return self.interval_ms
+
+    def setTimerType(self, timer_type):
+        pass  # simulated timers are exact
+
+    def start(self, msec=None):
+        if msec is not None:
+            self.interval_ms = msec
+        self.active = True
+        self.generation += 1
+        self.due_ns = self.clock.now_ns() + int(self.interval_ms * 1_000_000)
+        self.clock._schedule(self)
+
+    def stop(self):
+        self.active = False
+        self.generation += 1
+        self.due_ns = None
+
+    def isActive(self) -> bool:
+        return self.active
+
+    def remainingTime(self) -> int:
+        if not self.active:
+            return -1
+        return max((self.due_ns - self.clock.now_ns()) // 1_000_000, 0)
+
+    def _fire(self):
+        if self.single_shot:
+            self.stop()
+        else:
+            # the next tick is due one interval after this one was, so ticks never drift
+            self.generation += 1
+            self.due_ns += max(int(self.interval_ms * 1_000_000), MIN_REPEAT_NS)
+            self.clock._schedule(self)
+        self.timeout.emit()
+
+
+class SimClock:
+    """
+    Simulated time. Nothing moves until run(), advance() or step() is called;
+    after every timer that fires, the Qt events it posted (repaints, deferred
+    deletes, queued signals) are processed before the next one fires.
+    """
+
+    def __init__(self, start_wall: float = None, process_events: bool = True):
+        self.wall_start = time.time() if start_wall is None else start_wall
+        self.process_events = process_events
+        self.now = 0  # simulated perf_counter_ns
+        self.fired = 0
+        self._queue = []  # (due_ns, order, timer, generation)
+        self._order = itertools.count()
+
+    def now_ns(self) -> int:
+        return self.now
+
+    def time(self) -> float:
+        return self.wall_start + self.now / 1e9
+
+    def timer(self, parent=None) -> SimTimer:
+        return SimTimer(self, parent)
+
+    def single_shot(self, msec: int, callback) -> SimTimer:
+        timer = SimTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(callback)
+        timer.start(msec)
+        return timer
+
+    def _schedule(self, timer: SimTimer):
+        heapq.heappush(self._queue, (timer.due_ns, next(self._order), timer, timer.generation))
+
+    def _next(self):
+        """the next live queue entry, dropping the ones of stopped or restarted timers"""
+        while self._queue:
+            due_ns, _, timer, generation = self._queue[0]
+            if timer.active and timer.generation == generation:
+                return self._queue[0]
+            heapq.heappop(self._queue)
+        return None
+
+    def pending(self) -> int:
+        return sum(1 for _, _, timer, generation in self._queue
+                   if timer.active and timer.generation == generation)
+
+    def next_due_ns(self):
+        entry = self._next()
+        return entry[0] if entry else None
+
+    def step(self) -> bool:
+        """jump to the earliest due timer and fire it; False when nothing is scheduled"""
+        entry = self._next()
+        if entry is None:
+            return False
+        heapq.heappop(self._queue)
+        due_ns, _, timer, _ = entry
+        self.now = max(self.now, due_ns)
+        self.fired += 1
+        timer._fire()
+        if self.process_events:
+            from PyQt5.QtCore import QCoreApplication
+            QCoreApplication.processEvents()
+        return True
+
+    def advance(self, msec: float):
+        """fire everything due in the next `msec` of simulated time, then move the clock there"""
+        end_ns = self.now + int(msec * 1_000_000)
+        while True:
+            due_ns = self.next_due_ns()
+            if due_ns is None or due_ns > end_ns:
+                break
+            self.step()
+        self.now = max(self.now, end_ns)
+
+    def run(self, until=None, max_ms: float = None, max_steps: int = None) -> bool:
+        """
+        fire timers until `until()` is true, nothing is scheduled, `max_ms` of
+        simulated time passed or `max_steps` timers fired; True when `until()` was met
+        """
+        end_ns = self.now + int(max_ms * 1_000_000) if max_ms is not None else None
+        steps = 0
+        while until is None or not until():
+            due_ns = self.next_due_ns()
+            if due_ns is None or (end_ns is not None and due_ns > end_ns):
+                return False
+            if max_steps is not None and steps >= max_steps:
+                return False
+            self.step()
+            steps += 1
+        return True
+
+    def clear(self):
+        """drop every scheduled timer (between soak sessions, so nothing carries over)"""
+        for _, _, timer, _ in self._queue:
+            timer.stop()
+        self._queue.clear()
+
+
+_clock = RealClock()
+
+
+def get_clock():
+    """the clock new widgets and data handlers use when none is passed in"""
+    return _clock
+
+
+def set_clock(clock):
+    """install a clock for everything built afterwards; returns the previous one"""
+    global _clock
+    previous, _clock = _clock, clock if clock is not None else RealClock()
+    return previous
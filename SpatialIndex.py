@@ -0,0 +1,113 @@
+"""
+Nearest-segment queries against a template outline, fast enough to run for every
+pen sample on the GUI thread.
+
+SegmentGrid lays a uniform grid over the outline (plus a margin). At build time
+every cell gets the short list of segments that can be nearest to some point
+inside it: those no further from the cell centre than the nearest segment's
+distance plus the cell's diagonal. A query is then one cell lookup and a few exact
+point-to-segment distances in plain Python, a few microseconds. Points outside
+the grid fall back to checking every segment.
+"""
+import math
+import weakref
+
+import numpy as np
+
+from Scoring import one_lap
+
+CELL_SIZE_PX = 16.0
+MARGIN_PX = 200.0  # grid extent around the outline; further away the error is large anyway
+OUTLINE_SPACING_PX = 8.0  # chords of the outline stay within half a pixel of the curve
+BUILD_BLOCK_CELLS = 512  # cells measured against all segments at once while building
+
+_grids = weakref.WeakKeyDictionary()
+
+
+class SegmentGrid:
+    """Uniform grid of candidate segments over a polyline."""
+
+    def __init__(self, vertices, cell_size: float = CELL_SIZE_PX, margin: float = MARGIN_PX):
+        vertices = np.asarray(vertices, dtype=float)
+        if len(vertices) < 2:
+            raise ValueError("a SegmentGrid needs at least two vertices")
+        a, b = vertices[:-1], vertices[1:]
+        ab = b - a
+        len2 = (ab ** 2).sum(axis=1)
+        inv_len2 = np.where(len2 > 0, 1.0 / np.maximum(len2, 1e-12), 0.0)
+        # (ax, ay, abx, aby, 1/|ab|^2) per segment, as floats for the pure-Python query
+        self.segments = [tuple(map(float, row)) for row in np.column_stack((a, ab, inv_len2))]
+        self.cumulative = np.concatenate(([0.0], np.cumsum(np.sqrt(len2))))
+
+        self.cell_size = float(cell_size)
+        self.x0, self.y0 = vertices.min(axis=0) - margin
+        x1, y1 = vertices.max(axis=0) + margin
+        self.columns = int(math.ceil((x1 - self.x0) / self.cell_size))
+        self.rows = int(math.ceil((y1 - self.y0) / self.cell_size))
+        self.cells = self.__build(a, ab, inv_len2)
+
+    def __build(self, a, ab, inv_len2):
+        cx = self.x0 + (np.arange(self.columns) + 0.5) * self.cell_size
+        cy = self.y0 + (np.arange(self.rows) + 0.5) * self.cell_size
+        centres = np.column_stack((np.tile(cx, self.rows), np.repeat(cy, self.columns)))  # row-major
+        half_diagonal = self.cell_size * math.sqrt(0.5)
+
+        cells = []
+        for first in range(0, len(centres), BUILD_BLOCK_CELLS):
+            c = centres[first:first + BUILD_BLOCK_CELLS, None, :]
+            ac = c - a[None]
+            t = np.clip((ac * ab[None]).sum(axis=2) * inv_len2[None], 0.0, 1.0)
+            d = np.sqrt(((ac - t[:, :, None] * ab[None]) ** 2).sum(axis=2))
+            # any point of the cell is within half a diagonal of the centre, so its nearest
+            # segment is at most nearest + 2 * half_diagonal away from the centre
+            limit = d.min(axis=1, keepdims=True) + 2 * half_diagonal
+            for row in d <= limit:
+                cells.append(tuple(np.flatnonzero(row).tolist()))
+        return cells
+
+    def nearest(self, x: float, y: float):
+        """(distance, segment index, position along the segment in [0, 1]) of the nearest outline point"""
+        col = int((x - self.x0) // self.cell_size)
+        row = int((y - self.y0) // self.cell_size)
+        if 0 <= col < self.columns and 0 <= row < self.rows:
+            candidates = self.cells[row * self.columns + col]
+        else:
+            candidates = range(len(self.segments))
+
+        best_d2, best, best_t = math.inf, -1, 0.0
+        segments = self.segments
+        for i in candidates:
+            ax, ay, bx, by, inv = segments[i]
+            dx, dy = x - ax, y - ay
+            t = (dx * bx + dy * by) * inv
+            t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+            dx -= t * bx
+            dy -= t * by
+            d2 = dx * dx + dy * dy
+            if d2 < best_d2:
+                best_d2, best, best_t = d2, i, t
+        return math.sqrt(best_d2), best, best_t
+
+    def distance(self, x: float, y: float) -> float:
+        return self.nearest(x, y)[0]
+
+    def arc_position(self, segment: int, t: float) -> float:
+        """distance along the outline (px) of a point given as (segment, t)"""
+        return float(self.cumulative[segment] + t * (self.cumulative[segment + 1] - self.cumulative[segment]))
+
+    def stats(self) -> dict:
+        sizes = [len(c) for c in self.cells]
+        return {"cells": len(self.cells), "segments": len(self.segments),
+                "mean_candidates": sum(sizes) / len(sizes), "max_candidates": max(sizes)}
+
+
+def grid_for(geometry) -> SegmentGrid:
+    """
+    SegmentGrid over one lap of a ShapeGeometry's outline, built on first use and
+    kept for as long as the geometry is (load_geometry caches those per shape and scale)
+    """
+    grid = _grids.get(geometry)
+    if grid is None:
+        grid = SegmentGrid(one_lap(geometry.sample_uniform(OUTLINE_SPACING_PX, include_end=True)))
+        _grids[geometry] = grid
+    return grid
@@ -0,0 +1,99 @@
+import numpy as np
+
+STROKE_FIELDS = ("x", "y", "width", "pressure")
+DEFAULT_RING_SIZE = 256  # vertices kept when the history is off
+HISTORY_CAPACITY = 4096  # initial vertices of the history buffers, doubled when full
+
+
+class StrokeStore:
+    """
+    The ink of the current trial as parallel float32 columns (x, y, width,
+    pressure) of stroke vertices, plus a `connected` flag telling whether a
+    segment is drawn from the previous vertex (0 where the pen was lifted).
+
+    By default only the last `ring_size` vertices are kept in a preallocated
+    ring, which is all the on-screen tail needs; with `history=True` every
+    vertex of the trial is kept (in preallocated NumPy buffers that double
+    when full) for replay and for drawing the full stroke.
+    """
+
+    def __init__(self, ring_size: int = DEFAULT_RING_SIZE, history: bool = False):
+        self.history = history
+        self.ring_size = max(int(ring_size), 2)
+        self.clear()
+
+    def clear(self):
+        self.count = 0  # vertices added since the last clear
+        self.segments = 0
+        self.last = None  # (x, y) of the newest vertex
+        capacity = HISTORY_CAPACITY if self.history else self.ring_size
+        self.columns = {name: np.zeros(capacity, dtype=np.float32) for name in STROKE_FIELDS}
+        self.connected = np.zeros(capacity, dtype=np.int8)
+
+    def __len__(self):
+        return min(self.count, self.ring_size) if not self.history else self.count
+
+    def _grow(self):
+        """double the history buffers; arrays handed out by tail() keep the old ones"""
+        for name in STROKE_FIELDS:
+            grown = np.zeros(2 * len(self.connected), dtype=np.float32)
+            grown[:self.count] = self.columns[name][:self.count]
+            self.columns[name] = grown
+        grown = np.zeros(2 * len(self.connected), dtype=np.int8)
+        grown[:self.count] = self.connected[:self.count]
+        self.connected = grown
+
+    def _append(self, x, y, width, pressure, connected):
+        if self.history:
+            if self.count == len(self.connected):
+                self._grow()
+            i = self.count
+        else:
+            i = self.count % self.ring_size
+        columns = self.columns
+        columns["x"][i] = x
+        columns["y"][i] = y
+        columns["width"][i] = width
+        columns["pressure"][i] = pressure
+        self.connected[i] = connected
+        self.count += 1
+        self.last = (x, y)
+
+    def add_segment(self, x0, y0, x1, y1, width: float, pressure: float):
+        """append the segment (x0, y0) -> (x1, y1); a new vertex is only stored for its start when the pen jumped"""
+        if self.last != (x0, y0):
+            self._append(x0, y0, width, pressure, 0)
+        self._append(x1, y1, width, pressure, 1)
+        self.segments += 1
+
+    def tail(self, count: int = None):
+        """
+        the newest `count` vertices (all that are stored by default), oldest first,
+        as a dict of NumPy arrays plus 'connected'. With the history on these are
+        views, which later vertices never write into
+        """
+        size = len(self)
+        count = size if count is None else min(count, size)
+        if self.history:
+            start = self.count - count
+            view = {name: self.columns[name][start:self.count] for name in STROKE_FIELDS}
+            view["connected"] = self.connected[start:self.count]
+            return view
+        # ring: indices of the newest `count` vertices, oldest first
+        idx = np.arange(self.count - count, self.count) % self.ring_size
+        view = {name: self.columns[name][idx] for name in STROKE_FIELDS}
+        view["connected"] = self.connected[idx]
+        return view
+
+    def nbytes(self) -> int:
+        """memory held by the buffers"""
+        return sum(c.nbytes for c in self.columns.values()) + self.connected.nbytes
+
+    def stats(self) -> dict:
+        return {
+            "segments": self.segments,
+            "vertices": self.count,
+            "stored_vertices": len(self),
+            "history": self.history,
+            "bytes": self.nbytes(),
+        }
@@ -0,0 +1,142 @@
+import numpy as np
+
+from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QPainter, QPen, QColor, QPixmap, QPolygonF
+
+DEFAULT_TAIL_LENGTH = 30  # segments; 0 draws the full stroke
+ALPHA_BUCKETS = 8  # distinct alpha levels of the fading tail
+WIDTH_STEP = 0.5  # pen widths are rounded to this many pixels
+FULL_STROKE_CHUNK = 64  # full stroke: segments drawn every frame before they move into the cached layer
+
+
+class TailRenderer:
+    """
+    Draws the most recent `tail_length` segments of the ink held by a
+    StrokeStore, fading from transparent (oldest) to opaque (newest) in
+    ALPHA_BUCKETS steps.
+
+    Every frame reads the tail from the store (strokes.tail()) and splits it, with
+    NumPy, into runs of connected segments sharing an alpha step and a rounded
+    width, so a paint costs one pen change per run and one drawPolyline per run
+    instead of a QPen and a drawLine per segment.
+
+    With tail_length=0 the whole stroke is drawn at full opacity; the store must
+    then keep its history. Finished chunks of FULL_STROKE_CHUNK segments are drawn
+    once into a cached layer, so a frame costs one blit plus the newest chunk
+    instead of growing with the stroke.
+    """
+
+    def __init__(self, strokes, tail_length: int = DEFAULT_TAIL_LENGTH, alpha_buckets: int = ALPHA_BUCKETS,
+                 width_step: float = WIDTH_STEP):
+        self.strokes = strokes
+        self.tail_length = max(int(tail_length), 0)
+        self.alpha_buckets = max(int(alpha_buckets), 1)
+        self.width_step = width_step
+        self.pens = {}  # (alpha, width) -> QPen, shared by all paints
+        self.clear()
+
+    def clear(self):
+        """forget the cached layer of the full stroke (the ink itself is cleared in the store)"""
+        self.layer = None
+        self.layer_vertices = 0  # store vertices already drawn into the layer
+
+    def _window(self, segments: int = None, vertices: int = None):
+        """
+        x, y, width and connected arrays of the vertices of the newest `segments` segments,
+        or of the newest `vertices` vertices; the first vertex always starts a segment
+        """
+        if segments is None:
+            view = self.strokes.tail(vertices)
+        else:
+            # every segment adds one or two vertices
+            view = self.strokes.tail(2 * segments + 1)
+        connected = view["connected"].astype(bool)
+        if segments is not None:
+            ends = np.flatnonzero(connected)
+            if len(ends) > segments:
+                start = ends[-segments] - 1
+                view = {name: column[start:] for name, column in view.items()}
+                connected = connected[start:]
+        connected = connected.copy()
+        if len(connected):
+            connected[0] = False
+        return view["x"], view["y"], view["width"], connected
+
+    def _live_window(self):
+        """full stroke: the vertices not in the cached layer yet, from the last one that is"""
+        return self._window(vertices=self.strokes.count - self.layer_vertices + (self.layer_vertices > 0))
+
+    def bounding_rect(self) -> QRectF:
+        """area that can change in the next paint: the visible tail, or the part of the full stroke not cached yet"""
+        if self.tail_length:
+            x, y, _, connected = self._window(self.tail_length)
+        else:
+            x, y, _, connected = self._live_window()
+        if not connected.any():
+            return QRectF()
+        return QRectF(QPointF(float(x.min()), float(y.min())), QPointF(float(x.max()), float(y.max())))
+
+    def _pen(self, alpha: int, width: float) -> QPen:
+        pen = self.pens.get((alpha, width))
+        if pen is None:
+            color = QColor(Qt.black)
+            color.setAlpha(alpha)
+            pen = QPen(color, width, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
+            self.pens[(alpha, width)] = pen
+        return pen
+
+    def _draw_window(self, painter, x, y, width, connected, fade: bool):
+        """draw the segments of a window, fading from its oldest to its newest segment when `fade`"""
+        count = int(connected.sum())
+        if not count:
+            return
+        width = np.round(width / self.width_step) * self.width_step
+        if fade:
+            # 1-based position of every segment (at its end vertex) -> alpha step
+            position = np.cumsum(connected)
+            bucket = np.ceil(position * self.alpha_buckets / count)
+            alpha = np.maximum((255 * bucket / self.alpha_buckets).astype(int), 1)
+        else:
+            alpha = np.full(len(x), 255)
+
+        # a run continues while the segments connect and keep their alpha and width
+        same = np.zeros(len(x), dtype=bool)
+        same[1:] = connected[:-1] & (alpha[1:] == alpha[:-1]) & (width[1:] == width[:-1])
+        same &= connected
+        ends = np.flatnonzero(connected & ~np.append(same[1:], False))  # last vertex of every run
+        starts = np.flatnonzero(connected & ~same) - 1  # first vertex of every run
+
+        points = [QPointF(px, py) for px, py in zip(x.tolist(), y.tolist())]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            painter.setPen(self._pen(int(alpha[end]), float(width[end])))
+            painter.drawPolyline(QPolygonF(points[start:end + 1]))
+
+    def _draw_full(self, painter):
+        device = painter.device()
+        dpr = device.devicePixelRatioF()
+        if self.layer is None or self.strokes.count < self.layer_vertices \
+                or self.layer.devicePixelRatioF() != dpr \
+                or (self.layer.width(), self.layer.height()) != (round(device.width() * dpr), round(device.height() * dpr)):
+            # new trial, or another device size: the layer is redrawn from the stroke history
+            self.layer = QPixmap(round(device.width() * dpr), round(device.height() * dpr))
+            self.layer.setDevicePixelRatio(dpr)
+            self.layer.fill(Qt.transparent)
+            self.layer_vertices = 0
+
+        window = self._live_window()
+        if int(window[3].sum()) >= FULL_STROKE_CHUNK:
+            layer_painter = QPainter(self.layer)
+            layer_painter.setRenderHint(QPainter.Antialiasing, True)
+            self._draw_window(layer_painter, *window, fade=False)
+            layer_painter.end()
+            self.layer_vertices = self.strokes.count
+            window = None
+        painter.drawPixmap(0, 0, self.layer)
+        if window is not None:
+            self._draw_window(painter, *window, fade=False)
+
+    def draw(self, painter):
+        if not self.tail_length:
+            self._draw_full(painter)
+            return
+        self._draw_window(painter, *self._window(self.tail_length), fade=True)
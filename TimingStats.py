@@ -0,0 +1,119 @@
+import datetime
+import time
+from array import array
+
+import numpy as np
+
+# a trial is rejected when it is slower than this on average or has a longer hole in it
+MIN_SAMPLE_RATE_HZ = 100.0
+MAX_GAP_MS = 50.0
+ISI_PERCENTILES = (1, 5, 50, 95, 99)
+
+
+def clock_anchor(clock=None) -> dict:
+    """
+    pair of wall-clock and monotonic readings, so HostTimeNs values can be
+    mapped back to wall-clock time: wall = wall_time + (ns - perf_counter_ns) / 1e9.
+    `clock` is the clock the samples are stamped with (SimClock.py), the real one by default
+    """
+    perf_ns = clock.now_ns() if clock is not None else time.perf_counter_ns()
+    wall = clock.time() if clock is not None else time.time()
+    return {
+        "wall_time": wall,
+        "wall_time_iso": datetime.datetime.fromtimestamp(wall).isoformat(),
+        "perf_counter_ns": perf_ns,
+    }
+
+
+def timing_stats(host_ns, min_rate_hz: float = MIN_SAMPLE_RATE_HZ, max_gap_ms: float = MAX_GAP_MS,
+                 stroke_starts=(), x=None, y=None) -> dict:
+    """
+    achieved sample rate, inter-sample interval percentiles and longest gap of one trial,
+    plus an accept/reject verdict against the given limits.
+
+    samples are only recorded while the pen is down, so rate and gaps are measured within
+    strokes: `stroke_starts` are the indices of the samples that start a new stroke, and the
+    time between strokes is reported as pen_up_s. with the x, y positions, a gap over which
+    the pen did not move (no events from a stationary pen) is reported as stationary_s
+    instead of counting as a gap
+    """
+    t = np.asarray(host_ns, dtype=np.int64)
+    stats = {"samples": int(len(t))}
+    reasons = []
+
+    if len(t) < 2:
+        stats.update({"strokes": int(len(t)), "duration_s": 0.0, "pen_up_s": 0.0, "stationary_s": 0.0,
+                      "rate_hz": 0.0, "isi_ms": {}, "longest_gap_ms": 0.0, "repeated_timestamps": 0})
+        reasons.append("fewer than 2 samples")
+    else:
+        isi_ms = np.diff(t) / 1e6
+        # interval i runs from sample i to i + 1; it is a pen lift when i + 1 starts a stroke
+        lift = np.zeros(len(isi_ms), dtype=bool)
+        starts = np.asarray(stroke_starts, dtype=np.int64)
+        starts = starts[(starts > 0) & (starts < len(t))]
+        lift[starts - 1] = True
+        still = np.zeros(len(isi_ms), dtype=bool)
+        if x is not None and y is not None:
+            x, y = np.asarray(x), np.asarray(y)
+            still = ~lift & (x[1:] == x[:-1]) & (y[1:] == y[:-1]) & (isi_ms > max_gap_ms)
+        counted = isi_ms[~lift & ~still]
+        duration_s = float(counted.sum()) / 1e3
+        rate = len(counted) / duration_s if duration_s > 0 else 0.0
+        stats.update({
+            "strokes": int(lift.sum()) + 1,
+            "duration_s": round(duration_s, 6),
+            "pen_up_s": round(float(isi_ms[lift].sum()) / 1e3, 6),
+            "stationary_s": round(float(isi_ms[still].sum()) / 1e3, 6),
+            "rate_hz": round(float(rate), 3),
+            "repeated_timestamps": int(np.count_nonzero(isi_ms <= 0)),
+        })
+        if len(counted):
+            percentiles = np.percentile(counted, ISI_PERCENTILES)
+            stats.update({
+                "isi_ms": {f"p{p}": round(float(v), 4) for p, v in zip(ISI_PERCENTILES, percentiles)},
+                "isi_mean_ms": round(float(counted.mean()), 4),
+                "isi_std_ms": round(float(counted.std()), 4),
+                "longest_gap_ms": round(float(counted.max()), 4),
+            })
+        else:
+            stats.update({"isi_ms": {}, "longest_gap_ms": 0.0})
+        if rate < min_rate_hz:
+            reasons.append(f"sample rate {rate:.1f} Hz < {min_rate_hz} Hz")
+        if stats["longest_gap_ms"] > max_gap_ms:
+            reasons.append(f"gap of {stats['longest_gap_ms']:.1f} ms > {max_gap_ms} ms")
+
+    stats["accepted"] = not reasons
+    stats["reject_reasons"] = reasons
+    return stats
+
+
+class TrialClock:
+    """Collects the HostTimeNs and position of every sample written in the current trial, and where strokes start."""
+
+    def __init__(self, min_rate_hz: float = MIN_SAMPLE_RATE_HZ, max_gap_ms: float = MAX_GAP_MS):
+        self.min_rate_hz = min_rate_hz
+        self.max_gap_ms = max_gap_ms
+        self.reset()
+
+    def add(self, value, x=None, y=None):
+        if value is not None and value >= 0:
+            self.host_ns.append(int(value))
+            self.x.append(float(x) if x is not None else float("nan"))
+            self.y.append(float(y) if y is not None else float("nan"))
+
+    def start_stroke(self):
+        """the next sample is the first one after the pen touched down"""
+        self.stroke_starts.append(len(self.host_ns))
+
+    def reset(self):
+        self.host_ns = array('q')
+        self.x = array('d')
+        self.y = array('d')
+        self.stroke_starts = array('q')
+
+    def stats(self) -> dict:
+        if not len(self.host_ns):
+            return timing_stats([], self.min_rate_hz, self.max_gap_ms)
+        return timing_stats(np.frombuffer(self.host_ns, dtype=np.int64), self.min_rate_hz, self.max_gap_ms,
+                            np.frombuffer(self.stroke_starts, dtype=np.int64) if len(self.stroke_starts) else (),
+                            np.frombuffer(self.x, dtype=np.float64), np.frombuffer(self.y, dtype=np.float64))
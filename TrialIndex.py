@@ -0,0 +1,166 @@
+"""
+Sidecar index of a session file, so one trial can be read without parsing the ones
+before it. <session file>.index holds one JSON line per trial section:
+    {"trial_num", "trial_info", "offset", "length", "samples", "shape", "speed", "hide_template"}
+offset/length are the bytes of the section in the session file (the json file, or
+the journal when recording with output_format=journal). DataHandler appends a line
+whenever it closes a section. Binary sessions need no sidecar: their header.json
+already lists the trials.
+
+Files without an index (older runs, JSON rebuilt from a journal) are indexed in one
+pass the first time they are read, without converting any samples.
+
+Usage:
+    python TrialIndex.py list results/<run>_shape_tracking.json
+    python TrialIndex.py show results/<run>_shape_tracking.json 57
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from SessionReader import iter_sections, parse_trial_info, read_section_at, session_format
+
+INDEX_SUFFIX = ".index"
+
+
+def index_path_for(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+def index_entry(trial_num, info, offset: int, length: int, samples: int) -> dict:
+    trial = parse_trial_info(info)
+    shape, speed, hide_template = trial if trial else (None, None, None)
+    return {"trial_num": int(trial_num), "trial_info": info, "offset": offset, "length": length,
+            "samples": samples, "shape": shape, "speed": speed, "hide_template": hide_template}
+
+
+class TrialIndexWriter:
+    """Writer side of the sidecar, used by DataHandler on its writer thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stream = open(path, 'w', encoding='utf-8')
+
+    def add(self, trial_num, info, offset: int, length: int, samples: int):
+        self.stream.write(json.dumps(index_entry(trial_num, info, offset, length, samples)) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+def build_index(path: str) -> list:
+    """index entries of a session from one pass over it (samples are counted, not converted)"""
+    entries = []
+    for section in iter_sections(path, load_samples=False):
+        # offset/length are None for a JSON file not in the line layout; it has to be read whole
+        entry = index_entry(section["trial_num"], section["trial_info"], section.get("offset"),
+                            section.get("length"), section["samples"])
+        if "file" in section:
+            entry["file"] = section["file"]
+        entries.append(entry)
+    return entries
+
+
+def write_index(path: str, entries: list):
+    tmp_path = index_path_for(path) + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    os.replace(tmp_path, index_path_for(path))
+
+
+def read_index(path: str, rebuild: bool = False) -> list:
+    """
+    index entries of a session, from its sidecar when there is a usable one;
+    otherwise the session is indexed now and the sidecar written for next time
+    """
+    if session_format(path) == "binary":
+        return build_index(path)  # header.json only, no trial file is opened
+
+    index_path = index_path_for(path)
+    if not rebuild and os.path.exists(index_path):
+        entries = []
+        with open(index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # torn last line
+                entries.append(json.loads(line))
+        if not entries or entries[-1]["offset"] is None \
+                or entries[-1]["offset"] + entries[-1]["length"] <= os.path.getsize(path):
+            return entries
+
+    entries = build_index(path)
+    try:
+        write_index(path, entries)
+    except OSError as e:
+        print(f"Could not write the trial index of {path}: {e}")
+    return entries
+
+
+def list_trials(path: str) -> list:
+    """trial_num, trial_info, samples, shape, speed and hide_template of every trial, without reading samples"""
+    return [{k: v for k, v in entry.items() if k not in ("offset", "length", "file")} for entry in read_index(path)]
+
+
+def read_trial(path: str, trial_num: int, mmap: bool = False) -> dict:
+    """
+    one section of a session (like SessionReader.iter_sections yields it), read by
+    seeking to it through the index. mmap=True maps a binary trial instead of loading it
+    """
+    if session_format(path) == "binary":
+        section = next((s for s in iter_sections(path, load_samples=False) if s["trial_num"] == int(trial_num)), None)
+        if section is None:
+            raise KeyError(f"{path} has no trial {trial_num}")
+        section["samples"] = np.load(os.path.join(path, section["file"]), mmap_mode='r' if mmap else None)
+        return section
+
+    for rebuild in (False, True):
+        entry = next((e for e in read_index(path, rebuild) if e["trial_num"] == int(trial_num)), None)
+        if entry is None:
+            raise KeyError(f"{path} has no trial {trial_num}")
+        if entry["offset"] is None:
+            return next(s for s in iter_sections(path) if s["trial_num"] == entry["trial_num"])
+        try:
+            section = read_section_at(path, entry["offset"])
+        except ValueError:
+            section = None
+        if section is not None and section["trial_num"] == entry["trial_num"]:
+            return section
+        # the file changed since it was indexed (e.g. rebuilt from its journal)
+    raise ValueError(f"{path}: trial {trial_num} is not where its index says")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or read the trials of a session through its index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="list the trials without reading their samples")
+    list_parser.add_argument("session")
+    list_parser.add_argument("--rebuild", action="store_true", help="index the session again")
+    show_parser = sub.add_parser("show", help="print one trial's samples")
+    show_parser.add_argument("session")
+    show_parser.add_argument("trial_num", type=int)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        entries = read_index(args.session, rebuild=args.rebuild)
+        print(f"{'trial':>5} {'samples':>8} {'shape':>18} {'speed':>7} {'hidden':>6} {'offset':>10} {'bytes':>9}")
+        for e in entries:
+            # offset/length are None for binary sessions and JSON files not in the line layout
+            values = [e.get(name) for name in ("shape", "speed", "hide_template", "offset", "length")]
+            shape, speed, hidden, offset, length = ("-" if v is None else str(v) for v in values)
+            print(f"{e['trial_num']:>5} {e['samples'] or 0:>8} {shape:>18} {speed:>7} {hidden:>6} "
+                  f"{offset:>10} {length:>9}")
+    else:
+        section = read_trial(args.session, args.trial_num)
+        samples = section["samples"]
+        print(f"trial {section['trial_num']}: {section['trial_info']!r}, {len(samples)} samples")
+        print("\t".join(samples.dtype.names))
+        for row in samples.tolist():
+            print("\t".join(str(v) for v in row))
+
+
+if __name__ == "__main__":
+    main()
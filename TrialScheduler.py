@@ -0,0 +1,177 @@
+"""
+Trial order of a session, generated once up front from a seed.
+
+Modes:
+    random  - all (shape, speed, hide_template) trials shuffled
+    blocked - one block per speed, blocks and trials within them shuffled
+    latin   - one block per speed, block order taken from a balanced Latin square
+              row, trials within blocks shuffled. each block is split into a shown
+              and a hidden template half; which comes first alternates once per full
+              square. row and template order come from participant_index
+              (0, 1, 2, ... per participant), so consecutive participants are
+              counterbalanced
+In every mode the same shape is never shown twice in a row when that can be avoided.
+The seed and the resulting order are stored in the session metadata, so
+TrialScheduler.from_metadata() regenerates the run exactly.
+"""
+import glob
+import os
+import random
+
+SCHEDULE_MODES = ("random", "blocked", "latin")
+SPEED_INDEX = 1  # position of the speed in a (shape, speed, hide_template) trial
+SHAPE_INDEX = 0
+HIDE_INDEX = 2
+
+
+def balanced_latin_square(n: int):
+    """
+    Williams design: every level appears once per row and column and (for even n)
+    precedes every other level equally often
+    """
+    first, low, high = [], 0, n - 1
+    for i in range(n):
+        if i % 2 == 0:
+            first.append(low)
+            low += 1
+        else:
+            first.append(high)
+            high -= 1
+    rows = [[(first[j] + i) % n for j in range(n)] for i in range(n)]
+    if n % 2:
+        rows += [list(reversed(row)) for row in rows]
+    return rows
+
+
+def _spread(order, previous=None, key=SHAPE_INDEX):
+    """
+    reorder in place so no two neighbours share `key`, by swapping each clash with
+    the next later trial that fits, or, once only clashing trials are left, moving
+    it back into an earlier gap between two trials it fits. every clash scans the
+    block, so the worst case is quadratic in the block length (a block is a few
+    dozen trials). returns the remaining clashes
+    """
+    clashes = 0
+    for i in range(len(order)):
+        before = order[i - 1][key] if i else previous
+        if before is None or order[i][key] != before:
+            continue
+        for j in range(i + 1, len(order)):
+            if order[j][key] != before:
+                order[i], order[j] = order[j], order[i]
+                break
+        else:
+            for gap in range(i):
+                left = order[gap - 1][key] if gap else previous
+                if left != before and order[gap][key] != before:
+                    order.insert(gap, order.pop(i))
+                    break
+            else:
+                clashes += 1
+    return clashes
+
+
+def count_sessions(folder: str) -> int:
+    """
+    sessions recorded in `folder` so far, the default participant_index of the next one
+    (JSON files, journals whose JSON was never built, and binary session directories)
+    """
+    names = {os.path.splitext(path)[0] for pattern in ("*_shape_tracking.json", "*_shape_tracking.journal",
+                                                        "*_shape_tracking")
+             for path in glob.glob(os.path.join(folder, pattern))}
+    return len(names)
+
+
+class TrialScheduler:
+    """Precomputed, reproducible trial order."""
+
+    def __init__(self, trials, mode: str = "random", seed: int = None, participant: str = "",
+                 no_repeat_shape: bool = True, participant_index: int = 0, template_blocks: bool = True):
+        if mode not in SCHEDULE_MODES:
+            raise ValueError(f"unknown schedule mode {mode!r}, expected one of {SCHEDULE_MODES}")
+        self.mode = mode
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+        self.participant = participant
+        self.participant_index = int(participant_index or 0)
+        self.no_repeat_shape = no_repeat_shape
+        self.template_blocks = template_blocks  # latin: split speed blocks by hide_template
+        self.latin_row = None
+        self.hidden_first = None
+        self.clashes = 0
+        self.trials = self.__generate([tuple(t) for t in trials])
+        self.position = 0
+
+    @classmethod
+    def from_metadata(cls, metadata: dict, trials=None):
+        """rebuild the scheduler of a recorded session from its 'schedule' metadata"""
+        schedule = metadata["schedule"]
+        trials = trials if trials is not None else schedule["trials"]
+        # sessions recorded before participant_index picked the row stored only the row
+        return cls(trials, schedule["mode"], schedule["seed"], schedule.get("participant", ""),
+                   schedule.get("no_repeat_shape", True),
+                   schedule.get("participant_index", schedule.get("latin_row")),
+                   schedule.get("template_blocks", False))
+
+    def __generate(self, trials):
+        rng = random.Random(self.seed)
+        trials = sorted(trials)  # the seed alone decides the order, not the settings' order
+
+        if self.mode == "random":
+            rng.shuffle(trials)
+            if self.no_repeat_shape:
+                self.clashes = _spread(trials)
+            return trials
+
+        speeds = sorted({t[SPEED_INDEX] for t in trials})
+        templates = [None]
+        if self.mode == "latin":
+            square = balanced_latin_square(len(speeds))
+            self.latin_row = self.participant_index % len(square)
+            speeds = [speeds[i] for i in square[self.latin_row]]
+            hides = sorted({bool(t[HIDE_INDEX]) for t in trials})
+            if self.template_blocks and len(hides) > 1:
+                # shown first for the first full square of participants, hidden first for the next
+                self.hidden_first = (self.participant_index // len(square)) % 2 == 1
+                templates = [True, False] if self.hidden_first else [False, True]
+        else:
+            rng.shuffle(speeds)
+
+        order = []
+        for speed in speeds:
+            for hide in templates:
+                block = [t for t in trials if t[SPEED_INDEX] == speed and (hide is None or bool(t[HIDE_INDEX]) == hide)]
+                rng.shuffle(block)
+                if self.no_repeat_shape:
+                    self.clashes += _spread(block, order[-1][SHAPE_INDEX] if order else None)
+                order.extend(block)
+        return order
+
+    def __len__(self):
+        return len(self.trials)
+
+    def __iter__(self):
+        return iter(self.trials)
+
+    def remaining(self) -> int:
+        return len(self.trials) - self.position
+
+    def next_trial(self):
+        """the next (shape, speed, hide_template), or (False, False, False) when the schedule is done"""
+        if self.position >= len(self.trials):
+            return False, False, False
+        trial = self.trials[self.position]
+        self.position += 1
+        return trial
+
+    def metadata(self) -> dict:
+        return {"schedule": {
+            "mode": self.mode,
+            "seed": self.seed,
+            "participant": self.participant,
+            "participant_index": self.participant_index,
+            "latin_row": self.latin_row,
+            "template_blocks": self.template_blocks,
+            "hidden_first": self.hidden_first,
+            "no_repeat_shape": self.no_repeat_shape,
+            "trials": [list(t) for t in self.trials],
+        }}
@@ -0,0 +1,291 @@
+import codecs
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+UPLOAD_URL = 'https://hss74dd1ed.execute-api.us-east-1.amazonaws.com/dev/'
+BUCKET_NAME = 'shape-dependent-tracking-2025'
+CHUNK_SIZE = 64 * 1024
+
+
+def _escape(text: str) -> str:
+    """JSON string escaping without the surrounding quotes (character-wise, so chunks can be escaped one by one)."""
+    return json.dumps(text)[1:-1]
+
+
+def iter_upload_body(path: str, pid: str, bucket: str = BUCKET_NAME, compress: bool = False,
+                     chunk_size: int = CHUNK_SIZE, progress=None):
+    """
+    yield the upload request body chunk by chunk without loading the file.
+
+    The body is the same document the endpoint always received,
+        {"subject_id": ..., "bucket": ..., "exp_data": json.dumps(<file content>)}
+    i.e. exp_data holds the file content as a JSON-encoded string, escaped
+    incrementally here. progress(bytes_read, total_bytes) is called per chunk.
+    """
+    total = os.path.getsize(path)
+    encoder = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    def emit(text):
+        data = text.encode('utf-8')
+        return encoder.compress(data) if encoder else data
+
+    head = '{"subject_id": ' + json.dumps(str(pid)) + ', "bucket": ' + json.dumps(bucket) + ', "exp_data": "'
+    # exp_data is itself json.dumps(file content): open quote, escaped twice, close quote
+    yield emit(head + _escape('"'))
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    sent = 0
+    with open(path, 'rb') as f:
+        while True:
+            raw = f.read(chunk_size)
+            final = not raw
+            text = decoder.decode(raw, final=final)
+            if text:
+                out = emit(_escape(_escape(text)))
+                if out:
+                    yield out
+            sent += len(raw)
+            if progress is not None:
+                progress(sent, total)
+            if final:
+                break
+
+    tail = emit(_escape('"') + '"}')
+    if encoder:
+        tail += encoder.flush()
+    yield tail
+
+
+def upload_body_length(path: str, pid: str, bucket: str = BUCKET_NAME) -> int:
+    """exact size of the uncompressed body iter_upload_body() yields, from one pass over the file"""
+    return sum(len(chunk) for chunk in iter_upload_body(path, pid, bucket))
+
+
+class _SizedBody:
+    """A body generator with its length, so requests sends a Content-Length instead of chunks."""
+
+    def __init__(self, chunks, length: int):
+        self.chunks = chunks
+        self.length = length
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __len__(self):
+        return self.length
+
+
+def upload_file(path: str, pid: str, url: str = UPLOAD_URL, session=None, compress: bool = False,
+                progress=None, extra_headers=None, timeout: float = 60.0):
+    """
+    stream one session file to the upload endpoint, raises requests.exceptions.RequestException on failure.
+    the uncompressed body is measured first and sent with a Content-Length. compress=True sends it
+    gzip-encoded and chunked (its size is only known once compressed); an endpoint that rejects that
+    with a 4xx, e.g. 411 Length Required, gets it again uncompressed
+    """
+    import requests
+
+    headers = {
+        'Content-Type': 'application/json',
+        'User-Agent': 'Mozilla/5.0',
+        'Accept': 'application/json',
+    }
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    if extra_headers:
+        headers.update(extra_headers)
+
+    if compress:
+        body = iter_upload_body(path, pid, compress=True, progress=progress)
+    else:
+        body = _SizedBody(iter_upload_body(path, pid, progress=progress), upload_body_length(path, pid))
+    post = session.post if session is not None else requests.post
+    response = post(url, headers=headers, data=body, timeout=timeout)
+
+    if compress and 400 <= response.status_code < 500:
+        print(f"Compressed upload rejected (HTTP {response.status_code}), sending it uncompressed.")
+        return upload_file(path, pid, url=url, session=session, compress=False, progress=progress,
+                           extra_headers=extra_headers, timeout=timeout)
+    if response.status_code != 200:
+        print("Failed to upload data.")
+        print(f"Status Code: {response.status_code}")
+        print(f"Response Text: {response.text}")
+        raise requests.exceptions.RequestException(f"HTTP {response.status_code}")
+    return response
+
+
+def upload_with_retries(path: str, pid: str, url: str = UPLOAD_URL, max_retries: int = 5,
+                        backoff_factor: float = 2, stop_event: threading.Event = None, **kwargs) -> bool:
+    """
+    upload with exponential backoff, returns True on success.
+    stop_event interrupts the waiting between attempts
+    """
+    import requests
+
+    retries = 0
+    while retries < max_retries:
+        try:
+            upload_file(path, pid, url=url, **kwargs)
+            print("Data uploaded successfully!")
+            return True
+        except (requests.exceptions.RequestException, OSError) as e:
+            retries += 1
+            if retries >= max_retries:
+                break
+            wait_time = backoff_factor ** retries
+            print(f"Upload failed ({e}). Attempt {retries}/{max_retries}. Retrying in {wait_time} seconds...")
+            if stop_event is not None:
+                if stop_event.wait(wait_time):
+                    return False
+            else:
+                time.sleep(wait_time)
+
+    print("Max retries reached. Upload failed.")
+    return False
+
+
+class UploadThread(QThread):
+    """Runs upload_with_retries off the GUI thread."""
+    progress = pyqtSignal(int, int)  # bytes read, total bytes
+    uploaded = pyqtSignal(bool)
+
+    def __init__(self, path: str, pid: str, url: str = UPLOAD_URL, parent=None, **kwargs):
+        super().__init__(parent)
+        self.path = path
+        self.pid = pid
+        self.url = url
+        self.kwargs = kwargs
+        self.stop_event = threading.Event()
+
+    def run(self):
+        ok = upload_with_retries(self.path, self.pid, url=self.url, stop_event=self.stop_event,
+                                 progress=self.progress.emit, **self.kwargs)
+        self.uploaded.emit(ok)
+
+    def cancel(self):
+        self.stop_event.set()
+
+
+# --- Local stand-in for the API Gateway endpoint (development / testing) ---
+
+class _StandInHandler(BaseHTTPRequestHandler):
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b''.join(parts)
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+        return body
+
+    def do_POST(self):
+        server = self.server
+        if not server.accept_gzip and self.headers.get('Content-Encoding', '').lower() == 'gzip':
+            self._read_body()  # the request is read before answering
+            self.send_error(415, "Content-Encoding not supported")
+            return
+        if server.require_length and 'Content-Length' not in self.headers:
+            self._read_body()
+            self.send_error(411, "Length Required")
+            return
+        try:
+            payload = json.loads(self._read_body())
+            exp_data = json.loads(payload["exp_data"])
+        except (ValueError, KeyError) as e:
+            self.send_error(400, f"Bad payload: {e}")
+            return
+
+        with server.lock:
+            server.attempts += 1
+            if server.attempts <= server.fail_first:
+                self.send_error(503, "Simulated failure")
+                return
+            key = self.headers.get('Idempotency-Key')
+            if key is None or key not in server.keys:
+                server.received.append({"subject_id": payload["subject_id"],
+                                        "bucket": payload["bucket"],
+                                        "exp_data": exp_data,
+                                        "idempotency_key": key,
+                                        "content_length": self.headers.get('Content-Length')})
+                if key is not None:
+                    server.keys.add(key)
+
+        body = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Minimal HTTP server playing the role of the upload endpoint.
+    Accepts chunked and gzip-encoded bodies, keeps every decoded upload in
+    `received` and can fail the first `fail_first` requests to exercise retries.
+    accept_gzip=False answers gzip-encoded bodies with 415, like an endpoint without decompression,
+    require_length=True chunked bodies with 411, like an endpoint that needs a Content-Length.
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, fail_first: int = 0, verbose: bool = False, accept_gzip: bool = True,
+                 require_length: bool = False):
+        super().__init__(('127.0.0.1', port), _StandInHandler)
+        self.fail_first = fail_first
+        self.accept_gzip = accept_gzip
+        self.require_length = require_length
+        self.verbose = verbose
+        self.attempts = 0
+        self.received = []
+        self.keys = set()
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local stand-in upload endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-first", type=int, default=0)
+    parser.add_argument("--no-gzip", action="store_true", help="reject gzip-encoded bodies with 415")
+    parser.add_argument("--require-length", action="store_true", help="reject chunked bodies with 411")
+    args = parser.parse_args()
+
+    server = StandInServer(args.port, fail_first=args.fail_first, verbose=True, accept_gzip=not args.no_gzip,
+                           require_length=args.require_length)
+    print(f"Stand-in upload endpoint listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,242 @@
+"""
+Headless end-to-end session benchmark: runs the real DrawingWidget session
+(ready prompt, example animation, drawing phase) under the offscreen Qt
+platform and feeds it synthetic QTabletEvent streams along a known trajectory,
+then reads the session back from disk.
+
+Per trial it reports the achieved sample rate, dropped and duplicated samples,
+event-to-record latency, paints and paint time during the trial, and the bytes
+the trial takes in the output. Every injected event carries its sequence number
+as the event timestamp, so each recorded sample is matched to its injection.
+Events still queued when the drawing time runs out are counted as dropped.
+
+Usage:
+    python benchmarks/bench_session.py [--rates 100 500 1000] [--trials 2] [--trial-seconds 5]
+                                       [--format journal|binary] [--trajectory shape|circle]
+                                       [--skip-examples] [--json results.json]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.chdir(ROOT)  # stimuli are loaded from assets/
+
+import numpy as np
+from PyQt5.QtCore import Qt, QEvent, QPointF, QTimer
+from PyQt5.QtGui import QTabletEvent
+from PyQt5.QtWidgets import QApplication
+
+from settings_singleton import Settings
+
+LOOP_SECONDS = 2.0  # one pass over the trajectory
+
+
+class Injector:
+    """Drives one session: clicks through the prompts and posts tablet events while drawing is on."""
+
+    def __init__(self, app, widget, rate_hz, trials, trajectory, skip_examples):
+        self.app = app
+        self.widget = widget
+        self.rate_hz = rate_hz
+        self.trials = trials
+        self.trajectory = trajectory
+        self.skip_examples = skip_examples
+
+        self.seq = 0
+        self.inject_ns = {}  # seq -> perf_counter_ns when posted
+        self.trial = None  # dict of the trial being drawn
+        self.done_trials = []
+        self.finished = False
+        self.fit = None  # (geometry, bounding box) the trajectory is scaled from
+
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(1)
+
+    def position(self, t):
+        """point of the trajectory at time t, fitted into the drawing rectangle"""
+        phase = (t / LOOP_SECONDS) % 1.0
+        rect = self.widget._drawing_rect()
+        cx, cy = rect.center().x(), rect.center().y()
+        size = min(rect.width(), rect.height()) * 0.4
+
+        geometry = self.widget.example_widget.shape_geometry
+        if self.trajectory == "shape" and geometry is not None and geometry.length > 0:
+            if self.fit is None or self.fit[0] is not geometry:
+                self.fit = (geometry, geometry.arc_xy.min(axis=0).tolist() + geometry.arc_xy.max(axis=0).tolist())
+            left, top, right, bottom = self.fit[1]
+            x, y = geometry.position_at(phase).tolist()
+            scale = 2 * size / max(right - left, bottom - top, 1e-9)
+            return cx + (x - (left + right) / 2) * scale, cy + (y - (top + bottom) / 2) * scale
+        angle = 2 * math.pi * phase
+        return cx + size * math.cos(angle), cy + size * math.sin(angle)
+
+    def post(self, kind, t):
+        x, y = self.position(t)
+        pressure = 0.5 + 0.3 * math.sin(2 * math.pi * t)
+        event = QTabletEvent(kind, QPointF(x, y), QPointF(x, y), QTabletEvent.Stylus, QTabletEvent.Pen,
+                             pressure, int(20 * math.sin(t)), int(20 * math.cos(t)), 0.0, 0.0, 0,
+                             Qt.NoModifier, 1, Qt.LeftButton, Qt.LeftButton)
+        self.seq += 1
+        event.setTimestamp(self.seq)
+        self.inject_ns[self.seq] = time.perf_counter_ns()
+        self.trial["seqs"].append(self.seq)
+        QApplication.postEvent(self.widget, event)
+
+    def tick(self):
+        w = self.widget
+        if self.finished:
+            return
+
+        if self.trial is None:
+            if w.ok_button.isVisible():
+                if len(self.done_trials) >= self.trials:
+                    self.finished = True
+                    self.timer.stop()
+                    w.close_file()  # quits the app once the session is written
+                    return
+                w.ok_button.click()
+            elif self.skip_examples and w.example_widget.hold_timer.isActive():
+                w.example_widget.hold_timer.start(0)
+            elif w.play:
+                self.start_trial()
+            return
+
+        if not w.play:
+            self.end_trial()
+            return
+
+        elapsed = time.perf_counter() - self.trial["start"]
+        due = int(elapsed * self.rate_hz) + 1
+        while self.trial["sent"] < due:
+            self.post(QEvent.TabletMove, self.trial["sent"] / self.rate_hz)
+            self.trial["sent"] += 1
+
+    def start_trial(self):
+        w = self.widget
+        self.trial = {
+            "trial_num": w.data_handler.section_num - 1,
+            "shape": w.shape_tuple,
+            "start": time.perf_counter(),
+            "sent": 1,
+            "seqs": [],
+            "paints_before": (w.paint_count, w.paint_time_ns),
+        }
+        self.post(QEvent.TabletPress, 0.0)
+
+    def end_trial(self):
+        w = self.widget
+        paints, paint_ns = w.paint_count, w.paint_time_ns
+        self.trial["paints"] = paints - self.trial["paints_before"][0]
+        self.trial["paint_ms"] = (paint_ns - self.trial["paints_before"][1]) / 1e6
+        self.trial["seconds"] = time.perf_counter() - self.trial["start"]
+        self.done_trials.append(self.trial)
+        self.trial = None
+
+
+def read_session(path):
+    """trial_num -> (rows as an (n, 2) array of EventTimestamp/HostTimeNs, bytes on disk)"""
+    from SessionReader import iter_sections
+    result = {}
+    for section in iter_sections(path):
+        s = section["samples"]
+        rows = np.column_stack((s["EventTimestamp"], s["HostTimeNs"])).astype(np.int64).reshape(-1, 2)
+        result[section["trial_num"]] = (rows, section["length"])
+    return result
+
+
+def trial_report(trial, recorded, inject_ns):
+    rows, size = recorded.get(trial["trial_num"], (np.empty((0, 2), dtype=np.int64), 0))
+    seqs = rows[:, 0]
+    host_ns = rows[:, 1]
+    injected = set(trial["seqs"])
+    unique = set(seqs.tolist())
+
+    latency_ms = np.array([(ns - inject_ns[s]) / 1e6 for s, ns in zip(seqs.tolist(), host_ns.tolist())
+                           if s in inject_ns])
+    duration = (host_ns[-1] - host_ns[0]) / 1e9 if len(host_ns) > 1 else 0.0
+    return {
+        "trial_num": trial["trial_num"],
+        "shape": os.path.basename(str(trial["shape"][0])),
+        "speed": trial["shape"][1],
+        "injected": len(injected),
+        "recorded": int(len(rows)),
+        "rate_hz": (len(host_ns) - 1) / duration if duration > 0 else 0.0,
+        "dropped": len(injected - unique),
+        "duplicated": int(len(seqs) - len(unique)),
+        "latency_p50_ms": float(np.percentile(latency_ms, 50)) if len(latency_ms) else None,
+        "latency_p95_ms": float(np.percentile(latency_ms, 95)) if len(latency_ms) else None,
+        "latency_max_ms": float(latency_ms.max()) if len(latency_ms) else None,
+        "paints": trial["paints"],
+        "mean_paint_ms": trial["paint_ms"] / trial["paints"] if trial["paints"] else 0.0,
+        "bytes": size,
+    }
+
+
+def run_session(app, rate_hz, args, workdir):
+    from DataHandler import DataHandler
+    from DrawingWidget import DrawingWidget
+
+    output = os.path.join(workdir, f"bench_{rate_hz}hz_shape_tracking.json")
+    data_handler = DataHandler("bench", output, output_format=args.format)
+    widget = DrawingWidget(data_handler)
+    injector = Injector(app, widget, rate_hz, args.trials, args.trajectory, args.skip_examples)
+    app.exec_()
+
+    recorded = read_session(data_handler.output_file if data_handler.journal is None else data_handler.journal.path)
+    widget.deleteLater()
+    return [trial_report(t, recorded, injector.inject_ns) for t in injector.done_trials]
+
+
+def fmt(value, spec):
+    return format(value, spec) if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", type=int, nargs="+", default=[100, 500, 1000], help="tablet report rates (Hz)")
+    parser.add_argument("--trials", type=int, default=2, help="trials per session")
+    parser.add_argument("--trial-seconds", type=float, default=5.0, help="drawing duration of a trial")
+    parser.add_argument("--format", choices=("journal", "binary"), default="journal")
+    parser.add_argument("--trajectory", choices=("shape", "circle"), default="shape",
+                        help="trace the trial's stimulus, or a circle")
+    parser.add_argument("--skip-examples", action="store_true", help="cut the example animation short")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    # in-memory only, the settings file is left alone
+    Settings().update({"drawing_duration": args.trial_seconds, "stimuli_duration": 0.1,
+                       "capture_mode": "event", "upload": False}, save=False)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for rate in args.rates:
+            results[rate] = run_session(app, rate, args, workdir)
+
+    print(f"\n{'rate':>5} {'trial':>5} {'shape':>11} {'inj':>6} {'rec':>6} {'Hz':>7} {'drop':>5} {'dup':>4} "
+          f"{'lat50':>6} {'lat95':>6} {'latmax':>7} {'paints':>6} {'paint':>6} {'KiB':>7}")
+    for rate, trials in results.items():
+        for t in trials:
+            print(f"{rate:>5} {t['trial_num']:>5} {t['shape']:>11} {t['injected']:>6} {t['recorded']:>6} "
+                  f"{t['rate_hz']:>7.1f} {t['dropped']:>5} {t['duplicated']:>4} "
+                  f"{fmt(t['latency_p50_ms'], '6.2f')} {fmt(t['latency_p95_ms'], '6.2f')} "
+                  f"{fmt(t['latency_max_ms'], '7.2f')} {t['paints']:>6} {t['mean_paint_ms']:>6.2f} "
+                  f"{t['bytes'] / 1024:>7.1f}")
+    print("latencies and paint times in ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({str(rate): trials for rate, trials in results.items()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
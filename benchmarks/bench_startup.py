@@ -0,0 +1,114 @@
+"""
+Startup cost of the app: time to import main.py, time until the menu is first
+painted, and peak RSS, measured in fresh interpreters under the offscreen Qt
+platform. With budgets given, exits non-zero when a median exceeds one.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--max-import-ms 300] [--max-paint-ms 600] [--max-rss-mb 150]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in the child interpreter: start the main window and stop at its first paint
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, ".")
+import main
+imported = time.perf_counter()
+
+from PyQt5.QtCore import QObject, QEvent, QTimer
+from PyQt5.QtWidgets import QApplication
+
+app = QApplication(sys.argv)
+result = {"import_ms": (imported - start) * 1000}
+
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and "paint_ms" not in result:
+            result["paint_ms"] = (time.perf_counter() - start) * 1000
+            QTimer.singleShot(0, app.quit)
+        return False
+
+
+watcher = FirstPaint()
+app.installEventFilter(watcher)
+window = main.MainWindow()
+window.show()
+QTimer.singleShot(10000, app.quit)  # never hang a benchmark run
+app.exec_()
+
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_rss_mb"] = rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+except ImportError:  # Windows
+    result["peak_rss_mb"] = None
+result["modules"] = len(sys.modules)
+print("RESULT " + json.dumps(result))
+"""
+
+
+def run_once():
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    spawned = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env,
+                         capture_output=True, text=True, timeout=60)
+    wall_ms = (time.perf_counter() - spawned) * 1000
+    line = next((l for l in out.stdout.splitlines() if l.startswith("RESULT ")), None)
+    if line is None:
+        raise RuntimeError(f"startup run failed:\n{out.stdout}\n{out.stderr}")
+    result = json.loads(line[len("RESULT "):])
+    result["process_ms"] = wall_ms
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, help="budget for importing main.py")
+    parser.add_argument("--max-paint-ms", type=float, help="budget for the first paint (from interpreter start)")
+    parser.add_argument("--max-rss-mb", type=float, help="budget for the peak resident set size")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+
+    def median(key):
+        values = [r[key] for r in runs if r.get(key) is not None]
+        return statistics.median(values) if values else None
+
+    summary = {
+        "import_ms": median("import_ms"),
+        "paint_ms": median("paint_ms"),
+        "process_ms": median("process_ms"),
+        "peak_rss_mb": median("peak_rss_mb"),
+        "modules": median("modules"),
+    }
+    print(f"{args.runs} runs, medians:")
+    print(f"  import main.py      {summary['import_ms']:8.1f} ms")
+    print(f"  first paint         {summary['paint_ms']:8.1f} ms")
+    print(f"  whole process       {summary['process_ms']:8.1f} ms")
+    if summary["peak_rss_mb"] is not None:
+        print(f"  peak RSS            {summary['peak_rss_mb']:8.1f} MB")
+    print(f"  modules loaded      {summary['modules']:8.0f}")
+
+    failed = []
+    for key, budget in (("import_ms", args.max_import_ms), ("paint_ms", args.max_paint_ms),
+                        ("peak_rss_mb", args.max_rss_mb)):
+        if budget is not None and summary[key] is not None and summary[key] > budget:
+            failed.append(f"{key} {summary[key]:.1f} > {budget}")
+    if failed:
+        print("Over budget: " + ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Paint time per frame of the fading ink tail: the old one-QPen-per-segment loop
+against TailRenderer, for tails of 30 and 300 segments and the full stroke.
+TailRenderer gets one new segment per frame, as while drawing, so the full
+stroke also pays for moving finished chunks into its cached layer.
+
+Usage:
+    python benchmarks/bench_tail.py [--segments 5000] [--frames 200]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import Qt, QPointF
+from PyQt5.QtGui import QImage, QPainter, QPen, QColor
+from PyQt5.QtWidgets import QApplication
+
+from StrokeStore import StrokeStore
+from TailRenderer import TailRenderer
+
+
+def synthetic_stroke(count: int):
+    """a wobbly spiral with slowly varying pressure, like a participant tracing a shape"""
+    segments = []
+    last = QPointF(960, 540)
+    for i in range(1, count + 1):
+        angle = i * 0.02
+        radius = 150 + 100 * math.sin(i * 0.003) + 3 * math.sin(i * 0.7)
+        point = QPointF(960 + radius * math.cos(angle), 540 + radius * math.sin(angle))
+        pressure = 0.5 + 0.4 * math.sin(i * 0.01)
+        segments.append({'width': 4 * pressure, 'points': [last, point]})
+        last = point
+    return segments
+
+
+def paint_legacy(painter, lines, tail_len):
+    """the per-segment loop DrawingWidget used before TailRenderer"""
+    lines_to_draw = lines[-tail_len:]
+    n = len(lines_to_draw)
+    for i, line in enumerate(lines_to_draw):
+        alpha = int(255 * (i + 1) / n) if n > 0 else 255
+        base_color = QColor(Qt.black)
+        base_color.setAlpha(alpha)
+        pen = QPen(base_color, line['width'], Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
+        painter.setPen(pen)
+        pts = line['points']
+        painter.drawLine(pts[0], pts[1])
+
+
+def time_frames(image, frames, paint, before_frame=None):
+    start = time.perf_counter()
+    for i in range(frames):
+        if before_frame is not None:
+            before_frame(i)
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        paint(painter)
+        painter.end()
+    return (time.perf_counter() - start) / frames * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=5000, help="length of the synthetic stroke")
+    parser.add_argument("--frames", type=int, default=200, help="frames painted per measurement")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    image = QImage(1920, 1080, QImage.Format_ARGB32_Premultiplied)
+    lines = synthetic_stroke(args.segments)
+
+    print(f"{args.segments} segments, {args.frames} frames, ms per frame")
+    print(f"{'tail':>8} {'legacy':>10} {'buckets':>10} {'speedup':>8}")
+    for tail in (30, 300, 0):
+        strokes = StrokeStore(ring_size=max(256, 2 * tail + 2), history=tail == 0)
+        renderer = TailRenderer(strokes, tail)
+        frames = args.frames if tail else max(args.frames // 20, 3)
+
+        def add(line):
+            p0, p1 = line['points']
+            strokes.add_segment(p0.x(), p0.y(), p1.x(), p1.y(), line['width'], line['width'] / 4)
+
+        # the stroke reaches its full length with the last frame
+        for line in lines[:len(lines) - args.frames]:
+            add(line)
+        painter = QPainter(image)
+        renderer.draw(painter)  # the first paint of a full stroke fills its layer
+        painter.end()
+        streamed = lines[len(lines) - args.frames:]
+
+        legacy_tail = tail or len(lines)
+        legacy_ms = time_frames(image, frames, lambda p: paint_legacy(p, lines, legacy_tail))
+        bucket_ms = time_frames(image, args.frames, renderer.draw, lambda i: add(streamed[i]))
+        label = str(tail) if tail else "full"
+        print(f"{label:>8} {legacy_ms:>10.3f} {bucket_ms:>10.3f} {legacy_ms / bucket_ms:>7.1f}x")
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Soak test: runs the real DrawingWidget session (ready prompt, example
+animation, drawing, visual mask) back to back hundreds of times in one process,
+on a SimClock, with a synthetic pen drawing a circle whenever drawing is on.
+Simulated time jumps over the waits, so a session takes as long as its work.
+
+After every session it records the resident set size, live Python objects, Qt
+widgets still alive, the bytes the session took on disk, and a digest of the
+recorded samples. Sessions with the same trial-order seed must produce the same
+digest (the run is deterministic); memory and file size must not grow with the
+session count. With budgets given, exits non-zero when one is exceeded.
+
+Usage:
+    python benchmarks/soak_sessions.py [--sessions 200] [--seeds 4] [--rate 200] [--trial-seconds 5]
+                                       [--shapes 1 2] [--speeds fast] [--format journal|binary]
+                                       [--max-rss-growth-mb 20] [--max-size-growth 0.01] [--json soak.json]
+"""
+import argparse
+import contextlib
+import gc
+import hashlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.chdir(ROOT)  # stimuli are loaded from assets/
+
+import numpy as np
+from PyQt5.QtCore import Qt, QEvent, QPointF, QCoreApplication
+from PyQt5.QtGui import QTabletEvent
+from PyQt5.QtWidgets import QApplication
+
+from settings_singleton import Settings
+from SimClock import SimClock
+
+START_WALL = 1_700_000_000.0  # fixed wall-clock start, so the recorded times repeat across runs
+LOOP_SECONDS = 2.0  # one turn of the pen around the circle
+WARMUP_FRACTION = 0.25  # share of the sessions left out of the growth fits (caches filling up)
+
+
+def rss_mb():
+    """current resident set size; falls back to the peak where /proc is missing"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Pen:
+    """Clicks through the prompts and draws a circle at `rate_hz` while the widget records."""
+
+    def __init__(self, clock, widget, rate_hz):
+        self.widget = widget
+        self.rate_hz = rate_hz
+        self.seq = 0
+        self.down = False
+        self.timer = clock.timer()
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(1000.0 / rate_hz)
+
+    def send(self, kind):
+        w = self.widget
+        rect = w._drawing_rect()
+        t = self.seq / self.rate_hz
+        angle = 2 * math.pi * t / LOOP_SECONDS
+        radius = min(rect.width(), rect.height()) * 0.4
+        pos = QPointF(rect.center().x() + radius * math.cos(angle), rect.center().y() + radius * math.sin(angle))
+        event = QTabletEvent(kind, pos, pos, QTabletEvent.Stylus, QTabletEvent.Pen,
+                             0.5 + 0.3 * math.sin(angle), 0, 0, 0.0, 0.0, 0,
+                             Qt.NoModifier, 1, Qt.LeftButton, Qt.LeftButton)
+        self.seq += 1
+        event.setTimestamp(self.seq)
+        QApplication.sendEvent(w, event)  # delivered now, so the order never depends on the event loop
+
+    def tick(self):
+        w = self.widget
+        if w.closing:
+            self.timer.stop()
+        elif w.ok_button.isVisible():
+            self.down = False
+            w.ok_button.click()
+        elif w.play:
+            self.send(QEvent.TabletMove if self.down else QEvent.TabletPress)
+            self.down = True
+
+
+def sample_digest(data_handler):
+    """sha1 of the recorded samples of the session, in order"""
+    from SessionReader import iter_trials
+    path = data_handler.output_file if data_handler.journal is None else data_handler.journal.path
+    digest = hashlib.sha1()
+    # whole trials: how the writer thread batched the journal records follows real time, not the clock
+    for _, _, samples in iter_trials(path):
+        digest.update(np.ascontiguousarray(samples).tobytes())
+    return digest.hexdigest()
+
+
+def session_bytes(data_handler):
+    paths = [data_handler.output_file]
+    if data_handler.journal is not None:
+        paths.append(data_handler.journal.path)
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            total += sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def remove_session(data_handler):
+    import shutil
+    index = data_handler.index.path if data_handler.index else None
+    for path in (data_handler.output_file, data_handler.journal.path if data_handler.journal else None, index):
+        if path and os.path.isdir(path):
+            shutil.rmtree(path)
+        elif path and os.path.exists(path):
+            os.remove(path)
+
+
+def run_session(index, seed, args, workdir):
+    from DataHandler import DataHandler
+    from DrawingWidget import DrawingWidget
+    from TrialScheduler import TrialScheduler
+
+    clock = SimClock(start_wall=START_WALL)
+    started = time.perf_counter()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log if not args.verbose else sys.stdout):
+        output = os.path.join(workdir, f"soak_{index:05d}_shape_tracking.json")
+        data_handler = DataHandler(f"soak{index}", output, output_format=args.format, clock=clock)
+        scheduler = TrialScheduler(Settings().get_selected_shapes(), mode="random", seed=seed)
+        widget = DrawingWidget(data_handler, scheduler=scheduler, clock=clock)
+        pen = Pen(clock, widget, args.rate)
+        finished = clock.run(until=lambda: getattr(widget, "label_shown", False),
+                             max_ms=args.max_session_minutes * 60_000)
+
+    result = {
+        "session": index,
+        "seed": seed,
+        "finished": finished,
+        "simulated_s": clock.now / 1e9,
+        "wall_s": time.perf_counter() - started,
+        "timers_fired": clock.fired,
+        "pen_events": pen.seq,
+        "bytes": session_bytes(data_handler),
+        "digest": sample_digest(data_handler),
+    }
+    if not args.keep:
+        remove_session(data_handler)
+
+    pen.timer.stop()
+    clock.clear()
+    widget.close()
+    widget.deleteLater()
+    QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    del widget, pen, data_handler, scheduler
+    gc.collect()
+
+    result["rss_mb"] = rss_mb()
+    result["objects"] = len(gc.get_objects())
+    result["widgets"] = len(QApplication.allWidgets())
+    return result
+
+
+def growth(results, key):
+    """least-squares slope of `key` per 100 sessions, after the warm-up"""
+    tail = results[int(len(results) * WARMUP_FRACTION):]
+    if len(tail) < 2:
+        return 0.0
+    x = np.array([r["session"] for r in tail], dtype=float)
+    y = np.array([r[key] for r in tail], dtype=float)
+    return float(np.polyfit(x, y, 1)[0] * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--seeds", type=int, default=4, help="distinct trial orders, cycled over the sessions")
+    parser.add_argument("--rate", type=float, default=200.0, help="pen report rate (Hz)")
+    parser.add_argument("--trial-seconds", type=float, default=5.0, help="drawing duration of a trial")
+    parser.add_argument("--stimuli-seconds", type=float, default=1.0, help="transition before each example")
+    parser.add_argument("--shapes", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--speeds", nargs="+", default=["fast"])
+    parser.add_argument("--format", choices=("journal", "binary"), default="journal")
+    parser.add_argument("--max-session-minutes", type=float, default=120.0,
+                        help="simulated time after which a session counts as hung")
+    parser.add_argument("--max-rss-growth-mb", type=float, help="budget for RSS growth per 100 sessions")
+    parser.add_argument("--max-size-growth", type=float,
+                        help="budget for the spread of session sizes, relative to the smallest")
+    parser.add_argument("--keep", help="keep the session files in this directory")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    parser.add_argument("--json", help="also write the per-session results to this file")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    # in-memory only, the settings file is left alone
+    Settings().update({"drawing_duration": args.trial_seconds, "stimuli_duration": args.stimuli_seconds,
+                       "shapes": args.shapes, "speeds": args.speeds, "capture_mode": "event",
+                       "upload": False}, save=False)
+
+    results = []
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.keep or tmp
+        os.makedirs(workdir, exist_ok=True)
+        for i in range(args.sessions):
+            r = run_session(i, i % max(args.seeds, 1), args, workdir)
+            results.append(r)
+            if i % 10 == 0 or i == args.sessions - 1:
+                print(f"session {i:5d}: {r['simulated_s']:7.1f} s simulated in {r['wall_s']:5.2f} s, "
+                      f"{r['bytes'] / 1024:8.1f} KiB, RSS {r['rss_mb']:6.1f} MB, {r['objects']} objects, "
+                      f"{r['widgets']} widgets")
+    wall = time.perf_counter() - started
+
+    failed = []
+    hung = [r["session"] for r in results if not r["finished"]]
+    if hung:
+        failed.append(f"sessions did not finish: {hung[:10]}")
+
+    digests = {}
+    for r in results:
+        digests.setdefault(r["seed"], set()).add(r["digest"])
+    nondeterministic = sorted(seed for seed, d in digests.items() if len(d) > 1)
+    if nondeterministic:
+        failed.append(f"seeds with differing recordings: {nondeterministic}")
+
+    sizes = {}
+    for r in results:
+        sizes.setdefault(r["seed"], []).append(r["bytes"])
+    size_growth = max((max(s) - min(s)) / min(s) for s in sizes.values() if min(s) > 0) if results else 0.0
+    rss_growth = growth(results, "rss_mb")
+    object_growth = growth(results, "objects")
+
+    simulated = sum(r["simulated_s"] for r in results)
+    print(f"\n{len(results)} sessions, {simulated / 60:.1f} min simulated in {wall:.1f} s "
+          f"({simulated / wall if wall else 0:.0f}x real time)")
+    print(f"  RSS growth         {rss_growth:8.2f} MB / 100 sessions (after {WARMUP_FRACTION:.0%} warm-up)")
+    print(f"  object growth      {object_growth:8.0f} / 100 sessions")
+    print(f"  widgets left       {results[-1]['widgets'] if results else 0:8d}")
+    print(f"  size spread        {size_growth:8.2%} between sessions of the same seed")
+    print(f"  deterministic      {'yes' if not nondeterministic else 'NO'}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    for value, budget, name in ((rss_growth, args.max_rss_growth_mb, "RSS growth MB/100 sessions"),
+                                (size_growth, args.max_size_growth, "size spread")):
+        if budget is not None and value > budget:
+            failed.append(f"{name} {value:.3f} > {budget}")
+    if failed:
+        print("Failed: " + "; ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
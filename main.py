@@ -4,13 +4,12 @@ from datetime import datetime
 
 from PyQt5.QtWidgets import QApplication, QMainWindow, QStackedWidget
 
-import settings_singleton
 from MenuWidget import MenuWidget
-from DrawingWidget import DrawingWidget
-from DataHandler import DataHandler
-from Instrucations import InstructionsWidget
 from settings_singleton import Settings
 
+# The drawing task (NumPy, svgpathtools, the data writers) and the upload code are only
+# imported once they are needed, so the menu comes up as fast as possible.
+
 
 
 FILE_NAME = "_shape_tracking.json"
@@ -54,10 +53,56 @@ class MainWindow(QMainWindow):
         self.menu = MenuWidget(self.start_drawing_task)
         self.stack.addWidget(self.menu)
 
+        settings.changed.connect(self._on_setting_changed)
+
+        # Upload sessions left over from earlier (offline) runs in the background
+        self.drain_thread = None
+        if settings.get_upload():
+            from Outbox import DrainThread, get_outbox
+            if get_outbox().pending_count():
+                self.drain_thread = DrainThread(parent=self)
+                self.drain_thread.start()
+        # a QThread destroyed while running aborts the process, so uploads are stopped first
+        QApplication.instance().aboutToQuit.connect(self._stop_uploads)
+
+    def _stop_uploads(self):
+        threads = [self.drain_thread, getattr(self.drawing_widget, "upload_thread", None)]
+        for thread in threads:
+            if thread is not None:
+                thread.cancel()
+        for thread in threads:
+            if thread is not None:
+                thread.wait()
+
+    def _on_setting_changed(self, name, value):
+        if name == "full_screen":
+            if value:
+                self.showFullScreen()
+            else:
+                self.showNormal()
+
     def start_drawing_task(self, participant_name):
+        from Prewarm import StimulusPrewarmer
+        from TrialScheduler import TrialScheduler, count_sessions
+
         self.participant_name = participant_name
+        participant_index = settings.get_participant_index()
+        if participant_index is None:
+            participant_index = count_sessions(FOLDER)
+        self.scheduler = TrialScheduler(settings.get_selected_shapes(),
+                                        mode=settings.get_schedule_mode(),
+                                        seed=settings.get_schedule_seed(),
+                                        participant=participant_name,
+                                        participant_index=participant_index)
+        print(f"Trial schedule: {len(self.scheduler)} trials, mode {self.scheduler.mode}, "
+              f"seed {self.scheduler.seed}, participant index {participant_index}")
+
+        # Load every stimulus of the session while the instructions are read
+        self.prewarmer = StimulusPrewarmer(list(self.scheduler), parent=self)
+        self.prewarmer.start()
 
         if settings.get_show_intro():
+            from Instrucations import InstructionsWidget
             self.instructions = InstructionsWidget()
             self.instructions.finished.connect(self.launch_drawing_widget)
             self.stack.addWidget(self.instructions)
@@ -67,10 +112,16 @@ class MainWindow(QMainWindow):
 
 
     def launch_drawing_widget(self):
+        from DataHandler import DataHandler
+        from DrawingWidget import DrawingWidget
+
         current_time = datetime.now().strftime('%Y%m%d%H%M%S') + "_"
         self.data_handler = DataHandler(self.participant_name,
-                                        FOLDER + current_time + self.participant_name + FILE_NAME)
-        self.drawing_widget = DrawingWidget(self.data_handler)
+                                        FOLDER + current_time + self.participant_name + FILE_NAME,
+                                        s3_flag=settings.get_upload(),
+                                        output_format=settings.get_output_format(),
+                                        metadata=self.scheduler.metadata())
+        self.drawing_widget = DrawingWidget(self.data_handler, scheduler=self.scheduler)
         self.stack.addWidget(self.drawing_widget)
         self.stack.setCurrentWidget(self.drawing_widget)
 
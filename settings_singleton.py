@@ -1,11 +1,154 @@
 # settings_singleton.py
 
+import json
 import os
 
-class Settings:
+from PyQt5.QtCore import QObject, pyqtSignal
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:  # pragma: no cover - older interpreters
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+SPEEDS = ("fast", "medium", "slow", "comfort")
+SHAPE_IDS = tuple(range(1, 10))
+# template tokens of the legacy settings.txt and the hide_template flag they stand for
+TEMPLATE_TOKENS = {"Show Template": False, "Hide Template": True}
+
+
+def _to_bool(v):
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, (int, float)):
+        return bool(v)
+    if isinstance(v, str):
+        return v.strip().lower() in {"1", "true", "yes", "y", "on"}
+    raise ValueError(f"not a boolean: {v!r}")
+
+
+def _split(v):
+    if isinstance(v, str):
+        return [s.strip() for s in v.split(',') if s.strip()]
+    return list(v)
+
+
+def _positive_float(v):
+    v = float(v)
+    if v < 0:
+        raise ValueError(f"must not be negative: {v}")
+    return v
+
+
+def _choice(*choices):
+    def coerce(v):
+        v = str(v).strip().lower()
+        if v not in choices:
+            raise ValueError(f"{v!r} is not one of {choices}")
+        return v
+    return coerce
+
+
+def _shapes(v):
+    shapes = [int(s) for s in _split(v)]
+    unknown = [s for s in shapes if s not in SHAPE_IDS]
+    if unknown:
+        raise ValueError(f"unknown shapes {unknown}")
+    return shapes
+
+
+def _speeds(v):
+    speeds = [s.lower() for s in _split(v)]
+    unknown = [s for s in speeds if s not in SPEEDS]
+    if unknown:
+        raise ValueError(f"unknown speeds {unknown}")
+    return speeds
+
+
+def _templates(v):
+    """hide_template conditions of the session: [False] shows the template, [True] hides it"""
+    if isinstance(v, str):
+        tokens = _split(v)
+        unknown = [t for t in tokens if t not in TEMPLATE_TOKENS]
+        if unknown:
+            raise ValueError(f"unknown template options {unknown}")
+        flags = {TEMPLATE_TOKENS[t] for t in tokens}
+    else:
+        flags = {_to_bool(f) for f in v}
+    # no condition selected means both, as the old settings files did
+    return sorted(flags) if flags else [False, True]
+
+
+def _corner(v):
+    parts = [int(p) for p in _split(v)]
+    if len(parts) != 2:
+        raise ValueError(f"corner_location needs two values, got {parts}")
+    return parts
+
+
+def _tail_length(v):
+    v = int(v)
+    if v < 0:
+        raise ValueError(f"must not be negative: {v}")
+    return v
+
+
+def _seed(v):
+    if v is None or (isinstance(v, str) and not v.strip()):
+        return None
+    return int(v)
+
+
+def _index(v):
+    v = _seed(v)
+    if v is not None and v < 0:
+        raise ValueError("must be 0 or more")
+    return v
+
+
+# name -> (default, coerce); coerce validates a value from any source (file, dialog, code)
+SETTINGS_SCHEMA = {
+    "stimuli_duration": (5.0, _positive_float),
+    "drawing_duration": (40.0, _positive_float),
+    "corner_location": ([0, 0], _corner),
+    "corner_scale": (1.0, _positive_float),
+    "shapes": (list(SHAPE_IDS), _shapes),
+    "speeds": (list(SPEEDS), _speeds),
+    "templates": ([False, True], _templates),  # hide_template conditions
+    "show_intro": (True, _to_bool),
+    "full_screen": (False, _to_bool),
+    # "journal" (append-only, JSON built at the end), "json" (legacy in-place text)
+    # or "binary" (columnar .npy)
+    "output_format": ("journal", _choice("journal", "json", "binary")),
+    "upload": (False, _to_bool),  # queue finished sessions in the outbox and upload them
+    "upload_compress": (False, _to_bool),  # gzip the upload body (the endpoint must accept Content-Encoding: gzip)
+    "capture_mode": ("event", _choice("event", "poll")),  # every pen event, or a 1 ms timer
+    "tail_length": (30, _tail_length),  # pen segments left visible while drawing, 0 keeps the whole stroke
+    "stroke_history": (False, _to_bool),  # keep every stroke vertex of a trial in memory (for replay)
+    "schedule_mode": ("random", _choice("random", "blocked", "latin")),  # trial order
+    "schedule_seed": (None, _seed),  # fixed seed for the trial order, None draws a new one per session
+    # picks the Latin square row and template order in latin mode; None counts sessions in results/
+    "participant_index": (None, _index),
+}
+
+
+class Settings(QObject):
+    """
+    The one settings object of the app. Values are validated against
+    SETTINGS_SCHEMA when loaded or set, and every change is announced through
+    `changed(name, value)` (and once per update through `updated(names)`), so
+    widgets follow the settings without re-reading the file.
+    """
+    changed = pyqtSignal(str, object)
+    updated = pyqtSignal(list)
+
     _instance = None
     _initialized = False
     SETTINGS_FILE = "settings.txt"
+    # looked up in this order when no file is given; the legacy key=value file comes last
+    SETTINGS_FILES = ("settings.toml", "settings.json", "settings.txt")
 
     def __new__(cls):
         if cls._instance is None:
@@ -14,22 +157,15 @@ class Settings:
 
     def __init__(self):
         if not self._initialized:
-            self._initialized = True
+            super().__init__()
+            Settings._initialized = True
+            self.settings_file = None
             self.reset()
             self.load_from_file()
 
     def reset(self):
-        self.stimuli_duration = 5.0
-        self.drawing_duration = 40.0
-        self.corner_location = [0, 0]
-        self.corner_scale = 1.0
-        self.shapes = list(range(1, 10))
-        self.speeds = ["fast", "medium", "slow", "comfort"]
-        self.templates = [True, False]  # Show Template, Hide Template
-        self.show_intro = True
-        # --- NEW: fullscreen option (for a checkbox in UI) ---
-        self.full_screen = False
-        # -----------------------------------------------------
+        for name, (default, _) in SETTINGS_SCHEMA.items():
+            setattr(self, name, json.loads(json.dumps(default)))  # fresh copy of list defaults
         self.update_selected_shapes()
 
     def update_selected_shapes(self):
@@ -41,120 +177,146 @@ class Settings:
         ]
 
     def _to_bool(self, v):
-        if isinstance(v, bool):
-            return v
-        if isinstance(v, (int, float)):
-            return bool(v)
-        if isinstance(v, str):
-            return v.strip().lower() in {"1", "true", "yes", "y", "on"}
-        return False
+        return _to_bool(v)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in SETTINGS_SCHEMA}
+
+    def update(self, values: dict, save: bool = False, strict: bool = True):
+        """
+        validate and apply {name: value}; emits changed/updated for the values that differ.
+        with strict=False invalid or unknown entries are reported and skipped instead of raising
+        """
+        coerced = {}
+        for name, value in values.items():
+            try:
+                if name not in SETTINGS_SCHEMA:
+                    raise KeyError(f"unknown setting {name!r}")
+                coerced[name] = SETTINGS_SCHEMA[name][1](value)
+            except (KeyError, ValueError, TypeError) as e:
+                if strict:
+                    raise ValueError(f"{name}: {e}") from None
+                print(f"⚠ Ignoring setting {name}={value!r}: {e}")
+
+        changed = [name for name, value in coerced.items() if getattr(self, name) != value]
+        for name in changed:
+            setattr(self, name, coerced[name])
+        if changed:
+            self.update_selected_shapes()
+            for name in changed:
+                self.changed.emit(name, getattr(self, name))
+            self.updated.emit(changed)
+        if save:
+            self.save_to_file()
+        return changed
 
     def set(self, stimuli_duration=None, drawing_duration=None,
             corner_location=None, corner_scale=None,
             shapes=None, speeds=None, templates=None,
-            # --- NEW: setter input for fullscreen ---
             full_screen=None,
-            # ---------------------------------------
-            save=True):
-        if stimuli_duration is not None:
-            self.stimuli_duration = float(stimuli_duration)
-        if drawing_duration is not None:
-            self.drawing_duration = float(drawing_duration)
-        # if corner_location is not None:
-        #     self.corner_location = corner_location
-        # if corner_scale is not None:
-        #     self.corner_scale = float(corner_scale)
-        if templates is not None:
-            self.templates = templates
-        if shapes is not None:
-            self.shapes = shapes
-        if speeds is not None:
-            self.speeds = speeds
-        # --- NEW: apply fullscreen flag ---
-        if full_screen is not None:
-            self.full_screen = self._to_bool(full_screen)
-        # ----------------------------------
+            save=True, **values):
+        named = {"stimuli_duration": stimuli_duration, "drawing_duration": drawing_duration,
+                 "corner_location": corner_location, "corner_scale": corner_scale,
+                 "shapes": shapes, "speeds": speeds, "templates": templates, "full_screen": full_screen}
+        values.update({name: value for name, value in named.items() if value is not None})
+        return self.update(values, save=save)
 
-        self.update_selected_shapes()
-        if save:
-            self.save_to_file()
+    # --- file formats ---
+    def _legacy_lines(self):
+        template_tokens = [token for token, hide in TEMPLATE_TOKENS.items() if hide in self.templates]
+        return [
+            f"stimuli_duration={self.stimuli_duration}",
+            f"drawing_duration={self.drawing_duration}",
+            f"corner_location={self.corner_location[0]},{self.corner_location[1]}",
+            f"corner_scale={self.corner_scale}",
+            "shapes=" + ",".join(str(s) for s in self.shapes),
+            "speeds=" + ",".join(self.speeds),
+            "template=" + ",".join(template_tokens),
+            f"show_intro={'true' if self.show_intro else 'false'}",
+            f"full_screen={'true' if self.full_screen else 'false'}",
+            f"output_format={self.output_format}",
+            f"upload={'true' if self.upload else 'false'}",
+            f"upload_compress={'true' if self.upload_compress else 'false'}",
+            f"capture_mode={self.capture_mode}",
+            f"tail_length={self.tail_length}",
+            f"stroke_history={'true' if self.stroke_history else 'false'}",
+            f"schedule_mode={self.schedule_mode}",
+            f"schedule_seed={'' if self.schedule_seed is None else self.schedule_seed}",
+            f"participant_index={'' if self.participant_index is None else self.participant_index}",
+        ]
+
+    @staticmethod
+    def _toml_value(value):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, list):
+            return "[" + ", ".join(Settings._toml_value(v) for v in value) + "]"
+        if isinstance(value, str):
+            return json.dumps(value)
+        return repr(value)
+
+    def _serialize(self, path):
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".json":
+            return json.dumps(self.as_dict(), indent=2) + "\n"
+        if ext == ".toml":
+            # TOML has no null: an unset value is simply left out
+            return "".join(f"{name} = {self._toml_value(value)}\n"
+                           for name, value in self.as_dict().items() if value is not None)
+        return "\n".join(self._legacy_lines()) + "\n"
+
+    @staticmethod
+    def _parse(path):
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".json":
+            with open(path, 'r', encoding="utf-8") as f:
+                return json.load(f)
+        if ext == ".toml":
+            if tomllib is None:
+                raise RuntimeError("reading settings.toml needs Python 3.11+ or the 'tomli' package")
+            with open(path, 'rb') as f:
+                return tomllib.load(f)
 
-    # --- NEW: persist settings to settings.txt including full_screen ---
-    def save_to_file(self):
+        values = {}
+        with open(path, 'r', encoding="utf-8") as f:
+            for line in f:
+                if '=' not in line:
+                    continue
+                key, val = line.strip().split('=', 1)
+                key = key.strip()
+                values["templates" if key == "template" else key] = val.strip()
+        return values
+
+    def save_to_file(self, path: str = None):
+        """write the settings atomically (temp file + rename) in the format of the file's extension"""
+        path = path or self.settings_file or self.SETTINGS_FILE
+        tmp_path = path + ".tmp"
         try:
-            with open(self.SETTINGS_FILE, "w", encoding="utf-8") as f:
-                f.write(f"stimuli_duration={self.stimuli_duration}\n")
-                f.write(f"drawing_duration={self.drawing_duration}\n")
-                f.write(f"corner_location={self.corner_location[0]},{self.corner_location[1]}\n")
-                f.write(f"corner_scale={self.corner_scale}\n")
-                f.write("shapes=" + ",".join(str(s) for s in self.shapes) + "\n")
-                f.write("speeds=" + ",".join(self.speeds) + "\n")
-                # Preserve existing 'template' line semantics
-                # We encode to the same textual representation the loader expects.
-                # "Show Template" appears when templates[0] is False (see loader logic)
-                # "Hide Template" appears when templates[1] is True
-                template_tokens = []
-                # Mirror existing (somewhat unusual) parsing logic:
-                # saved_templates = ["Show Template" not in saved_templates, "Hide Template" in saved_templates]
-                # To round-trip with minimal disruption, we emit tokens that re-create current flags:
-                if not self.templates[0]:
-                    template_tokens.append("Show Template")
-                if self.templates[1]:
-                    template_tokens.append("Hide Template")
-                f.write("template=" + ",".join(template_tokens) + "\n")
-                f.write(f"show_intro={'true' if self.show_intro else 'false'}\n")
-                # --- NEW line for fullscreen ---
-                f.write(f"full_screen={'true' if self.full_screen else 'false'}\n")
-                # --------------------------------
-            print("Saved settings to file.")
-        except Exception as e:
-            print(f"Error writing settings.txt: {e}")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self._serialize(path))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            self.settings_file = path
+            print(f"Saved settings to {path}.")
+        except OSError as e:
+            print(f"Error writing {path}: {e}")
 
-    def load_from_file(self):
-        if not os.path.exists(self.SETTINGS_FILE):
+    def load_from_file(self, path: str = None):
+        if path is None:
+            path = next((p for p in self.SETTINGS_FILES if os.path.exists(p)), None)
+        if path is None or not os.path.exists(path):
             print("⚠ settings.txt not found. Using defaults.")
             return
 
         try:
-            with open(self.SETTINGS_FILE, 'r', encoding="utf-8") as f:
-                for line in f:
-                    if '=' not in line:
-                        continue
-                    key, val = line.strip().split('=', 1)
-                    key = key.strip()
-                    val = val.strip()
-
-                    if key == "stimuli_duration":
-                        self.stimuli_duration = float(val)
-                    elif key == "drawing_duration":
-                        self.drawing_duration = float(val)
-                    elif key == "corner_location":
-                        parts = val.split(',')
-                        self.corner_location = [int(parts[0]), int(parts[1])]
-                    elif key == "corner_scale":
-                        self.corner_scale = float(val)
-                    elif key == "shapes":
-                        self.shapes = [int(s.strip()) for s in val.split(',') if s.strip().isdigit()]
-                    elif key == "speeds":
-                        self.speeds = [s.strip() for s in val.split(',') if s.strip()]
-                    elif key == "template":
-                        saved_templates = [t.strip() for t in val.split(',') if t.strip()]
-                        saved_templates = [
-                            "Show Template" not in saved_templates,
-                            "Hide Template" in saved_templates
-                        ]
-                        self.templates = list(set(saved_templates))
-                    elif key == "show_intro":
-                        self.show_intro = val.lower() == "true"
-                    # --- NEW: read fullscreen flag ---
-                    elif key == "full_screen":
-                        self.full_screen = val.lower() == "true"
-                    # --------------------------------
-
-            self.update_selected_shapes()
-            print("Loaded settings from file.")
+            values = self._parse(path)
         except Exception as e:
-            print(f"Error reading settings.txt: {e}")
+            print(f"Error reading {path}: {e}")
+            return
+        self.settings_file = path
+        self.update(values, strict=False)
+        print(f"Loaded settings from {path}.")
 
     # --- Getters (optional) ---
     def get_transition_duration(self):
@@ -184,6 +346,32 @@ class Settings:
     def get_show_intro(self):
         return self.show_intro
 
-    # --- NEW: getter for fullscreen ---
     def get_full_screen(self):
         return self.full_screen
+
+    def get_output_format(self):
+        return self.output_format
+
+    def get_upload(self):
+        return self.upload
+
+    def get_upload_compress(self):
+        return self.upload_compress
+
+    def get_capture_mode(self):
+        return self.capture_mode
+
+    def get_tail_length(self):
+        return self.tail_length
+
+    def get_stroke_history(self):
+        return self.stroke_history
+
+    def get_schedule_mode(self):
+        return self.schedule_mode
+
+    def get_schedule_seed(self):
+        return self.schedule_seed
+
+    def get_participant_index(self):
+        return self.participant_index
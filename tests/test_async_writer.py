@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from AsyncWriter import BackgroundWriter
+
+
+class Gate:
+    """a writer operation that holds the writer thread until released"""
+
+    def __init__(self, writer):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        writer.submit(self.__hold)
+        assert self.entered.wait(5)
+
+    def __hold(self):
+        self.entered.set()
+        self.release.wait(5)
+
+
+def collecting_writer(**kwargs):
+    written = []
+    return BackgroundWriter(written.extend, **kwargs), written
+
+
+def test_samples_and_operations_stay_in_order():
+    writer, written = collecting_writer(max_batch=3)
+    for i in range(10):
+        writer.put(i)
+        if i == 4:
+            writer.submit(lambda: written.append("op"))
+    writer.close()
+    assert written == [0, 1, 2, 3, 4, "op", 5, 6, 7, 8, 9]
+    assert writer.stats()["written"] == 10
+
+
+def test_drop_policy_counts_what_it_drops():
+    writer, written = collecting_writer(max_queue=4, policy="drop")
+    gate = Gate(writer)
+    accepted = [writer.put(i) for i in range(10)]
+    gate.release.set()
+    writer.close()
+    stats = writer.stats()
+    assert accepted == [True] * 4 + [False] * 6
+    assert (stats["enqueued"], stats["dropped"], stats["written"]) == (4, 6, 4)
+    assert stats["max_queue_depth"] == 4
+    assert stats["backpressure_waits"] == 0
+    assert written == [0, 1, 2, 3]
+
+
+def test_block_policy_waits_then_drops():
+    writer, written = collecting_writer(max_queue=2, policy="block", put_timeout=0.01)
+    gate = Gate(writer)
+    accepted = [writer.put(i) for i in range(3)]
+    gate.release.set()
+    writer.close()
+    stats = writer.stats()
+    assert accepted == [True, True, False]
+    assert (stats["backpressure_waits"], stats["dropped"]) == (1, 1)
+    assert written == [0, 1]
+
+
+def test_discard_drops_only_what_was_not_written():
+    writer, written = collecting_writer()
+    writer.put("kept")
+    writer.sync()
+    gate = Gate(writer)
+    for i in range(5):
+        writer.put(i)
+    writer.discard()
+    writer.put("after")
+    gate.release.set()
+    writer.close()
+    assert written == ["kept", "after"]
+    stats = writer.stats()
+    assert (stats["discarded"], stats["written"], stats["enqueued"]) == (5, 2, 7)
+
+
+def test_sink_errors_are_counted():
+    def sink(batch):
+        raise OSError("disk full")
+
+    writer = BackgroundWriter(sink)
+    writer.put(1)
+    writer.close()
+    assert writer.stats()["errors"] == 1
+    assert isinstance(writer.last_error, OSError)
+
+
+def test_failing_operation_raises_when_waited_for():
+    writer, _ = collecting_writer()
+    with pytest.raises(ZeroDivisionError):
+        writer.submit(lambda: 1 / 0, wait=True)
+    writer.close()
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        BackgroundWriter(list, policy="spill")
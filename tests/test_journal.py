@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from Journal import TrialJournal, iter_journal, rebuild_session
+from SampleStore import SAMPLE_FIELDS
+
+TRIALS = [(["assets/shape1.svg", "fast", False], [5, 5, 3]),
+          (["assets/shape2.svg", "slow", True], []),
+          (["assets/shape3.svg", "medium", False], [4, 6])]
+
+
+def sample(trial, i):
+    return [100 * trial + i, 200 + i, 0, 0, 0.5, 1000 * trial + i, 7, 10 ** 9 + i, 1.25]
+
+
+def write_journal(path, close=True):
+    journal = TrialJournal(str(path), "p1", "exp", "2024-01-01 10:00:00", metadata={"screen": [1920, 1080]})
+    count = 0
+    for trial, (info, batches) in enumerate(TRIALS):
+        journal.start_trial(trial, info, clock_anchor={"host_ns": trial})
+        for size in batches:
+            journal.write_samples([sample(trial, count + i) for i in range(size)])
+            count += size
+        journal.end_trial({"frames": trial})
+    if close:
+        journal.close()
+    else:
+        journal.stream.close()
+    return path.read_bytes()
+
+
+def expected_trials(content):
+    """trial_num -> samples of the records that are complete in `content`"""
+    trials = {}
+    for line in content.split(b"\n")[:-1]:
+        record = json.loads(line)
+        if record["type"] == "trial_start":
+            current = trials.setdefault(record["trial_num"], [])
+        elif record["type"] == "samples":
+            current.extend(dict(zip(SAMPLE_FIELDS, row)) for row in record["rows"])
+    return trials
+
+
+def cut_points(content):
+    """every record boundary, one byte short of it (no newline yet) and the middle of every record"""
+    points, start = set(), 0
+    for end in range(len(content)):
+        if content[end:end + 1] == b"\n":
+            points.update((start + (end - start) // 2, end, end + 1))
+            start = end + 1
+    return sorted(points)
+
+
+def test_full_journal(tmp_path):
+    write_journal(tmp_path / "s.journal")
+    summary = rebuild_session(str(tmp_path / "s.journal"), str(tmp_path / "s.json"))
+    assert summary == {"trials": 3, "samples": 23, "complete": True}
+    session = json.loads((tmp_path / "s.json").read_text())
+    assert session["pid"] == "p1" and session["screen"] == [1920, 1080]
+    assert [t["trial_info"] for t in session["data"]] == [info for info, _ in TRIALS]
+    assert [t["timing"] for t in session["data"]] == [{"frames": i} for i in range(3)]
+    assert session["data"][2]["clock_anchor"] == {"host_ns": 2}
+
+
+def test_torn_journal_keeps_every_complete_sample(tmp_path):
+    content = write_journal(tmp_path / "full.journal")
+    first_line = content.index(b"\n") + 1
+    for cut in cut_points(content):
+        if cut < first_line:
+            continue  # no session record yet, see below
+        torn = tmp_path / "torn.journal"
+        torn.write_bytes(content[:cut])
+        summary = rebuild_session(str(torn), str(tmp_path / "torn.json"))
+        session = json.loads((tmp_path / "torn.json").read_text())  # valid JSON at every cut
+        expected = expected_trials(content[:cut].rsplit(b"\n", 1)[0] + b"\n")
+        assert {t["trial_num"]: t["data"] for t in session["data"]} == expected, cut
+        assert summary["trials"] == len(expected)
+        assert summary["samples"] == sum(len(samples) for samples in expected.values())
+        assert summary["complete"] == (cut == len(content))
+
+
+def test_crash_without_session_end(tmp_path):
+    write_journal(tmp_path / "s.journal", close=False)
+    summary = rebuild_session(str(tmp_path / "s.journal"), str(tmp_path / "s.json"))
+    assert summary == {"trials": 3, "samples": 23, "complete": False}
+    assert len(json.loads((tmp_path / "s.json").read_text())["data"]) == 3
+
+
+def test_torn_line_ends_the_journal(tmp_path):
+    content = write_journal(tmp_path / "s.journal")
+    (tmp_path / "s.journal").write_bytes(content[:-1])  # session_end without its newline
+    assert [r["type"] for r in iter_journal(str(tmp_path / "s.journal"))][-1] == "trial_end"
+
+
+def test_journal_without_session_record(tmp_path):
+    content = write_journal(tmp_path / "s.journal")
+    (tmp_path / "s.journal").write_bytes(content[:content.index(b"\n") // 2])
+    with pytest.raises(ValueError):
+        rebuild_session(str(tmp_path / "s.journal"), str(tmp_path / "s.json"))
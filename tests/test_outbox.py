@@ -0,0 +1,132 @@
+import json
+import time
+
+import pytest
+
+from Outbox import CLAIM_LEASE_S, DONE, PENDING, UPLOADING, Outbox, OutboxDrainer
+from Uploader import StandInServer, upload_file
+
+
+@pytest.fixture
+def server():
+    server = StandInServer(fail_first=1).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def session_file(tmp_path):
+    path = tmp_path / "20250101000000_P01_shape_tracking.json"
+    path.write_text(json.dumps({"pid": "P01", "data": []}), encoding="utf-8")
+    return str(path)
+
+
+def drainer_for(outbox, server, **kwargs):
+    return OutboxDrainer(outbox, url=server.url, workers=2, base_delay=0.05, compress=False, **kwargs)
+
+
+def test_failure_backoff_then_success(tmp_path, server, session_file):
+    outbox = Outbox(str(tmp_path / "outbox"))
+    item_id = outbox.enqueue(session_file)
+    drainer = drainer_for(outbox, server)
+    try:
+        assert drainer.drain_once() == (0, 1)
+        item = outbox.snapshot()[item_id]
+        assert item["status"] == PENDING
+        assert item["attempts"] == 1
+        assert item["last_error"] == "HTTP 503"
+        assert item["next_attempt"] > time.time() - 0.05
+        assert drainer.drain_once() == (0, 0)  # still backing off
+
+        time.sleep(0.1)
+        assert drainer.drain_once() == (1, 0)
+    finally:
+        drainer.close()
+
+    item = outbox.snapshot()[item_id]
+    assert item["status"] == DONE
+    assert item["attempts"] == 2
+    assert server.attempts == 2
+    assert len(server.received) == 1
+    upload = server.received[0]
+    assert upload["subject_id"] == "P01"
+    assert json.loads(upload["exp_data"]) == {"pid": "P01", "data": []}  # exp_data holds the file text
+    assert upload["idempotency_key"] == item["idempotency_key"] == item_id
+
+
+def test_idempotency_key_deduplicates(tmp_path, server, session_file):
+    outbox = Outbox(str(tmp_path / "outbox"))
+    item_id = outbox.enqueue(session_file)
+    server.fail_first = 0
+    drainer = drainer_for(outbox, server)
+    try:
+        assert drainer.drain_once() == (1, 0)
+    finally:
+        drainer.close()
+    # a retry of an upload whose response was lost carries the same key
+    upload_file(session_file, "P01", url=server.url, extra_headers={"Idempotency-Key": item_id})
+    assert server.attempts == 2
+    assert len(server.received) == 1
+
+
+def test_claim_is_exclusive_across_outboxes(tmp_path, session_file):
+    directory = str(tmp_path / "outbox")
+    app, cli = Outbox(directory), Outbox(directory)  # e.g. the app and Outbox.py drain
+    item_id = app.enqueue(session_file)
+
+    assert [i for i, _ in app.claim_due()] == [item_id]
+    assert cli.claim_due() == []
+    assert cli.snapshot()[item_id]["status"] == UPLOADING
+    # the claim of a drainer that died lapses
+    assert [i for i, _ in cli.claim_due(now=time.time() + CLAIM_LEASE_S + 1)] == [item_id]
+
+
+def test_enqueue_merges_with_other_process(tmp_path, session_file):
+    directory = str(tmp_path / "outbox")
+    app, cli = Outbox(directory), Outbox(directory)
+    first = app.enqueue(session_file)
+    other = tmp_path / "20250102000000_P02_shape_tracking.json"
+    other.write_text("{}", encoding="utf-8")
+    second = cli.enqueue(str(other))
+    app.mark_done(first)
+    assert set(cli.snapshot()) == {first, second}
+    assert cli.snapshot()[first]["status"] == DONE
+
+
+def test_cancel_gives_claims_back(tmp_path, server, session_file):
+    outbox = Outbox(str(tmp_path / "outbox"))
+    item_id = outbox.enqueue(session_file)
+    drainer = drainer_for(outbox, server)
+    drainer.cancel()
+    try:
+        assert drainer.drain_once() == (0, 0)
+    finally:
+        drainer.close()
+    item = outbox.snapshot()[item_id]
+    assert item["status"] == PENDING
+    assert item["attempts"] == 0
+    assert server.attempts == 0
+
+
+def test_prune_forgets_old_uploads(tmp_path, session_file):
+    outbox = Outbox(str(tmp_path / "outbox"))
+    item_id = outbox.enqueue(session_file)
+    outbox.mark_done(item_id)
+    assert outbox.prune() == 0
+    assert outbox.prune(keep_s=0) == 1
+    assert outbox.snapshot() == {}
+
+
+def test_drain_thread_reports_a_broken_manifest(tmp_path, server):
+    from PyQt5.QtCore import QCoreApplication
+    from Outbox import DrainThread
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    outbox = Outbox(str(tmp_path / "outbox"))
+    with open(outbox.manifest_path, 'w', encoding='utf-8') as f:
+        f.write("{not json")
+    thread = DrainThread(outbox, url=server.url)
+    drained = []
+    thread.drained.connect(lambda uploaded, failed: drained.append((uploaded, failed)))
+    thread.run()  # on this thread, so the signal is delivered directly
+    assert drained == [(0, 1)]
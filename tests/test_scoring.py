@@ -0,0 +1,65 @@
+import math
+
+import numpy as np
+import pytest
+
+from Scoring import discrete_frechet, dtw, score_shape, template_geometry
+
+SHAPES = [f"assets/shape{i}.svg" for i in range(1, 10)]
+
+
+def reference(p, q, combine):
+    """the textbook O(n*m) table, one cell at a time"""
+    n, m = len(p), len(q)
+    table = np.full((n, m), np.inf)
+    for i in range(n):
+        for j in range(m):
+            d = math.hypot(p[i][0] - q[j][0], p[i][1] - q[j][1])
+            if i == 0 and j == 0:
+                table[i, j] = d
+                continue
+            best = min(table[i - 1, j] if i else math.inf, table[i, j - 1] if j else math.inf,
+                       table[i - 1, j - 1] if i and j else math.inf)
+            table[i, j] = combine(d, best)
+    return table[n - 1, m - 1]
+
+
+def random_paths(seed):
+    rng = np.random.default_rng(seed)
+    n, m = rng.integers(1, 40, size=2)
+    return rng.uniform(0, 100, (n, 2)), rng.uniform(0, 100, (m, 2))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_dtw_and_frechet_match_the_full_table(seed):
+    p, q = random_paths(seed)
+    assert dtw(p, q, band=1.0) == pytest.approx(reference(p, q, lambda d, best: d + best))
+    assert discrete_frechet(p, q, band=1.0) == pytest.approx(reference(p, q, max))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_band_covering_the_table_changes_nothing(seed):
+    p, q = random_paths(seed)
+    assert dtw(p, q, band=1.0) == dtw(p, q, band=3.0)
+    assert discrete_frechet(p, q, band=1.0) == discrete_frechet(p, q, band=3.0)
+    # a narrower band only removes warping paths
+    assert dtw(p, q, band=0.1) >= dtw(p, q, band=1.0)
+    assert discrete_frechet(p, q, band=0.1) >= discrete_frechet(p, q, band=1.0)
+
+
+def test_early_abandon():
+    p, q = random_paths(3)
+    cost = dtw(p, q, band=1.0)
+    assert dtw(p, q, band=1.0, abandon=cost * 1.01) == pytest.approx(cost)
+    assert dtw(p, q, band=1.0, abandon=cost * 0.5) == math.inf
+
+
+@pytest.mark.parametrize("shape_file", SHAPES)
+def test_trace_on_the_outline_scores_perfectly(shape_file):
+    trace = template_geometry(shape_file).sample_uniform(2.0, include_end=True)
+    score = score_shape(trace, shape_file)
+    assert score["max_error"] < 0.5
+    assert score["coverage"] == pytest.approx(1.0, abs=0.01)
+    assert score["laps"] == 2  # the SVG paths go round twice
+    assert score["frechet"] < 1.0
+    assert score["dtw"] < 0.25
@@ -0,0 +1,111 @@
+import json
+
+import numpy as np
+import pytest
+
+from DataHandler import DataHandler
+from Journal import journal_path_for
+from SampleStore import SAMPLE_FIELDS
+from SessionReader import iter_sections, iter_trials, read_header
+
+TRIALS = [
+    ("('assets/shape1.svg', 'fast', False)", 40),
+    ("('assets/shape2.svg', 'slow', True)", 0),  # a trial without samples
+    ("('assets/shape3.svg', 'medium', False)", 25),
+]
+
+# written on Linux by the json writer before json_layout: the last sample of a trial
+# lost its closing brace and the empty trial its opening bracket
+LEGACY_JSON = """{
+    "pid": "p1",
+    "exp": "shape-dependent-tracking-2025",
+    "start_time": "2025-01-01 00:00:00",
+    "data": [
+\t\t{
+            "trial_num": "0",
+            "trial_info": "",
+            "data" : 
+\t\t\t],
+\t\t\t"timing": {"samples": 0}
+\t\t},
+\t\t{
+            "trial_num": "1",
+            "trial_info": "('assets/shape6.svg', 'medium', False)",
+            "data" : [ 
+\t\t\t\t{"posX": 1, "posY": 2},
+\t\t\t\t{"posX": 3, "posY": 4
+\t\t\t],
+\t\t\t"timing": {"samples": 2}
+\t\t}
+\t]
+}"""
+
+
+def sample(trial, i):
+    """one row in SAMPLE_FIELDS order"""
+    return (100 + i, 200 + trial, i % 7, -(i % 5), 0.25 + i / 100, 1.7e9 + i / 200, 1000 + i,
+            10 ** 9 + trial * 10 ** 10 + i * 5 * 10 ** 6, 1.5 * i)
+
+
+def write_session(directory, output_format):
+    output_file = str(directory / "20250101000000_P01_shape_tracking.json")
+    handler = DataHandler("P01", output_file, output_format=output_format, metadata={"schedule": {"seed": 7}})
+    for trial, (info, count) in enumerate(TRIALS):
+        handler.start_new_section(info)
+        for i in range(count):
+            handler.write_sample(*sample(trial, i))
+    handler.close_file(upload=False)
+    return handler.output_file
+
+
+def session_paths(directory, output_format):
+    output_file = write_session(directory, output_format)
+    if output_format == "journal":
+        return [journal_path_for(output_file), output_file]  # and the JSON built from it
+    return [output_file]
+
+
+@pytest.mark.parametrize("output_format", ["json", "journal", "binary"])
+def test_round_trip(tmp_path, output_format):
+    for path in session_paths(tmp_path, output_format):
+        assert read_header(path)["pid"] == "P01"
+        trials = list(iter_trials(path))
+        assert [(num, info) for num, info, _ in trials] == [(i, info) for i, (info, _) in enumerate(TRIALS)]
+        for trial, (_, _, samples) in enumerate(trials):
+            expected = [sample(trial, i) for i in range(TRIALS[trial][1])]
+            assert len(samples) == len(expected)
+            for column, name in enumerate(SAMPLE_FIELDS):
+                np.testing.assert_allclose(samples[name], [row[column] for row in expected], rtol=1e-6,
+                                           err_msg=f"{path}: {name} of trial {trial}")
+
+
+@pytest.mark.parametrize("output_format", ["json", "journal", "binary"])
+def test_sections_carry_timing(tmp_path, output_format):
+    for path in session_paths(tmp_path, output_format):
+        sections = list(iter_sections(path, load_samples=False))
+        assert [s["samples"] for s in sections] == [count for _, count in TRIALS]
+        assert [s["timing"]["samples"] for s in sections] == [count for _, count in TRIALS]
+
+
+def test_json_writer_output_is_valid_json(tmp_path):
+    path = write_session(tmp_path, "json")
+    with open(path, 'r', encoding='utf-8') as f:
+        session = json.load(f)
+    assert session["json_layout"] == 2
+    assert session["schedule"] == {"seed": 7}
+    assert [len(trial["data"]) for trial in session["data"]] == [count for _, count in TRIALS]
+
+
+def test_legacy_json_is_repaired(tmp_path):
+    path = tmp_path / "legacy_shape_tracking.json"
+    path.write_bytes(LEGACY_JSON.encode())
+    trials = list(iter_trials(str(path)))
+    assert [len(samples) for _, _, samples in trials] == [0, 2]
+    assert trials[1][2]["posY"].tolist() == [2, 4]
+
+
+def test_repair_is_limited_to_legacy_files(tmp_path):
+    path = tmp_path / "new_shape_tracking.json"
+    path.write_bytes(LEGACY_JSON.replace('"start_time"', '"json_layout": 2,\n    "start_time"').encode())
+    with pytest.raises(ValueError):
+        list(iter_trials(str(path)))
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from ShapeGeometry import ShapeGeometry, load_geometry
+
+SHAPES = [f"assets/shape{i}.svg" for i in range(1, 10)]
+
+
+def polyline_geometry(vertices):
+    arc_xy = np.asarray(vertices, dtype=float)
+    arc_s = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(arc_xy, axis=0).T))))
+    return ShapeGeometry(arc_xy.copy(), arc_s, arc_xy, (200, 240))
+
+
+def test_points_are_equally_spaced_along_a_corner():
+    geometry = polyline_geometry([(0, 0), (100, 0), (100, 50)])  # 150 px with a right angle
+    points = geometry.sample_uniform(10.0)
+    # 15 points, s = 0, 10, ..., 140: along x up to the corner, then down along y
+    expected = [(s, 0) if s <= 100 else (100, s - 100) for s in range(0, 150, 10)]
+    assert np.allclose(points, expected)
+    ends = geometry.sample_uniform(10.0, include_end=True)
+    assert np.allclose(ends[:-1], points)
+    assert np.allclose(ends[-1], (100, 50))
+
+
+def test_spacing_that_does_not_divide_the_length():
+    geometry = polyline_geometry([(0, 0), (100, 0)])
+    points = geometry.sample_uniform(30.0, include_end=True)
+    # 3 steps of 100/3 px: the spacing is stretched, never a short last step
+    assert np.allclose(np.diff(points[:, 0]), 100 / 3)
+    assert len(geometry.sample_uniform(200.0)) == 1
+
+
+def test_zero_length_path():
+    geometry = polyline_geometry([(5, 5), (5, 5)])
+    assert geometry.sample_uniform(4.0, include_end=True).tolist() == [[5, 5]]
+
+
+@pytest.mark.parametrize("shape_file", SHAPES)
+def test_svg_samples_are_equally_spaced(shape_file):
+    geometry = load_geometry(shape_file, 1.0, False, (0, 0), cache_dir=None)
+    points = geometry.sample_uniform(5.0, include_end=True)
+    step = geometry.length / (len(points) - 1)
+    chords = np.hypot(*np.diff(points, axis=0).T)
+    # a chord is never longer than the arc it cuts, and barely shorter on these smooth curves
+    assert chords.max() <= step + 1e-9
+    assert chords.mean() == pytest.approx(step, rel=0.01)
+    assert np.allclose(points[-1], geometry.arc_xy[-1])
+    assert np.allclose(points[0], geometry.arc_xy[0])
@@ -0,0 +1,102 @@
+from SimClock import SimClock
+
+
+def make_clock():
+    return SimClock(start_wall=1000.0, process_events=False)
+
+
+def recorder(clock, log, name):
+    return lambda: log.append((name, clock.now_ns() // 1_000_000))
+
+
+def test_timers_fire_by_due_time_then_start_order():
+    clock, log = make_clock(), []
+    clock.single_shot(30, recorder(clock, log, "c"))
+    clock.single_shot(10, recorder(clock, log, "a"))
+    clock.single_shot(30, recorder(clock, log, "d"))
+    clock.single_shot(10, recorder(clock, log, "b"))
+    assert clock.run() is False  # nothing left to fire
+    assert log == [("a", 10), ("b", 10), ("c", 30), ("d", 30)]
+
+
+def test_same_setup_same_firing_order():
+    def session():
+        clock, log = make_clock(), []
+        ticker = clock.timer()
+        ticker.timeout.connect(recorder(clock, log, "tick"))
+        ticker.start(7)
+        for delay in (5, 14, 14, 0, 21):
+            clock.single_shot(delay, recorder(clock, log, f"shot{delay}"))
+        clock.advance(50)
+        return log
+
+    assert session() == session()
+
+
+def test_advance_fires_what_is_due_and_moves_the_clock():
+    clock, log = make_clock(), []
+    clock.single_shot(10, recorder(clock, log, "at 10"))
+    clock.single_shot(11, recorder(clock, log, "at 11"))
+    clock.advance(10)  # due times up to and including the end fire
+    assert log == [("at 10", 10)]
+    assert clock.now_ns() == 10_000_000
+    clock.advance(0.5)
+    assert clock.now_ns() == 10_500_000 and clock.pending() == 1
+    clock.advance(100)
+    assert log[-1] == ("at 11", 11)
+    assert clock.now_ns() == 110_500_000  # the clock ends at the end, not at the last timer
+    assert clock.time() == 1000.0 + 0.1105
+
+
+def test_repeating_timer_does_not_drift():
+    clock, log = make_clock(), []
+    timer = clock.timer()
+    timer.timeout.connect(recorder(clock, log, "tick"))
+    timer.start(10)
+    clock.advance(3)
+    clock.advance(32)
+    assert [ms for _, ms in log] == [10, 20, 30]
+    assert timer.remainingTime() == 5
+
+
+def test_zero_interval_timer_ticks_every_millisecond():
+    clock, log = make_clock(), []
+    timer = clock.timer()
+    timer.timeout.connect(recorder(clock, log, "tick"))
+    timer.start(0)
+    clock.advance(3)
+    assert [ms for _, ms in log] == [0, 1, 2, 3]
+
+
+def test_stopped_and_restarted_timers_fire_once_at_the_new_time():
+    clock, log = make_clock(), []
+    stopped = clock.single_shot(5, recorder(clock, log, "stopped"))
+    restarted = clock.single_shot(5, recorder(clock, log, "restarted"))
+    stopped.stop()
+    clock.advance(2)
+    restarted.start(10)
+    assert clock.pending() == 1
+    assert clock.next_due_ns() == 12_000_000
+    clock.advance(20)
+    assert log == [("restarted", 12)]
+    assert clock.fired == 1
+
+
+def test_timer_started_from_a_callback_fires_in_the_same_advance():
+    clock, log = make_clock(), []
+    clock.single_shot(5, lambda: clock.single_shot(5, recorder(clock, log, "chained")))
+    clock.advance(10)
+    assert log == [("chained", 10)]
+
+
+def test_run_limits():
+    clock, log = make_clock(), []
+    timer = clock.timer()
+    timer.timeout.connect(recorder(clock, log, "tick"))
+    timer.start(10)
+    assert clock.run(until=lambda: len(log) == 3) is True
+    assert clock.run(max_steps=2) is False and len(log) == 5
+    assert clock.run(max_ms=25) is False and len(log) == 7
+    assert clock.now_ns() == 70_000_000  # run() stops at the last timer it fired
+    clock.clear()
+    assert clock.pending() == 0 and not timer.isActive()
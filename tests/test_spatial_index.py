@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from Scoring import template_geometry
+from SpatialIndex import MARGIN_PX, SegmentGrid, grid_for
+
+SHAPES = [f"assets/shape{i}.svg" for i in range(1, 10)]
+
+
+def brute_force(vertices, xy):
+    """distance of every point to every segment, the smallest per point"""
+    a, ab = vertices[:-1], np.diff(vertices, axis=0)
+    ap = xy[:, None] - a[None]
+    t = np.clip((ap * ab[None]).sum(axis=2) / np.maximum((ab ** 2).sum(axis=1), 1e-12)[None], 0.0, 1.0)
+    return np.sqrt(((ap - t[:, :, None] * ab[None]) ** 2).sum(axis=2)).min(axis=1)
+
+
+def outline_of(grid):
+    a = np.array([s[:2] for s in grid.segments])
+    return np.vstack((a, a[-1] + grid.segments[-1][2:4]))
+
+
+@pytest.mark.parametrize("shape_file", SHAPES)
+def test_grid_matches_brute_force(shape_file):
+    grid = grid_for(template_geometry(shape_file))
+    vertices = outline_of(grid)
+    rng = np.random.default_rng(SHAPES.index(shape_file))
+    # many of the points fall off the grid, where every segment is checked
+    lo, hi = vertices.min(axis=0) - 1.5 * MARGIN_PX, vertices.max(axis=0) + 1.5 * MARGIN_PX
+    xy = rng.uniform(lo, hi, (2000, 2))
+    expected = brute_force(vertices, xy)
+    for (x, y), d in zip(xy.tolist(), expected):
+        distance, segment, t = grid.nearest(x, y)
+        assert distance == pytest.approx(d, abs=1e-9)
+        # the reported segment and position point at a spot that far away
+        ax, ay, bx, by, _ = grid.segments[segment]
+        assert np.hypot(ax + t * bx - x, ay + t * by - y) == pytest.approx(distance, abs=1e-9)
+
+
+def test_grid_for_is_cached_per_geometry():
+    geometry = template_geometry(SHAPES[0])
+    assert grid_for(geometry) is grid_for(geometry)
+
+
+def test_needs_a_segment():
+    with pytest.raises(ValueError):
+        SegmentGrid([(0.0, 0.0)])
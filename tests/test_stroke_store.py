@@ -0,0 +1,55 @@
+import numpy as np
+
+import StrokeStore
+from StrokeStore import StrokeStore as Store
+
+
+def draw_line(store, n, start=0):
+    """n connected segments along x, pressure rising with each one"""
+    for i in range(start, start + n):
+        store.add_segment(i, 0, i + 1, 0, 2.0, i / 100)
+
+
+def test_segments_share_vertices_until_the_pen_jumps():
+    store = Store(ring_size=16)
+    draw_line(store, 3)
+    store.add_segment(50, 50, 51, 50, 1.0, 0.5)  # pen lifted and put down elsewhere
+    tail = store.tail()
+    assert tail["x"].tolist() == [0, 1, 2, 3, 50, 51]
+    assert tail["connected"].tolist() == [0, 1, 1, 1, 0, 1]
+    assert store.stats()["segments"] == 4
+
+
+def test_ring_keeps_the_newest_vertices_oldest_first():
+    store = Store(ring_size=8)
+    draw_line(store, 20)
+    assert store.count == 21 and len(store) == 8
+    tail = store.tail()
+    assert tail["x"].tolist() == list(range(13, 21))
+    assert np.allclose(tail["pressure"], np.arange(12, 20) / 100)
+    assert store.tail(3)["x"].tolist() == [18, 19, 20]
+    assert store.tail(100)["x"].size == 8
+    assert store.nbytes() == Store(ring_size=8).nbytes()  # the ring never grows
+
+
+def test_history_grows_and_keeps_every_vertex(monkeypatch):
+    monkeypatch.setattr(StrokeStore, "HISTORY_CAPACITY", 4)
+    store = Store(history=True)
+    draw_line(store, 3)
+    early = store.tail()
+    draw_line(store, 30, start=3)
+    assert len(store) == store.count == 34
+    assert store.tail()["x"].tolist() == list(range(34))
+    assert store.tail()["connected"].tolist() == [0] + [1] * 33
+    assert len(store.connected) == 64  # 4 doubled four times
+    assert early["x"].tolist() == [0, 1, 2, 3]  # views handed out before growing are untouched
+
+
+def test_clear_starts_over():
+    store = Store(ring_size=4)
+    draw_line(store, 10)
+    store.clear()
+    assert len(store) == 0 and store.last is None
+    store.add_segment(5, 5, 6, 6, 1.0, 1.0)
+    assert store.tail()["x"].tolist() == [5, 6]
+    assert store.tail()["connected"].tolist() == [0, 1]
@@ -0,0 +1,67 @@
+import json
+import sys
+
+import pytest
+
+import TrialIndex
+from Journal import journal_path_for
+from SessionReader import iter_sections
+from TrialIndex import build_index, index_path_for, list_trials, read_index, read_trial, write_index
+from test_session_reader import TRIALS, write_session
+
+
+def recorded_paths(directory, output_format):
+    output_file = write_session(directory, output_format)
+    return [journal_path_for(output_file)] if output_format == "journal" else [output_file]
+
+
+@pytest.mark.parametrize("output_format", ["json", "journal"])
+def test_sidecar_written_while_recording_matches_a_scan(tmp_path, output_format):
+    for path in recorded_paths(tmp_path, output_format):
+        with open(index_path_for(path), 'r', encoding='utf-8') as f:
+            sidecar = [json.loads(line) for line in f]
+        assert sidecar == build_index(path)
+
+
+@pytest.mark.parametrize("output_format", ["json", "journal", "binary"])
+def test_read_trial_matches_a_full_read(tmp_path, output_format):
+    for path in recorded_paths(tmp_path, output_format):
+        assert [t["samples"] for t in list_trials(path)] == [count for _, count in TRIALS]
+        for section in iter_sections(path):
+            trial = read_trial(path, section["trial_num"])
+            assert trial["trial_info"] == section["trial_info"]
+            assert trial["samples"].tolist() == section["samples"].tolist()
+
+
+def test_stale_index_is_rebuilt(tmp_path):
+    path = write_session(tmp_path, "json")
+    entries = read_index(path)
+    entries[2]["offset"] = entries[0]["offset"]  # e.g. the file was rebuilt since
+    write_index(path, entries)
+    assert read_trial(path, 2)["samples"].size == TRIALS[2][1]
+    assert read_index(path)[2]["offset"] != entries[0]["offset"]
+
+
+def test_missing_trial_raises(tmp_path):
+    path = write_session(tmp_path, "json")
+    with pytest.raises(KeyError):
+        read_trial(path, 99)
+
+
+@pytest.mark.parametrize("output_format, offset", [("json-document", "-"), ("binary", "0")])
+def test_list_command_formats_offsets(tmp_path, monkeypatch, capsys, output_format, offset):
+    path = write_session(tmp_path, "json" if output_format == "json-document" else "binary")
+    if output_format == "json-document":
+        # re-saved by another tool: not in the line layout, so trials have no byte offsets
+        with open(path, 'r', encoding='utf-8') as f:
+            session = json.load(f)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(session, f)
+        assert all(entry["offset"] is None for entry in read_index(path, rebuild=True))
+    capsys.readouterr()
+    monkeypatch.setattr(sys, "argv", ["TrialIndex.py", "list", path])
+    TrialIndex.main()
+    rows = [line.split() for line in capsys.readouterr().out.splitlines()[1:]]
+    assert [row[1] for row in rows] == [str(count) for _, count in TRIALS]
+    # a trial at offset 0 of its section and a missing offset must not look the same
+    assert [row[5] for row in rows] == [offset] * len(TRIALS)
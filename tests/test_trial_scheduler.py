@@ -0,0 +1,86 @@
+import itertools
+import json
+
+import pytest
+
+from TrialScheduler import SCHEDULE_MODES, TrialScheduler, balanced_latin_square
+
+SPEEDS = ["slow", "medium", "fast"]
+TRIALS = [(f"assets/shape{i}.svg", speed, hide)
+          for i in range(1, 10) for speed in SPEEDS for hide in (False, True)]
+
+
+def speed_blocks(order):
+    return [speed for speed, _ in itertools.groupby(t[1] for t in order)]
+
+
+@pytest.mark.parametrize("mode", SCHEDULE_MODES)
+def test_same_seed_same_order(mode):
+    first = TrialScheduler(TRIALS, mode, seed=42, participant_index=3)
+    # the order the settings list the trials in does not matter
+    second = TrialScheduler(list(reversed(TRIALS)), mode, seed=42, participant_index=3)
+    assert first.trials == second.trials
+    assert sorted(first.trials) == sorted(TRIALS)
+    assert TrialScheduler(TRIALS, mode, seed=43, participant_index=3).trials != first.trials
+
+
+@pytest.mark.parametrize("mode", SCHEDULE_MODES)
+@pytest.mark.parametrize("seed", range(25))
+def test_no_shape_twice_in_a_row(mode, seed):
+    scheduler = TrialScheduler(TRIALS, mode, seed=seed, participant_index=seed)
+    assert scheduler.clashes == 0
+    assert all(a[0] != b[0] for a, b in zip(scheduler.trials, scheduler.trials[1:]))
+
+
+def test_repeat_only_when_unavoidable():
+    trials = [("assets/shape1.svg", "slow", False), ("assets/shape1.svg", "fast", False),
+              ("assets/shape2.svg", "slow", False)]
+    scheduler = TrialScheduler(trials, "random", seed=1)
+    assert scheduler.clashes == 0
+    assert scheduler.trials[1][0] == "assets/shape2.svg"
+    assert TrialScheduler(trials[:2], "random", seed=1).clashes == 1
+
+
+@pytest.mark.parametrize("n", range(1, 7))
+def test_balanced_latin_square(n):
+    square = balanced_latin_square(n)
+    assert len(square) == (n if n % 2 == 0 else 2 * n)
+    levels = list(range(n))
+    assert all(sorted(row) == levels for row in square)
+    assert all(sorted(column) == sorted(levels * (len(square) // n)) for column in zip(*square))
+    # every level directly precedes every other one equally often
+    pairs = [pair for row in square for pair in zip(row, row[1:])]
+    assert len(set(pairs)) == n * (n - 1)
+    assert len(pairs) == len(set(pairs)) * (len(square) // n)
+
+
+@pytest.mark.parametrize("participant_index", range(8))
+def test_latin_row_and_template_order_follow_the_participant(participant_index):
+    scheduler = TrialScheduler(TRIALS, "latin", seed=5, participant_index=participant_index)
+    square = balanced_latin_square(len(SPEEDS))
+    assert scheduler.latin_row == participant_index % len(square)
+    assert speed_blocks(scheduler.trials) == [sorted(SPEEDS)[i] for i in square[scheduler.latin_row]]
+    assert scheduler.hidden_first == ((participant_index // len(square)) % 2 == 1)
+    for _, block in itertools.groupby(scheduler.trials, key=lambda t: t[1]):
+        hides = [t[2] for t in block]
+        assert hides == sorted(hides, reverse=scheduler.hidden_first)
+
+
+@pytest.mark.parametrize("mode", SCHEDULE_MODES)
+def test_from_metadata_round_trip(mode):
+    scheduler = TrialScheduler(TRIALS, mode, seed=11, participant="p7", participant_index=4)
+    metadata = json.loads(json.dumps(scheduler.metadata()))
+    rebuilt = TrialScheduler.from_metadata(metadata)
+    assert rebuilt.trials == scheduler.trials
+    assert rebuilt.metadata() == scheduler.metadata()
+
+
+def test_next_trial_runs_out():
+    scheduler = TrialScheduler(TRIALS[:2], "random", seed=0)
+    assert [scheduler.next_trial() for _ in range(3)][2] == (False, False, False)
+    assert scheduler.remaining() == 0
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        TrialScheduler(TRIALS, "sequential")
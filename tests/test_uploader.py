@@ -0,0 +1,59 @@
+import gzip
+import json
+
+import pytest
+
+from Uploader import StandInServer, iter_upload_body, upload_body_length, upload_file
+
+# quotes, backslashes, newlines, tabs and multi-byte characters, long enough to span several chunks
+CONTENT = json.dumps({"pid": "P01", "note": 'a "quoted"\\path\n\twith ünïcödé ✓ 𝄞', "data": list(range(3000))},
+                     ensure_ascii=False, indent=1)
+
+
+@pytest.fixture
+def session_file(tmp_path):
+    path = tmp_path / "20250101000000_P01_shape_tracking.json"
+    path.write_text(CONTENT, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def strict_server():
+    server = StandInServer(require_length=True).start()
+    yield server
+    server.stop()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_body_is_the_document_the_endpoint_expects(session_file, chunk_size):
+    body = b"".join(iter_upload_body(session_file, "P01", chunk_size=chunk_size))
+    payload = json.loads(body)
+    assert payload["subject_id"] == "P01"
+    assert json.loads(payload["exp_data"]) == CONTENT  # the file text, JSON-encoded
+    assert len(body) == upload_body_length(session_file, "P01")
+    compressed = b"".join(iter_upload_body(session_file, "P01", compress=True, chunk_size=chunk_size))
+    assert gzip.decompress(compressed) == body
+
+
+def test_uncompressed_upload_sends_a_content_length(session_file, strict_server):
+    upload_file(session_file, "P01", url=strict_server.url)
+    upload = strict_server.received[0]
+    assert upload["content_length"] == str(upload_body_length(session_file, "P01"))
+    assert upload["exp_data"] == CONTENT
+
+
+def test_compressed_upload_falls_back_when_a_length_is_required(session_file, strict_server):
+    upload_file(session_file, "P01", url=strict_server.url, compress=True)
+    assert strict_server.attempts == 1  # the chunked request was refused before it counted
+    assert len(strict_server.received) == 1
+    assert strict_server.received[0]["content_length"] is not None
+
+
+def test_compressed_upload_is_chunked(session_file):
+    server = StandInServer().start()
+    try:
+        upload_file(session_file, "P01", url=server.url, compress=True)
+    finally:
+        server.stop()
+    assert server.received[0]["content_length"] is None
+    assert server.received[0]["exp_data"] == CONTENT